@@ -0,0 +1,260 @@
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_TEST_HISTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".test_history.sqlite")
+# pytest runs from here by default, as the Demo-Project tests import their modules by bare name
+DEFAULT_TEST_ROOT = "Demo-Project"
+# expected duration of a test that never ran
+DEFAULT_DURATION = 1.0
+# prefix of the per-test result lines the pytest workers print
+RESULT_MARKER = "@@test-result@@ "
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+TestKey = Tuple[str, str]
+
+
+def node_id(test: TestKey, test_root: str) -> str:
+    """
+    pytest node id, relative to test_root, of a (repo-relative file, qualname) test.
+    """
+    file_path, qualname = test
+    relative = os.path.relpath(file_path, test_root).replace(os.sep, "/")
+    return relative + "::" + qualname.replace(".", "::")
+
+
+def _pytest_worker(argv: List[str]) -> int:
+    """
+    Run the given node ids in order with pytest, printing one RESULT_MARKER line of
+    JSON per finished test as soon as it finishes. Runs in a subprocess started by run_tests().
+    Whole files are collected and filtered here, since pytest refuses to run any
+    test when one node id on its command line no longer exists.
+    """
+    import pytest
+
+    wanted = {test: i for i, test in enumerate(argv)}
+
+    class ResultPlugin:
+        def __init__(self):
+            self.current = {}
+
+        def pytest_collection_modifyitems(self, config, items):
+            selected = [item for item in items if item.nodeid.split("[", 1)[0] in wanted]
+            selected.sort(key=lambda item: wanted[item.nodeid.split("[", 1)[0]])
+            config.hook.pytest_deselected(items=[item for item in items if item.nodeid.split("[", 1)[0] not in wanted])
+            items[:] = selected
+
+        def pytest_runtest_logreport(self, report):
+            result = self.current.setdefault(report.nodeid, {"node_id": report.nodeid, "outcome": "passed",
+                                                             "duration": 0.0, "message": ""})
+            result["duration"] += report.duration
+            if report.failed:
+                result["outcome"] = "failed" if report.when == "call" else "error"
+                result["message"] = report.longreprtext[-2000:]
+            elif report.skipped and result["outcome"] == "passed":
+                result["outcome"] = "skipped"
+            if report.when == "teardown":
+                print(RESULT_MARKER + json.dumps(self.current.pop(report.nodeid)), flush=True)
+
+    files = list(dict.fromkeys(test.split("::", 1)[0] for test in argv))
+    return int(pytest.main(["-q", "--rootdir", ".", "-p", "no:cacheprovider", "-p", "no:randomly", *files],
+                           plugins=[ResultPlugin()]))
+
+
+class RunResult:
+    """
+    Outcome (passed, failed, error, skipped, missing), duration in seconds and failure text of one test.
+    """
+    __slots__ = ("test", "outcome", "duration", "message")
+
+    def __init__(self, test: TestKey, outcome: str, duration: float = 0.0, message: str = ""):
+        self.test = test
+        self.outcome = outcome
+        self.duration = duration
+        self.message = message
+
+    def to_dict(self) -> dict:
+        return {"file_path": self.test[0], "symbol_name": self.test[1], "outcome": self.outcome,
+                "duration": round(self.duration, 4), "message": self.message}
+
+    def __repr__(self):
+        return f"RunResult({self.test[0]}::{self.test[1]}, {self.outcome}, {self.duration:.2f}s)"
+
+
+class RunHistory:
+    """
+    SQLite record of every test's runs, failures and durations, used to run the
+    tests most likely to fail first, and the quicker of equally likely ones.
+    """
+
+    def __init__(self, path: str = DEFAULT_TEST_HISTORY_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS test_history (file_path TEXT NOT NULL, symbol_name TEXT NOT NULL,"
+            " runs INTEGER NOT NULL, failures INTEGER NOT NULL, total_duration REAL NOT NULL,"
+            " last_outcome TEXT NOT NULL, last_run REAL NOT NULL, PRIMARY KEY (file_path, symbol_name))"
+        )
+        self.conn.commit()
+
+    def stats(self, tests: Iterable[TestKey]) -> Dict[TestKey, Tuple[float, float]]:
+        """
+        {test: (estimated failure probability, expected duration)}. Failure rates are
+        smoothed towards 1/2, so a test with little or no history counts as likely to fail.
+        """
+        stats = {}
+        for test in tests:
+            row = self.conn.execute(
+                "SELECT runs, failures, total_duration, last_outcome FROM test_history WHERE file_path = ? AND symbol_name = ?",
+                test).fetchone()
+            if row is None:
+                stats[test] = (0.5, DEFAULT_DURATION)
+                continue
+            runs, failures, total_duration, last_outcome = row
+            probability = (failures + 1) / (runs + 2)
+            if last_outcome in ("failed", "error"):
+                # a test that is failing now will most likely fail again
+                probability = max(probability, 0.9)
+            stats[test] = (probability, total_duration / runs if runs else DEFAULT_DURATION)
+        return stats
+
+    def order(self, tests: Iterable[TestKey]) -> List[TestKey]:
+        """
+        Most likely failures first; among equal odds, shortest first.
+        """
+        stats = self.stats(list(dict.fromkeys(tests)))
+        return sorted(stats, key=lambda test: (-stats[test][0], stats[test][1], test))
+
+    def record(self, results: Iterable[RunResult]):
+        now = time.time()
+        with self.conn:
+            for result in results:
+                if result.outcome in ("skipped", "missing"):
+                    continue
+                failed = int(result.outcome in ("failed", "error"))
+                self.conn.execute(
+                    "INSERT INTO test_history VALUES (?, ?, 1, ?, ?, ?, ?) ON CONFLICT (file_path, symbol_name) DO UPDATE SET"
+                    " runs = runs + 1, failures = failures + excluded.failures,"
+                    " total_duration = total_duration + excluded.total_duration,"
+                    " last_outcome = excluded.last_outcome, last_run = excluded.last_run",
+                    (*result.test, failed, result.duration, result.outcome, now))
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+def shard(tests: List[TestKey], durations: Dict[TestKey, float], workers: int) -> List[List[TestKey]]:
+    """
+    Split tests, already in priority order, over workers: each test goes to the
+    shard that would finish its current tests first, so every shard keeps the
+    priority order and shards end at about the same time.
+    """
+    shards = [[] for _ in range(max(1, min(workers, len(tests))))]
+    load = [0.0] * len(shards)
+    for test in tests:
+        i = load.index(min(load))
+        shards[i].append(test)
+        load[i] += durations.get(test, DEFAULT_DURATION)
+    return shards
+
+
+def run_tests(tests: Iterable[TestKey], repo_path: str, test_root: str = DEFAULT_TEST_ROOT, workers: int = 4,
+              history: Optional[RunHistory] = None, fail_fast: bool = False, on_result=None) -> List[RunResult]:
+    """
+    Run exactly these (repo-relative file, qualname) tests, ordered by history and
+    split over `workers` pytest processes started from test_root. on_result is
+    called with each RunResult as it finishes; with fail_fast the remaining
+    workers are stopped after the first failure. Results are recorded in history
+    and returned in completion order.
+    """
+    tests = list(dict.fromkeys(tests))
+    if not tests:
+        return []
+    stats = history.stats(tests) if history is not None else {}
+    ordered = history.order(tests) if history is not None else tests
+    shards = shard(ordered, {test: duration for test, (_, duration) in stats.items()}, workers)
+    cwd = os.path.join(repo_path, test_root)
+    worker = f"import sys; sys.path.append({HERE!r}); import affected_runner; sys.exit(affected_runner._pytest_worker(sys.argv[1:]))"
+    by_node_id = {node_id(test, test_root): test for test in tests}
+    results: List[RunResult] = []
+    lock = threading.Lock()
+    stopped = threading.Event()
+    processes = []
+
+    def consume(process: subprocess.Popen):
+        for line in process.stdout:
+            # pytest's progress output may precede the marker on the same line
+            marker = line.find(RESULT_MARKER)
+            if marker < 0:
+                continue
+            data = json.loads(line[marker + len(RESULT_MARKER):])
+            # parametrized cases report under their function's node id
+            test = by_node_id.get(data["node_id"].split("[", 1)[0])
+            if test is None:
+                continue
+            result = RunResult(test, data["outcome"], data["duration"], data["message"])
+            with lock:
+                results.append(result)
+                if on_result is not None:
+                    on_result(result)
+                if fail_fast and result.outcome in ("failed", "error") and not stopped.is_set():
+                    stopped.set()
+                    for other in processes:
+                        if other.poll() is None:
+                            other.terminate()
+        process.wait()
+
+    for tests_of_shard in shards:
+        processes.append(subprocess.Popen(
+            [sys.executable, "-c", worker, *(node_id(test, test_root) for test in tests_of_shard)],
+            cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+        ))
+    readers = [threading.Thread(target=consume, args=(process,), daemon=True) for process in processes]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+
+    finished = {result.test for result in results}
+    for test in ordered:
+        if test not in finished:
+            # not collected (renamed or deleted test) or stopped by fail_fast
+            results.append(RunResult(test, "missing"))
+    if history is not None:
+        history.record(results)
+    return results
+
+
+def summarize(results: List[RunResult]) -> Dict[str, int]:
+    counts = {}
+    for result in results:
+        counts[result.outcome] = counts.get(result.outcome, 0) + 1
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run selected tests in parallel, likely failures first")
+    parser.add_argument("tests", nargs="+", help="Tests as <repo-relative file>::<qualname>")
+    parser.add_argument("--repo", default="..", help="Repository root (default: parent directory)")
+    parser.add_argument("--test-root", default=DEFAULT_TEST_ROOT, help="Directory pytest runs from, relative to the repo")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Parallel pytest processes")
+    parser.add_argument("--history", default=DEFAULT_TEST_HISTORY_PATH, help="Path of the test history database")
+    parser.add_argument("--fail-fast", action="store_true", help="Stop every worker after the first failure")
+    args = parser.parse_args()
+
+    history = RunHistory(args.history)
+    start = time.perf_counter()
+    results = run_tests([tuple(test.split("::", 1)) for test in args.tests], os.path.abspath(args.repo),
+                        args.test_root, args.workers, history, args.fail_fast,
+                        on_result=lambda r: print(f"{r.outcome.upper():<8} {r.test[0]}::{r.test[1]} ({r.duration:.2f}s)"))
+    history.close()
+    print(f"{summarize(results)} in {time.perf_counter() - start:.2f}s")
+    sys.exit(1 if any(r.outcome in ("failed", "error", "missing") for r in results) else 0)
@@ -1,11 +1,22 @@
 import ast
-from typing import List, Dict, Tuple,Set
+import hashlib
+from bisect import bisect_left
+from typing import List, Dict, Optional, Tuple,Set, Union
 
-def extract_functions_with_body(code: str) -> Dict[str, str]:
+from code_extractor import iter_symbol_nodes, symbol_type
+
+# (symbol_type, qualified name, start line, end line, normalized body hash)
+Symbol = Tuple[str, str, int, int, str]
+
+def _as_tree(code: Union[str, ast.AST]) -> ast.AST:
+    # Callers that already parsed the source pass the tree to avoid a second parse
+    return ast.parse(code) if isinstance(code, str) else code
+
+def extract_functions_with_body(code: Union[str, ast.AST]) -> Dict[str, str]:
     """
     Extract function names and their source code body from Python code.
     """
-    tree = ast.parse(code)
+    tree = _as_tree(code)
     functions = {}
     for node in ast.walk(tree):
         if isinstance(node, ast.FunctionDef):
@@ -15,7 +26,24 @@ def extract_functions_with_body(code: str) -> Dict[str, str]:
             functions[func_name] = func_code
     return functions
 
-def build_call_graph(code: str) -> Dict[str, Set[str]]:
+def normalized_body_hash(node: ast.AST) -> str:
+    """
+    Hash of a function or class that ignores its name, docstring, comments and formatting.
+    """
+    body = node.body
+    if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) and isinstance(body[0].value.value, str):
+        body = body[1:]
+    parts = [ast.dump(decorator) for decorator in node.decorator_list]
+    if isinstance(node, ast.ClassDef):
+        parts.extend(ast.dump(base) for base in node.bases)
+    else:
+        parts.append(ast.dump(node.args))
+        if node.returns is not None:
+            parts.append(ast.dump(node.returns))
+    parts.extend(ast.dump(stmt) for stmt in body)
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+
+def build_call_graph(code: Union[str, ast.AST]) -> Dict[str, Set[str]]:
     """
     Build a call graph: {caller_function: set(called_function_names)}
     """
@@ -39,10 +67,70 @@ def build_call_graph(code: str) -> Dict[str, Set[str]]:
                     call_graph[self.current_func].add(node.func.attr)
             self.generic_visit(node)
 
-    tree = ast.parse(code)
+    tree = _as_tree(code)
     FunctionVisitor().visit(tree)
     return call_graph
 
+MODULE_SCOPE = "<module>"
+
+def extract_references(code: Union[str, ast.AST]) -> Tuple[Dict[str, tuple], Dict[str, Set[tuple]]]:
+    """
+    Collect what a file imports and the raw call sites of each function, for
+    resolving calls across modules.
+
+    imports: {local name: (module, imported attribute or None, relative import level)}
+    calls: {qualified caller (MODULE_SCOPE for top-level code): set of references}
+    where a reference is ("name", id) for foo(), ("attr", base, attr) for base.attr(),
+    ("self", attr) for self.attr()/cls.attr() and ("method", attr) for any other x.attr().
+    """
+    imports = {}
+    calls = {}
+
+    class ReferenceVisitor(ast.NodeVisitor):
+        def __init__(self):
+            self.scope = []
+
+        def visit_Import(self, node: ast.Import):
+            for alias in node.names:
+                if alias.asname:
+                    imports[alias.asname] = (alias.name, None, 0)
+                else:
+                    top = alias.name.split(".")[0]
+                    imports[top] = (top, None, 0)
+
+        def visit_ImportFrom(self, node: ast.ImportFrom):
+            for alias in node.names:
+                if alias.name != "*":
+                    imports[alias.asname or alias.name] = (node.module or "", alias.name, node.level)
+
+        def _visit_scope(self, node):
+            self.scope.append(node.name)
+            self.generic_visit(node)
+            self.scope.pop()
+
+        visit_FunctionDef = visit_AsyncFunctionDef = visit_ClassDef = _visit_scope
+
+        def visit_Call(self, node: ast.Call):
+            caller = ".".join(self.scope) or MODULE_SCOPE
+            func = node.func
+            if isinstance(func, ast.Name):
+                ref = ("name", func.id)
+            elif isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name):
+                if func.value.id in ("self", "cls"):
+                    ref = ("self", func.attr)
+                else:
+                    ref = ("attr", func.value.id, func.attr)
+            elif isinstance(func, ast.Attribute):
+                ref = ("method", func.attr)
+            else:
+                ref = None
+            if ref is not None:
+                calls.setdefault(caller, set()).add(ref)
+            self.generic_visit(node)
+
+    ReferenceVisitor().visit(_as_tree(code))
+    return imports, calls
+
 def find_callers(target_funcs: List[str], call_graph: Dict[str, Set[str]]) -> Set[str]:
     """
     Return all functions that call any of the target functions.
@@ -53,32 +141,103 @@ def find_callers(target_funcs: List[str], call_graph: Dict[str, Set[str]]) -> Se
             callers.add(caller)
     return callers
 
-def analyze_ast_diff(before_code: str, after_code: str) -> Dict[str, List[str]]:
-    before_funcs = extract_functions_with_body(before_code)
-    after_funcs = extract_functions_with_body(after_code)
+def extract_symbols(code: Union[str, ast.AST]) -> List[Symbol]:
+    """
+    Every function and class with its qualified name, line span and normalized_body_hash.
+    """
+    return [
+        (symbol_type(node), name, node.lineno, node.end_lineno, normalized_body_hash(node))
+        for name, node in iter_symbol_nodes(_as_tree(code))
+    ]
+
+def _touches(start: int, end: int, lines: Optional[List[int]]) -> bool:
+    # lines is sorted; None means "no hunk information, treat everything as touched"
+    if lines is None:
+        return True
+    i = bisect_left(lines, start)
+    return i < len(lines) and lines[i] <= end
+
+def _leaf(name: str) -> str:
+    return name.rsplit(".", 1)[-1]
+
+def diff_symbols(before_symbols: List[Symbol], after_symbols: List[Symbol], call_graph: Dict[str, Set[str]],
+                 old_changed_lines: Optional[List[int]] = None, new_changed_lines: Optional[List[int]] = None) -> Dict[str, list]:
+    """
+    Compare the functions of two versions of a file by normalized body hash.
 
-    before_names = set(before_funcs.keys())
-    after_names = set(after_funcs.keys())
+    Only functions whose span touches a changed line (old_changed_lines for the
+    before version, new_changed_lines for the after version, both sorted) are
+    looked at. A removed and an added function with the same hash are reported
+    as "renamed" when only the name changed and as "moved" when the enclosing
+    class or function changed; both are [old_name, new_name] pairs.
+    """
+    before_all = {name: body_hash for kind, name, _, _, body_hash in before_symbols if kind == "function"}
+    after_all = {name: body_hash for kind, name, _, _, body_hash in after_symbols if kind == "function"}
+    touched_before = [name for kind, name, start, end, _ in before_symbols
+                      if kind == "function" and _touches(start, end, old_changed_lines)]
+    touched_after = [name for kind, name, start, end, _ in after_symbols
+                     if kind == "function" and _touches(start, end, new_changed_lines)]
 
-    added = after_names - before_names
-    removed = before_names - after_names
+    added = [name for name in dict.fromkeys(touched_after) if name not in before_all]
+    removed = [name for name in dict.fromkeys(touched_before) if name not in after_all]
+    modified = [name for name in dict.fromkeys(touched_before + touched_after)
+                if name in before_all and name in after_all and before_all[name] != after_all[name]]
 
-    modified = []
-    for func_name in before_names & after_names:
-        if before_funcs[func_name] != after_funcs[func_name]:
-            modified.append(func_name)
+    renamed, moved = [], []
+    added_by_hash = {}
+    for name in added:
+        added_by_hash.setdefault(after_all[name], []).append(name)
+    for old_name in list(removed):
+        candidates = added_by_hash.get(before_all[old_name])
+        if not candidates:
+            continue
+        new_name = candidates.pop(0)
+        removed.remove(old_name)
+        added.remove(new_name)
+        old_scope, new_scope = old_name.rpartition(".")[0], new_name.rpartition(".")[0]
+        (renamed if old_scope == new_scope else moved).append([old_name, new_name])
 
     # 🧠 Find indirect dependents (functions that call modified ones)
-    call_graph = build_call_graph(after_code)
-    indirect_dependents = find_callers(modified, call_graph)
+    indirect_dependents = find_callers([_leaf(name) for name in modified], call_graph)
 
     return {
-        "added": list(added),
-        "removed": list(removed),
+        "added": added,
+        "removed": removed,
         "modified": modified,
-        "indirect_dependents": list(indirect_dependents)
+        "renamed": renamed,
+        "moved": moved,
+        "indirect_dependents": sorted(indirect_dependents)
     }
 
+def detect_cross_file_moves(changes_by_file: Dict[str, dict], before_by_file: Dict[str, List[Symbol]],
+                            after_by_file: Dict[str, List[Symbol]]):
+    """
+    Turn a function removed from one file and added with the same body hash to
+    another into a "moved" entry ["old_path::name", "new_path::name"] of the new file.
+    Updates changes_by_file in place.
+    """
+    removed_by_hash = {}
+    for file, changes in changes_by_file.items():
+        hashes = {name: body_hash for kind, name, *_, body_hash in before_by_file.get(file, []) if kind == "function"}
+        for name in changes["removed"]:
+            removed_by_hash.setdefault(hashes[name], []).append((file, name))
+    for file, changes in changes_by_file.items():
+        hashes = {name: body_hash for kind, name, *_, body_hash in after_by_file.get(file, []) if kind == "function"}
+        for name in list(changes["added"]):
+            sources = [source for source in removed_by_hash.get(hashes[name], []) if source[0] != file]
+            if not sources:
+                continue
+            old_file, old_name = sources[0]
+            removed_by_hash[hashes[name]].remove(sources[0])
+            changes_by_file[old_file]["removed"].remove(old_name)
+            changes["added"].remove(name)
+            changes["moved"].append([f"{old_file}::{old_name}", f"{file}::{name}"])
+
+def analyze_ast_diff(before_code: str, after_code: str, old_changed_lines: Optional[List[int]] = None,
+                     new_changed_lines: Optional[List[int]] = None) -> Dict[str, list]:
+    after_tree = ast.parse(after_code)
+    return diff_symbols(extract_symbols(before_code), extract_symbols(after_tree), build_call_graph(after_tree),
+                        old_changed_lines, new_changed_lines)
 
 
 if __name__ == "__main__":
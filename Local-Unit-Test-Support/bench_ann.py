@@ -0,0 +1,67 @@
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from vector_store import INDEX_TYPES, build_index, set_search_params
+
+
+def synthetic_vectors(num_vectors: int, dim: int, num_clusters: int = 100, seed: int = 0) -> np.ndarray:
+    """
+    Clustered gaussian vectors, closer to real code embeddings than uniform noise.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(num_clusters, dim)).astype("float32")
+    labels = rng.integers(0, num_clusters, size=num_vectors)
+    return centers[labels] + 0.3 * rng.normal(size=(num_vectors, dim)).astype("float32")
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / (len(truth) * k)
+
+
+def run_benchmark(num_vectors: int, dim: int, num_queries: int, k: int, index_types, nprobe: int, ef_search: int):
+    data = synthetic_vectors(num_vectors + num_queries, dim)
+    vectors, queries = data[:num_vectors], data[num_vectors:]
+    ids = np.arange(num_vectors, dtype="int64")
+    truth = None
+
+    print(f"{num_vectors} vectors, dim {dim}, {num_queries} queries, k={k}")
+    print(f"{'index':<8}{'build s':>10}{'memory MB':>12}{'batch ms/q':>12}{'single ms/q':>13}{'recall@k':>10}")
+    for index_type in ["flat"] + [t for t in index_types if t != "flat"]:
+        start = time.perf_counter()
+        index = build_index(vectors, ids, index_type)
+        build_time = time.perf_counter() - start
+        set_search_params(index, nprobe=nprobe, ef_search=ef_search)
+        memory = faiss.serialize_index(index).nbytes / 1e6
+
+        start = time.perf_counter()
+        _, found = index.search(queries, k)
+        batch_latency = (time.perf_counter() - start) / num_queries * 1000
+
+        single_queries = queries[:min(num_queries, 200)]
+        start = time.perf_counter()
+        for query in single_queries:
+            index.search(query[None, :], k)
+        single_latency = (time.perf_counter() - start) / len(single_queries) * 1000
+
+        if truth is None:
+            truth = found
+        print(f"{index_type:<8}{build_time:>10.2f}{memory:>12.1f}{batch_latency:>12.3f}{single_latency:>13.3f}{recall_at_k(found, truth):>10.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare FAISS index types against the exact flat baseline")
+    parser.add_argument("--vectors", type=int, default=100_000, help="Number of indexed vectors")
+    parser.add_argument("--dim", type=int, default=768, help="Vector dimension (text-embedding-004 is 768)")
+    parser.add_argument("--queries", type=int, default=1000, help="Number of query vectors")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours per query for recall@k")
+    parser.add_argument("--index-types", nargs="+", choices=INDEX_TYPES, default=INDEX_TYPES, help="Index types to compare")
+    parser.add_argument("--nprobe", type=int, default=16, help="IVF lists probed per query")
+    parser.add_argument("--ef-search", type=int, default=64, help="HNSW search depth")
+    args = parser.parse_args()
+
+    run_benchmark(args.vectors, args.dim, args.queries, args.k, args.index_types, args.nprobe, args.ef_search)
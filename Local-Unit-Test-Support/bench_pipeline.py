@@ -0,0 +1,219 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, List, Optional
+
+from ast_analyzer import analyze_ast_diff
+from code_extractor import extract_code_blocks
+from diff_parser import GitObjectReader, changed_lines, get_all_diffs, get_name_status, rev_list
+from repo_scanner import is_test_file, scan_files
+from synthetic_repo import CODE_DIR, TOOL_DIR, SyntheticRepo
+from test_linker import expand_calls, extract_call_graph
+
+DEFAULT_RESULTS_DIR = "bench_results"
+# the pipeline runs offline: local hashing embeddings and the deterministic mock suggester
+STUB_BACKENDS = {"embedding": {"backend": "hashing"}, "suggestion": {"backend": "mock"}}
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _median_time(fn: Callable[[], object], repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def _diff_inputs(repo_path: str) -> List[tuple]:
+    """
+    (before source, after source, old lines, new lines) of every changed Python file in the history.
+    """
+    reader = GitObjectReader(repo_path)
+    inputs = []
+    try:
+        for commit, parent in rev_list(repo_path, "HEAD")[1:]:
+            diffs = get_all_diffs(repo_path, parent, commit)
+            for status, old_path, new_path in get_name_status(repo_path, parent, commit):
+                if status != "M" or not new_path.endswith(".py"):
+                    continue
+                before = reader.read(parent, old_path).decode("utf-8")
+                after = reader.read(commit, new_path).decode("utf-8")
+                inputs.append((before, after, *changed_lines(diffs.get(new_path, ""))))
+    finally:
+        reader.close()
+    return inputs
+
+
+def _run_report(repo_path: str, work_dir: str, warm: bool, incremental: bool = False) -> int:
+    # imported before the chdir below, which would hide them when sys.path holds ""
+    import get_report
+    import pipeline  # noqa: F401
+    if not warm:
+        for name in os.listdir(work_dir):
+            if name.startswith("cache"):
+                os.remove(os.path.join(work_dir, name))
+    cwd = os.getcwd()
+    os.chdir(os.path.join(repo_path, TOOL_DIR))
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return get_report.main(
+                "HEAD^", "HEAD", False, os.path.join(work_dir, "report"),
+                embedding_cache_path=os.path.join(work_dir, "cache_embeddings.sqlite"),
+                index_path=os.path.join(work_dir, "cache_index.faiss"),
+                meta_path=os.path.join(work_dir, "cache_metadata.sqlite"),
+                symbol_db_path=os.path.join(work_dir, "cache_symbols.sqlite"),
+                response_cache_path=os.path.join(work_dir, "cache_responses.sqlite"),
+                backend_config=os.path.join(work_dir, "backends.json"), incremental=incremental,
+            )
+    finally:
+        os.chdir(cwd)
+
+
+def check_incremental_rename(repo_path: str, work_dir: str) -> bool:
+    """
+    Commit a rename of the first module and update the index built by the warm run
+    incrementally: no block may stay indexed under the old path. Adds a commit to repo_path.
+    """
+    from metadata_store import MetadataStore
+
+    old_path = f"{CODE_DIR}/pkg/module_0.py"
+    new_path = f"{CODE_DIR}/pkg/module_0_renamed.py"
+    subprocess.run(["git", "-C", repo_path, "mv", old_path, new_path], check=True, capture_output=True)
+    subprocess.run(["git", "-C", repo_path, "-c", "user.name=bench", "-c", "user.email=bench@example.com",
+                    "commit", "-q", "-m", "rename"], check=True, capture_output=True)
+    _run_report(repo_path, work_dir, warm=True, incremental=True)
+    store = MetadataStore(os.path.join(work_dir, "cache_metadata.sqlite"))
+    try:
+        paths = {key[0] for key, _ in store.items()}
+    finally:
+        store.close()
+    passed = old_path not in paths and new_path in paths
+    print(f"{'incremental rename':<24} {'ok' if passed else 'FAILED: old path still indexed'}")
+    return passed
+
+
+def run_suite(modules: int, functions: int, tests: int, commits: int, churn: float, repeat: int = 3,
+              seed: int = 0) -> dict:
+    """
+    Generate a synthetic repo and time each analysis step on it (median of repeat runs).
+    """
+    root = tempfile.mkdtemp(prefix="bench_pipeline_")
+    try:
+        repo_path = os.path.join(root, "repo")
+        work_dir = os.path.join(root, "work")
+        os.makedirs(work_dir)
+        with open(os.path.join(work_dir, "backends.json"), "w") as f:
+            json.dump(STUB_BACKENDS, f)
+
+        start = time.perf_counter()
+        repo = SyntheticRepo(repo_path, modules, functions, tests, churn, seed)
+        repo.create(commits)
+        generate = time.perf_counter() - start
+        print(f"Generated {repo.stats()} with {commits + 1} commits in {generate:.1f}s")
+
+        files = scan_files(os.path.join(repo_path, CODE_DIR))
+        test_sources = [f.read_text(encoding="utf-8") for f in files if is_test_file(f.name)]
+        diff_inputs = _diff_inputs(repo_path)
+
+        results = {
+            "extract_code_blocks_s": _median_time(
+                lambda: [extract_code_blocks(f, repo_path) for f in files], repeat),
+            "analyze_ast_diff_s": _median_time(
+                lambda: [analyze_ast_diff(*inputs) for inputs in diff_inputs], repeat),
+            "call_graph_expand_s": _median_time(
+                lambda: [expand_calls(extract_call_graph(source)) for source in test_sources], repeat),
+            "end_to_end_cold_s": _median_time(lambda: _run_report(repo_path, work_dir, warm=False), repeat),
+            "end_to_end_warm_s": _median_time(lambda: _run_report(repo_path, work_dir, warm=True), repeat),
+        }
+        for name, seconds in results.items():
+            print(f"{name:<24} {seconds:8.3f}s")
+        checks = {"incremental_rename": check_incremental_rename(repo_path, work_dir)}
+        return {
+            "label": None,
+            "tool_commit": _tool_commit(),
+            "python": platform.python_version(),
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "params": {"modules": modules, "functions": functions, "tests": tests, "commits": commits,
+                       "churn": churn, "repeat": repeat, "seed": seed},
+            "inputs": {**repo.stats(), "files": len(files), "diffed_files": len(diff_inputs)},
+            "results": results,
+            "checks": checks,
+        }
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def _tool_commit() -> Optional[str]:
+    result = subprocess.run(["git", "-C", HERE, "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+    return result.stdout.strip() or None
+
+
+def compare(baseline: dict, candidate: dict, tolerance: float) -> List[str]:
+    """
+    Print both runs side by side and return the timings that got more than tolerance (relative) slower.
+    """
+    if baseline.get("params") != candidate.get("params"):
+        print(f"Warning: parameters differ: {baseline.get('params')} vs {candidate.get('params')}")
+    print(f"{'step':<24}{baseline.get('label') or 'baseline':>14}{candidate.get('label') or 'candidate':>14}{'change':>10}")
+    regressions = []
+    for name, new in candidate["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            print(f"{name:<24}{'-':>14}{new:>13.3f}s")
+            continue
+        change = (new - old) / old if old else 0.0
+        print(f"{name:<24}{old:>13.3f}s{new:>13.3f}s{change:>+10.0%}")
+        if change > tolerance:
+            regressions.append(f"{name}: {old:.3f}s -> {new:.3f}s ({change:+.0%})")
+    return regressions
+
+
+def _load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline on a synthetic git repository")
+    parser.add_argument("--modules", type=int, default=200, help="Source modules in the synthetic repo")
+    parser.add_argument("--functions", type=int, default=20, help="Functions per module")
+    parser.add_argument("--tests", type=int, default=5, help="Test functions per module")
+    parser.add_argument("--commits", type=int, default=20, help="Churn commits after the initial one")
+    parser.add_argument("--churn", type=float, default=0.01, help="Fraction of all functions edited per commit")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per step (median is kept)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the generated repo")
+    parser.add_argument("--label", default=None, help="Name of this run (default: the tool's git commit)")
+    parser.add_argument("--results-dir", default=DEFAULT_RESULTS_DIR, help="Where results are stored as <label>.json")
+    parser.add_argument("--baseline", default=None, help="Stored results to compare this run against; exits 1 on a regression")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"), default=None,
+                        help="Only compare two stored results, without running anything")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative slowdown per step")
+    args = parser.parse_args()
+
+    if args.compare:
+        regressions = compare(_load(args.compare[0]), _load(args.compare[1]), args.tolerance)
+    else:
+        results = run_suite(args.modules, args.functions, args.tests, args.commits, args.churn, args.repeat, args.seed)
+        results["label"] = args.label or results["tool_commit"] or "unlabelled"
+        os.makedirs(args.results_dir, exist_ok=True)
+        path = os.path.join(args.results_dir, f"{results['label']}.json")
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {path}")
+        regressions = compare(_load(args.baseline), results, args.tolerance) if args.baseline else []
+        regressions += [f"check {name} failed" for name, passed in results["checks"].items() if not passed]
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    sys.exit(1 if regressions else 0)
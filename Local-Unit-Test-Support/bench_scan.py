@@ -0,0 +1,81 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from code_extractor import extract_code_blocks
+from repo_scanner import parse_files, scan_files
+from symbol_db import SymbolDB
+
+
+def make_synthetic_tree(root: str, num_files: int, functions_per_file: int = 20, ignored_files: int = 2000):
+    """
+    Write num_files Python modules under root, plus a virtualenv, a .git directory
+    and a git-ignored build directory that a scan should skip entirely.
+    """
+    for i in range(num_files):
+        package = Path(root, "src", f"pkg_{i % 100}")
+        package.mkdir(parents=True, exist_ok=True)
+        body = []
+        for j in range(functions_per_file):
+            body.append(f"def func_{j}(x, y):\n    total = x + y * {j}\n    return helper_{j}(total)\n")
+        body.append(f"class Model{i}:\n" + "".join(f"    def method_{j}(self):\n        return {j}\n" for j in range(5)))
+        (package / f"module_{i}.py").write_text("\n".join(body), encoding="utf-8")
+    for noise_dir in ("venv/lib/site", ".git/objects", "generated"):
+        noise = Path(root, noise_dir)
+        noise.mkdir(parents=True, exist_ok=True)
+        for i in range(ignored_files // 3):
+            (noise / f"noise_{i}.py").write_text("def noise():\n    pass\n", encoding="utf-8")
+    Path(root, ".gitignore").write_text("generated/\n", encoding="utf-8")
+
+
+def baseline(root: str) -> int:
+    """
+    The previous approach: rglob everything, filter afterwards, parse serially.
+    """
+    files = [f for f in Path(root).rglob("*.py") if not any(ex in f.parts for ex in ["venv", "__pycache__"])]
+    return sum(len(extract_code_blocks(f, root)) for f in files)
+
+
+def run_benchmark(num_files: int, workers_list):
+    root = tempfile.mkdtemp(prefix="synthetic_repo_")
+    try:
+        start = time.perf_counter()
+        make_synthetic_tree(root, num_files)
+        print(f"Generated {num_files} files in {time.perf_counter() - start:.1f}s at {root}")
+
+        start = time.perf_counter()
+        blocks = baseline(root)
+        base = time.perf_counter() - start
+        print(f"baseline rglob + serial parse: {base:.2f}s ({blocks} blocks)")
+
+        start = time.perf_counter()
+        files = scan_files(root)
+        scan = time.perf_counter() - start
+        print(f"scan_files: {scan:.2f}s ({len(files)} files)")
+        for workers in workers_list:
+            start = time.perf_counter()
+            blocks = parse_files(files, root, workers)
+            parse = time.perf_counter() - start
+            print(f"parse_files workers={workers}: {parse:.2f}s ({len(blocks)} blocks), "
+                  f"scan + parse speedup vs baseline {base / (scan + parse):.1f}x")
+        symbol_db = SymbolDB(os.path.join(root, "symbols.sqlite"))
+        for run in ("cold", "warm"):
+            start = time.perf_counter()
+            parse_files(files, root, workers_list[-1], symbol_db)
+            symbol_db.conn.commit()
+            print(f"parse_files with symbol db ({run}): {time.perf_counter() - start:.2f}s {symbol_db.stats()}")
+        symbol_db.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time repository scanning and parallel parsing on a synthetic repo")
+    parser.add_argument("--files", type=int, default=10_000, help="Number of synthetic modules")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1], help="Worker counts to compare")
+    args = parser.parse_args()
+
+    run_benchmark(args.files, args.workers)
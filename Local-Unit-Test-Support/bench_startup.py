@@ -0,0 +1,94 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+# modules the CLI must only load in the stages that use them
+HEAVY_MODULES = ["faiss", "numpy", "pydantic", "google.genai", "dotenv", "sentence_transformers"]
+DEFAULT_STARTUP_RESULTS = "bench_startup.json"
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+_IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import get_report
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "heavy": sorted(m for m in %r if m in sys.modules)}))
+"""
+
+
+def _run(args: List[str]) -> float:
+    start = time.perf_counter()
+    subprocess.run(args, cwd=HERE, capture_output=True, check=True)
+    return time.perf_counter() - start
+
+
+def measure(repeat: int = 5) -> Dict[str, object]:
+    """
+    Median seconds, each in a fresh interpreter, of importing get_report, of
+    `get_report.py --help` and of a full run over an empty diff (HEAD..HEAD,
+    which must exit before any embedding, indexing or LLM work).
+    """
+    import_times = []
+    heavy = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-c", _IMPORT_PROBE % (HEAVY_MODULES,)], cwd=HERE,
+                                capture_output=True, text=True, check=True)
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+        import_times.append(probe["seconds"])
+        heavy = probe["heavy"]
+    interpreter = [_run([sys.executable, "-c", "pass"]) for _ in range(repeat)]
+    help_times = [_run([sys.executable, "get_report.py", "--help"]) for _ in range(repeat)]
+    noop_times = [_run([sys.executable, "get_report.py", "--from", "HEAD", "--to", "HEAD", "--output", "bench_startup_report"])
+                  for _ in range(repeat)]
+    return {
+        "python": sys.version.split()[0],
+        "interpreter_s": statistics.median(interpreter),
+        "import_s": statistics.median(import_times),
+        "help_s": statistics.median(help_times),
+        "noop_run_s": statistics.median(noop_times),
+        "heavy_modules_at_import": heavy,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    Regressions of results against baseline: timings more than tolerance (relative)
+    slower, and heavy modules that importing the CLI now loads.
+    """
+    regressions = []
+    for key in ("import_s", "help_s", "noop_run_s"):
+        if key in baseline and results[key] > baseline[key] * (1 + tolerance):
+            regressions.append(f"{key}: {baseline[key]:.3f}s -> {results[key]:.3f}s")
+    if results["heavy_modules_at_import"]:
+        regressions.append(f"importing get_report loads {', '.join(results['heavy_modules_at_import'])}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-time and startup regression benchmark for get_report")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement (median is kept)")
+    parser.add_argument("--output", default=DEFAULT_STARTUP_RESULTS, help="Where to write the results as JSON")
+    parser.add_argument("--baseline", default=None, help="Earlier results to compare against; exits 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown against the baseline")
+    args = parser.parse_args()
+
+    results = measure(args.repeat)
+    for key, value in results.items():
+        print(f"{key:<24} {value:.3f}" if isinstance(value, float) else f"{key:<24} {value}")
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        sys.exit(1 if regressions else 0)
+    elif results["heavy_modules_at_import"]:
+        print(f"Importing get_report loads {', '.join(results['heavy_modules_at_import'])}")
+        sys.exit(1)
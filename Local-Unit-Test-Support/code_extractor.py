@@ -0,0 +1,70 @@
+import ast
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+
+class CodeBlock:
+    """
+    One function or class extracted from a source file.
+    symbol_name is qualified with its enclosing classes/functions, e.g. "Class.method".
+    """
+    __slots__ = ("symbol_type", "symbol_name", "file_path", "code", "start_line", "end_line")
+
+    def __init__(self, symbol_type: str, symbol_name: str, file_path: str, code: str, start_line: int, end_line: int):
+        self.symbol_type = symbol_type
+        self.symbol_name = symbol_name
+        self.file_path = file_path
+        self.code = code
+        self.start_line = start_line
+        self.end_line = end_line
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return (self.file_path, self.symbol_name)
+
+    def to_dict(self) -> dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CodeBlock":
+        return cls(*(data.get(slot) for slot in cls.__slots__))
+
+    def __repr__(self):
+        return f"CodeBlock({self.symbol_type} {self.file_path}::{self.symbol_name} L{self.start_line}-{self.end_line})"
+
+
+def iter_symbol_nodes(tree: ast.AST) -> Iterator[Tuple[str, ast.AST]]:
+    """
+    Yield (qualified name, node) for every function and class of tree in definition order.
+    """
+    # (node, qualified prefix) pairs, reversed so symbols come out in source order
+    stack = [(node, "") for node in reversed(list(ast.iter_child_nodes(tree)))]
+    while stack:
+        node, prefix = stack.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            name = prefix + node.name
+            yield name, node
+            prefix = name + "."
+        stack.extend((child, prefix) for child in reversed(list(ast.iter_child_nodes(node))))
+
+
+def symbol_type(node: ast.AST) -> str:
+    return "class" if isinstance(node, ast.ClassDef) else "function"
+
+
+def iter_source_blocks(source: str, relative_path: str) -> Iterator[CodeBlock]:
+    """
+    Yield every function and class of source in definition order.
+    The source is parsed and split into lines once per file.
+    """
+    tree = ast.parse(source)
+    lines = source.splitlines()
+    for name, node in iter_symbol_nodes(tree):
+        yield CodeBlock(symbol_type(node), name, relative_path, "\n".join(lines[node.lineno - 1:node.end_lineno]),
+                        node.lineno, node.end_lineno)
+
+
+def extract_code_blocks(file_path: Path, repo_path: str) -> List[CodeBlock]:
+    relative_path = Path(file_path).relative_to(Path(repo_path))
+    source = Path(file_path).read_text(encoding="utf-8")
+    return list(iter_source_blocks(source, str(relative_path)))
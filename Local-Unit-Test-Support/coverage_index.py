@@ -0,0 +1,327 @@
+import argparse
+import os
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from diff_parser import changed_lines, get_all_diffs
+from repo_scanner import is_test_file, scan_files
+from symbol_db import git_blob_sha
+
+DEFAULT_COVERAGE_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".coverage_index.sqlite")
+# pytest runs from here by default, as the Demo-Project tests import their modules by bare name
+DEFAULT_TEST_ROOT = "Demo-Project"
+# covered lines at most this many lines apart are stored as one range
+MERGE_GAP = 2
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+TestKey = Tuple[str, str]
+
+
+def line_ranges(lines: Iterable[int], gap: int = MERGE_GAP) -> List[Tuple[int, int]]:
+    """
+    Sorted line numbers as (start, end) ranges; runs separated by at most `gap` lines are merged.
+    """
+    ranges = []
+    for line in sorted(lines):
+        if ranges and line - ranges[-1][1] <= gap:
+            ranges[-1][1] = line
+        else:
+            ranges.append([line, line])
+    return [(start, end) for start, end in ranges]
+
+
+def test_key(path: str, repo_path: str, name: str, cls: Optional[str] = None) -> str:
+    """
+    "<file relative to repo_path>::<qualname>", the (file_path, symbol_name) of the
+    test's code block; parametrized cases share their function's key.
+    """
+    name = re.sub(r"\[.*\]$", "", name)
+    qualname = f"{cls}.{name}" if cls else name
+    return f"{Path(path).resolve().relative_to(Path(repo_path).resolve()).as_posix()}::{qualname}"
+
+
+def _pytest_worker(argv: List[str]) -> int:
+    """
+    Run pytest under coverage with one coverage context per test, named by test_key().
+    argv: data file, repo path, pytest arguments. Runs in a subprocess started by record().
+    """
+    import coverage
+    import pytest
+
+    data_file, repo_path, pytest_args = argv[0], argv[1], argv[2:]
+    cwd = Path.cwd().resolve()
+    cov = coverage.Coverage(data_file=data_file, source=[repo_path], omit=[os.path.join(HERE, "*")],
+                            config_file=False)
+
+    class ContextPlugin:
+        @pytest.hookimpl(hookwrapper=True)
+        def pytest_runtest_protocol(self, item, nextitem):
+            cls = getattr(item, "cls", None)
+            # node ids are stored relative to the directory pytest runs from, so update() can pass them back
+            node_id = Path(item.path).resolve().relative_to(cwd).as_posix() + "::" + item.nodeid.split("::", 1)[1]
+            cov.switch_context(test_key(item.path, repo_path, item.name, cls.__name__ if cls else None) + "|" + node_id)
+            yield
+            cov.switch_context("")
+
+    cov.start()
+    try:
+        exit_code = pytest.main(["-q", "-p", "no:cacheprovider", *pytest_args], plugins=[ContextPlugin()])
+    finally:
+        cov.stop()
+        cov.save()
+    return int(exit_code)
+
+
+class CoverageIndex:
+    """
+    SQLite map from each test to the line ranges it executed, recorded by running
+    the tests once under line coverage with a coverage context per test.
+
+    A diff selects the tests whose ranges contain one of its changed lines. Only
+    tests whose file changed, or that covered a source file that changed since it
+    was recorded, are run again by update(). Line numbers refer to the source as
+    recorded, so a diff should start from the recorded state (see is_current()).
+    """
+
+    def __init__(self, path: str = DEFAULT_COVERAGE_INDEX_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(
+            "CREATE TABLE IF NOT EXISTS tests (id INTEGER PRIMARY KEY, test_key TEXT UNIQUE NOT NULL,"
+            " node_id TEXT NOT NULL, test_file TEXT NOT NULL, recorded_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS ranges (test_id INTEGER NOT NULL, file_path TEXT NOT NULL,"
+            " start_line INTEGER NOT NULL, end_line INTEGER NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS ranges_file_path ON ranges (file_path);"
+            "CREATE INDEX IF NOT EXISTS ranges_test_id ON ranges (test_id);"
+            # blob sha of every measured file and test file when it was last recorded
+            "CREATE TABLE IF NOT EXISTS files (file_path TEXT PRIMARY KEY, blob_sha TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);"
+        )
+        self.conn.commit()
+
+    # -- recording ---------------------------------------------------------
+
+    def _run(self, repo_path: str, test_root: str, pytest_args: List[str]) -> Dict[str, Dict[str, Set[int]]]:
+        """
+        {context: {file: covered lines}} of one pytest run under coverage.
+        """
+        import coverage
+
+        fd, data_file = tempfile.mkstemp(prefix="coverage_index_", suffix=".data")
+        os.close(fd)
+        worker = f"import sys; sys.path.append({HERE!r}); import coverage_index; sys.exit(coverage_index._pytest_worker(sys.argv[1:]))"
+        try:
+            result = subprocess.run([sys.executable, "-c", worker, data_file, repo_path, *pytest_args],
+                                    cwd=os.path.join(repo_path, test_root))
+            if result.returncode not in (0, 1):
+                # 1 only means some tests failed; their coverage is still recorded
+                print(f"pytest exited with {result.returncode}")
+            data = coverage.CoverageData(basename=data_file)
+            data.read()
+            covered = defaultdict(lambda: defaultdict(set))
+            for measured in data.measured_files():
+                relative = Path(measured).resolve().relative_to(Path(repo_path).resolve()).as_posix()
+                for line, contexts in data.contexts_by_lineno(measured).items():
+                    for context in contexts:
+                        if context:
+                            covered[context][relative].add(line)
+            return covered
+        finally:
+            for leftover in (data_file, data_file + "-journal"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+    def record(self, repo_path: str, test_root: str = DEFAULT_TEST_ROOT, node_ids: Optional[List[str]] = None,
+               test_files: Iterable[str] = ()) -> int:
+        """
+        Run node_ids (default: the whole suite under test_root) under coverage and
+        replace the stored ranges of every test that ran, and of every test of
+        test_files (repo-relative), which may no longer exist. Returns how many tests ran.
+        """
+        covered = self._run(repo_path, test_root, node_ids or [])
+        now = time.time()
+        test_files = set(test_files)
+        ran_files = set()
+        with self.conn:
+            if node_ids is None:
+                self.conn.execute("DELETE FROM tests")
+                self.conn.execute("DELETE FROM ranges")
+            for file in test_files:
+                self._drop(self.conn.execute("SELECT id FROM tests WHERE test_file = ?", (file,)))
+            for key, (node_id, files) in self._by_test(covered).items():
+                test_file = key.split("::", 1)[0]
+                ran_files.add(test_file)
+                self._drop(self.conn.execute("SELECT id FROM tests WHERE test_key = ?", (key,)))
+                test_id = self.conn.execute(
+                    "INSERT INTO tests (test_key, node_id, test_file, recorded_at) VALUES (?, ?, ?, ?)",
+                    (key, node_id, test_file, now)).lastrowid
+                self.conn.executemany(
+                    "INSERT INTO ranges (test_id, file_path, start_line, end_line) VALUES (?, ?, ?, ?)",
+                    ((test_id, file, start, end) for file, lines in files.items() for start, end in line_ranges(lines)))
+            measured = {file for files in covered.values() for file in files} | ran_files | test_files
+            for file in measured:
+                self._remember(repo_path, file)
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('test_root', ?)", (test_root,))
+        return len(covered)
+
+    @staticmethod
+    def _by_test(covered: Dict[str, Dict[str, Set[int]]]) -> Dict[str, Tuple[str, Dict[str, Set[int]]]]:
+        """
+        Merge the contexts of a test's parametrized cases: {test key: (node id without parameters, {file: lines})}.
+        """
+        tests = {}
+        for context, files in covered.items():
+            key, node_id = context.split("|", 1)
+            _, merged = tests.setdefault(key, (re.sub(r"\[.*\]$", "", node_id), defaultdict(set)))
+            for file, lines in files.items():
+                merged[file] |= lines
+        return tests
+
+    def _drop(self, rows):
+        ids = [(row[0],) for row in rows]
+        self.conn.executemany("DELETE FROM ranges WHERE test_id = ?", ids)
+        self.conn.executemany("DELETE FROM tests WHERE id = ?", ids)
+
+    def _remember(self, repo_path: str, file: str):
+        try:
+            blob_sha = git_blob_sha(Path(repo_path, file).read_bytes())
+        except OSError:
+            self.conn.execute("DELETE FROM files WHERE file_path = ?", (file,))
+            return
+        self.conn.execute("INSERT OR REPLACE INTO files (file_path, blob_sha) VALUES (?, ?)", (file, blob_sha))
+
+    def _changed_files(self, repo_path: str) -> Tuple[Set[str], Set[str]]:
+        """
+        (recorded files whose content changed or that disappeared, test files never recorded).
+        """
+        changed = set()
+        for file, blob_sha in self.conn.execute("SELECT file_path, blob_sha FROM files").fetchall():
+            try:
+                if git_blob_sha(Path(repo_path, file).read_bytes()) != blob_sha:
+                    changed.add(file)
+            except OSError:
+                changed.add(file)
+        known = {row[0] for row in self.conn.execute("SELECT file_path FROM files")}
+        test_root = self.test_root()
+        new_tests = {Path(f).relative_to(repo_path).as_posix() for f in scan_files(os.path.join(repo_path, test_root))
+                     if is_test_file(f.name)} - known
+        return changed, new_tests
+
+    def update(self, repo_path: str) -> int:
+        """
+        Re-record only what the working tree invalidated: every test of a changed or
+        new test file, and every test that covered a changed source file. Returns how many tests ran.
+        """
+        changed, new_tests = self._changed_files(repo_path)
+        test_files = {file for file in changed if is_test_file(os.path.basename(file))} | new_tests
+        stale = set()
+        for file in changed - test_files:
+            rows = self.conn.execute("SELECT DISTINCT t.node_id, t.test_file FROM ranges r JOIN tests t"
+                                     " ON t.id = r.test_id WHERE r.file_path = ?", (file,))
+            # tests of re-run test files are covered by running the whole file
+            stale |= {node_id for node_id, test_file in rows if test_file not in test_files}
+        if not test_files and not stale:
+            return 0
+        test_root = self.test_root()
+        root = Path(repo_path, test_root)
+        # pytest runs from test_root, so test files are passed relative to it
+        targets = sorted(stale) + sorted(Path(repo_path, f).relative_to(root).as_posix()
+                                         for f in test_files if Path(repo_path, f).exists())
+        if not targets:
+            with self.conn:
+                for file in test_files:
+                    self._drop(self.conn.execute("SELECT id FROM tests WHERE test_file = ?", (file,)))
+                    self._remember(repo_path, file)
+            return 0
+        ran = self.record(repo_path, test_root, targets, test_files)
+        with self.conn:
+            for file in changed:
+                self._remember(repo_path, file)
+        return ran
+
+    # -- querying ----------------------------------------------------------
+
+    def test_root(self) -> str:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'test_root'").fetchone()
+        return row[0] if row else DEFAULT_TEST_ROOT
+
+    def knows(self, file_path: str) -> bool:
+        """
+        Whether file_path was measured when the index was recorded (new files never were).
+        """
+        return self.conn.execute("SELECT 1 FROM files WHERE file_path = ?", (file_path,)).fetchone() is not None
+
+    def is_current(self, file_path: str, blob_sha: str) -> bool:
+        row = self.conn.execute("SELECT blob_sha FROM files WHERE file_path = ?", (file_path,)).fetchone()
+        return row is not None and row[0] == blob_sha
+
+    def affected_tests(self, changed: Dict[str, Iterable[int]]) -> Dict[TestKey, Set[str]]:
+        """
+        {(test file, test qualname): changed files it covers} for changed = {file: old line numbers}.
+        """
+        affected = defaultdict(set)
+        for file, lines in changed.items():
+            lines = sorted(lines)
+            if not lines:
+                continue
+            rows = self.conn.execute(
+                "SELECT t.test_key, r.start_line, r.end_line FROM ranges r JOIN tests t ON t.id = r.test_id"
+                " WHERE r.file_path = ? AND r.start_line <= ? AND r.end_line >= ?", (file, lines[-1], lines[0]))
+            for key, start, end in rows:
+                i = bisect_left(lines, start)
+                if i < len(lines) and lines[i] <= end:
+                    affected[tuple(key.split("::", 1))].add(file)
+        return dict(affected)
+
+    def affected_by_diff(self, repo_path: str, from_commit: str, to_commit: str) -> Dict[TestKey, Set[str]]:
+        diffs = get_all_diffs(repo_path, from_commit, to_commit)
+        return self.affected_tests({file: changed_lines(diff)[0] for file, diff in diffs.items()})
+
+    def stats(self) -> dict:
+        tests, ranges, files = (self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                                for table in ("tests", "ranges", "files"))
+        return {"tests": tests, "ranges": ranges, "files": files, "bytes": os.path.getsize(self.path)}
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-test line coverage index for selecting the tests a diff affects")
+    parser.add_argument("command", choices=["record", "update", "affected", "stats"],
+                        help="record: run the whole suite; update: re-run invalidated tests; affected: tests a diff touches")
+    parser.add_argument("--repo", default="..", help="Repository root (default: parent directory)")
+    parser.add_argument("--test-root", default=DEFAULT_TEST_ROOT, help="record: directory pytest runs from, relative to the repo")
+    parser.add_argument("--index", default=DEFAULT_COVERAGE_INDEX_PATH, help="Path of the coverage index")
+    parser.add_argument("--from", dest="from_commit", default="HEAD^", help="affected: base commit")
+    parser.add_argument("--to", dest="to_commit", default="HEAD", help="affected: target commit")
+    args = parser.parse_args()
+
+    repo_path = os.path.abspath(args.repo)
+    index = CoverageIndex(args.index)
+    try:
+        if args.command == "record":
+            start = time.perf_counter()
+            ran = index.record(repo_path, args.test_root)
+            print(f"Recorded {ran} tests in {time.perf_counter() - start:.1f}s: {index.stats()}")
+        elif args.command == "update":
+            start = time.perf_counter()
+            ran = index.update(repo_path)
+            print(f"Re-recorded {ran} tests in {time.perf_counter() - start:.1f}s: {index.stats()}")
+        elif args.command == "affected":
+            for (file, name), covered in sorted(index.affected_by_diff(repo_path, args.from_commit, args.to_commit).items()):
+                print(f"{file}::{name}  ({', '.join(sorted(covered))})")
+        else:
+            print(index.stats())
+    finally:
+        index.close()
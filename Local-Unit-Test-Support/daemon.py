@@ -0,0 +1,294 @@
+import argparse
+import http.client
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from ast_analyzer import diff_symbols, detect_cross_file_moves
+from diff_parser import GitObjectReader, changed_lines, list_tree, split_diff
+from impact_graph import ImpactGraph, changed_nodes
+from repo_scanner import scan_files
+from symbol_db import SymbolDB, DEFAULT_SYMBOL_DB_PATH
+
+DEFAULT_PORT = 8765
+DEFAULT_REFRESH_INTERVAL = 2.0
+
+
+def _old_path(file_diff: str, path: str) -> str:
+    for line in file_diff.split("\n"):
+        if line.startswith("rename from "):
+            return line[len("rename from "):]
+        if line.startswith("--- a/"):
+            return line[len("--- a/"):]
+        if line.startswith("@@"):
+            break
+    return path
+
+
+class ImpactDaemon:
+    """
+    Keeps two impact graphs in memory: one of HEAD and one of the working tree.
+    refresh() re-reads only files whose mtime or size changed (and rebuilds the
+    HEAD graph when HEAD moves, from blob shas already in the symbol index), so
+    a query only diffs the symbols of the files in the diff and walks both graphs.
+    """
+
+    def __init__(self, repo_path: str, symbol_db: SymbolDB, refresh_interval: float = DEFAULT_REFRESH_INTERVAL):
+        self.repo_path = repo_path
+        self.symbol_db = symbol_db
+        self.refresh_interval = refresh_interval
+        self.reader = GitObjectReader(repo_path)
+        self.base_graph = ImpactGraph()
+        self.work_graph = ImpactGraph()
+        self.base_commit = None
+        self.file_stats: Dict[str, Tuple[int, int]] = {}
+        self.last_refresh = 0.0
+        self.queries = 0
+
+    def _git(self, *args) -> str:
+        return subprocess.run(["git", "-C", self.repo_path, *args], capture_output=True, text=True).stdout
+
+    def _refresh_base(self) -> bool:
+        head = self._git("rev-parse", "HEAD").strip() or None
+        if head == self.base_commit:
+            return False
+        files = {}
+        if head is not None:
+            for path, blob_sha in list_tree(self.repo_path, head).items():
+                if not path.endswith(".py"):
+                    continue
+                symbols = self.symbol_db.get(blob_sha)
+                if symbols is None:
+                    data = self.reader.read_object(blob_sha)
+                    try:
+                        symbols = self.symbol_db.symbols_for_source(data.decode("utf-8", errors="replace"))
+                    except SyntaxError:
+                        continue
+                files[path] = symbols
+        self.base_graph = ImpactGraph()
+        self.base_graph.update_files(files)
+        self.base_commit = head
+        return True
+
+    def _refresh_files(self, paths) -> int:
+        """
+        Re-read the given repo-relative paths whose stat changed; returns how many were updated.
+        """
+        changes = {}
+        for path in paths:
+            try:
+                stat = os.stat(os.path.join(self.repo_path, path))
+            except OSError:
+                if self.file_stats.pop(path, None) is not None:
+                    changes[path] = None
+                continue
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if self.file_stats.get(path) == signature:
+                continue
+            self.file_stats[path] = signature
+            try:
+                source = Path(self.repo_path, path).read_text(encoding="utf-8")
+                changes[path] = self.symbol_db.symbols_for_source(source)
+            except (OSError, UnicodeDecodeError, SyntaxError):
+                # keep the last parseable version while the file is being edited
+                continue
+        if changes:
+            self.work_graph.update_files(changes)
+        return len(changes)
+
+    def refresh(self) -> int:
+        self.last_refresh = time.monotonic()
+        self._refresh_base()
+        on_disk = {Path(file).relative_to(self.repo_path).as_posix() for file in scan_files(self.repo_path)}
+        updated = self._refresh_files(on_disk | set(self.file_stats))
+        self.symbol_db.conn.commit()
+        return updated
+
+    def maybe_refresh(self):
+        if time.monotonic() - self.last_refresh >= self.refresh_interval:
+            self.refresh()
+
+    def affected(self, diff_text: Optional[str] = None) -> dict:
+        """
+        Tests affected by diff_text, a unified diff of the working tree against HEAD
+        (default: `git diff HEAD`).
+        """
+        started = time.perf_counter()
+        self.queries += 1
+        if diff_text is None:
+            diff_text = self._git("diff", "-M", "HEAD")
+        diffs = {path: file_diff for path, file_diff in split_diff(diff_text).items() if path.endswith(".py")}
+        # the files in the diff may have changed since the last periodic refresh
+        self._refresh_files(diffs)
+        changes_by_file, before_by_file, after_by_file = {}, {}, {}
+        for path, file_diff in diffs.items():
+            before = self.base_graph.files.get(_old_path(file_diff, path))
+            after = self.work_graph.files.get(path)
+            old_lines, new_lines = changed_lines(file_diff)
+            before_symbols = before.symbols if before is not None else []
+            after_symbols = after.symbols if after is not None else []
+            changes_by_file[path] = diff_symbols(before_symbols, after_symbols, after.call_graph if after is not None else {},
+                                                 old_lines, new_lines)
+            before_by_file[path] = before_symbols
+            after_by_file[path] = after_symbols
+        detect_cross_file_moves(changes_by_file, before_by_file, after_by_file)
+        nodes = set()
+        for path, changes in changes_by_file.items():
+            nodes |= changed_nodes(path, changes)
+        # callers of removed code only exist in the HEAD graph, callers of new code in the working tree
+        affected = self.base_graph.affected_tests(nodes) | self.work_graph.affected_tests(nodes)
+        return {
+            "affected_tests": sorted(f"{path}::{name}" for path, name in affected),
+            "changes": {path: changes for path, changes in changes_by_file.items() if any(changes.values())},
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+    def status(self) -> dict:
+        return {
+            "repo": self.repo_path,
+            "head": self.base_commit,
+            "files": len(self.work_graph.files),
+            "queries": self.queries,
+            "seconds_since_refresh": round(time.monotonic() - self.last_refresh, 2),
+        }
+
+    def close(self):
+        self.reader.close()
+        self.symbol_db.close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    GET /status, POST /refresh, POST /affected with an optional {"diff": "..."} body.
+    """
+
+    def _reply(self, code: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/status":
+            self._reply(200, self.server.impact.status())
+        else:
+            self._reply(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError as e:
+            self._reply(400, {"error": f"invalid JSON: {e}"})
+            return
+        if self.path == "/affected":
+            self._reply(200, self.server.impact.affected(body.get("diff")))
+        elif self.path == "/refresh":
+            self._reply(200, {"updated": self.server.impact.refresh()})
+        else:
+            self._reply(404, {"error": f"unknown path {self.path}"})
+
+    def address_string(self):
+        return str(self.client_address[0]) if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _WatchingServer:
+    # serve_forever calls service_actions between requests, so refreshes run on the
+    # serving thread and the graphs and the sqlite connection are never shared
+    def service_actions(self):
+        self.impact.maybe_refresh()
+
+
+class DaemonHTTPServer(_WatchingServer, HTTPServer):
+    def __init__(self, impact: ImpactDaemon, port: int = DEFAULT_PORT):
+        self.impact = impact
+        super().__init__(("127.0.0.1", port), _Handler)
+
+
+class DaemonUnixServer(_WatchingServer, socketserver.UnixStreamServer):
+    def __init__(self, impact: ImpactDaemon, socket_path: str):
+        self.impact = impact
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        super().__init__(socket_path, _Handler)
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float = 10.0):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def query(method: str, path: str, body: Optional[dict] = None, socket_path: Optional[str] = None,
+          port: int = DEFAULT_PORT) -> dict:
+    """
+    Call a running daemon over its Unix socket (socket_path) or local HTTP port.
+    """
+    connection = _UnixHTTPConnection(socket_path) if socket_path else http.client.HTTPConnection("127.0.0.1", port, timeout=10.0)
+    try:
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        connection.request(method, path, body=data, headers={"Content-Type": "application/json"})
+        return json.loads(connection.getresponse().read())
+    finally:
+        connection.close()
+
+
+def serve(repo_path: str, socket_path: Optional[str] = None, port: int = DEFAULT_PORT,
+          symbol_db_path: str = DEFAULT_SYMBOL_DB_PATH, refresh_interval: float = DEFAULT_REFRESH_INTERVAL):
+    impact = ImpactDaemon(repo_path, SymbolDB(symbol_db_path), refresh_interval)
+    started = time.perf_counter()
+    impact.refresh()
+    print(f"Indexed {len(impact.work_graph.files)} files in {time.perf_counter() - started:.2f}s")
+    server = DaemonUnixServer(impact, socket_path) if socket_path else DaemonHTTPServer(impact, port)
+    print(f"Serving {repo_path} on {socket_path or f'http://127.0.0.1:{port}'}")
+    try:
+        server.serve_forever(poll_interval=min(0.5, refresh_interval))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        impact.close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep the impact graph warm and answer affected-test queries")
+    parser.add_argument("command", choices=["serve", "query", "status"], help="Run the daemon or ask a running one")
+    parser.add_argument("--repo", default="..", help="Repository to watch (default: parent directory)")
+    parser.add_argument("--socket", default=None, help="Unix socket path (default: HTTP on 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Local HTTP port")
+    parser.add_argument("--symbol-db", default=DEFAULT_SYMBOL_DB_PATH, help="Path of the parsed-symbol cache keyed by git blob sha")
+    parser.add_argument("--refresh-interval", type=float, default=DEFAULT_REFRESH_INTERVAL, help="Seconds between working tree scans")
+    parser.add_argument("--staged", action="store_true", help="query: send the staged diff instead of the whole working tree")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(os.path.abspath(args.repo), args.socket, args.port, args.symbol_db, args.refresh_interval)
+    elif args.command == "status":
+        print(json.dumps(query("GET", "/status", socket_path=args.socket, port=args.port), indent=2))
+    else:
+        body = {}
+        if args.staged:
+            body["diff"] = subprocess.run(["git", "-C", args.repo, "diff", "--cached", "-M"], capture_output=True, text=True).stdout
+        result = query("POST", "/affected", body, socket_path=args.socket, port=args.port)
+        for test in result["affected_tests"]:
+            print(test)
+        print(f"{len(result['affected_tests'])} affected tests ({result['elapsed_ms']}ms)", file=sys.stderr)
@@ -1,5 +1,5 @@
 import subprocess
-from typing import List
+from typing import Dict, List, Optional, Tuple
 import os
 import tempfile
 import sys
@@ -7,26 +7,35 @@ from pathlib import Path
 import argparse
 import shutil
 
+import metrics
+
+def run_git(cmd: List[str], **kwargs) -> subprocess.CompletedProcess:
+    """
+    subprocess.run for one git command, counted in the run's metrics.
+    """
+    metrics.count("git_subprocesses")
+    return subprocess.run(cmd, **kwargs)
+
 def get_changed_files(repo_path: str, from_commit:str, to_commit:str) -> List[str]:
     cmd = ["git", "-C", repo_path, "diff", "--name-only", from_commit, to_commit]
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    result = run_git(cmd, capture_output=True, text=True)
     #print(repo_path,result.stdout)
     return result.stdout.strip().split("\n")
 
 def get_unpushed_changed_files(repo_path: str, upstream_branch: str = "origin/main") -> List[str]:
     cmd = ["git", "-C", repo_path, "diff", "--name-only", f"{upstream_branch}..HEAD"]
-    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    result = run_git(cmd, capture_output=True, text=True, check=True)
     changed_files = result.stdout.strip().split("\n")
     return [f for f in changed_files if f]
 
 def get_diff(repo_path: str, file_path: str, from_commit:str, to_commit:str) -> str:
     cmd = ["git", "-C", repo_path, "diff", from_commit, to_commit, "--", file_path]
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    result = run_git(cmd, capture_output=True, text=True)
     return result.stdout
 
 def get_diff_from_remote(repo_path: str, file_path: str, upstream_branch: str = "origin/main") -> str:
     cmd = ["git", "-C", repo_path, "diff", f"{upstream_branch}..HEAD", "--", file_path]
-    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    result = run_git(cmd, capture_output=True, text=True, check=True)
     return result.stdout
 
 def load_file(repo_path, file_path):
@@ -35,12 +44,167 @@ def load_file(repo_path, file_path):
 
 def load_file_from_previous_commit(repo_path: str, file_path: str, from_commit:str) -> str:
     cmd = ["git", "-C", repo_path, "show", f"{from_commit}:{file_path}"]
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    result = run_git(cmd, capture_output=True, text=True)
     if result.returncode != 0:
         print(f"Warning: Could not load previous version of {file_path}")
         return ""
     return result.stdout
 
+def get_name_status(repo_path: str, from_commit: str, to_commit: str) -> List[Tuple[str, str, str]]:
+    """
+    Return (status, old_path, new_path) for every changed file, renames included, from one git call.
+    """
+    cmd = ["git", "-C", repo_path, "diff", "--name-status", "-z", "-M", from_commit, to_commit]
+    result = run_git(cmd, capture_output=True)
+    if result.returncode != 0:
+        raise ValueError(f"Cannot diff {from_commit!r}..{to_commit!r}: {result.stderr.decode('utf-8', errors='replace').strip()}")
+    fields = result.stdout.decode("utf-8", errors="replace").split("\0")
+    entries = []
+    i = 0
+    while i < len(fields) and fields[i]:
+        status = fields[i]
+        if status[0] in ("R", "C"):
+            entries.append((status[0], fields[i + 1], fields[i + 2]))
+            i += 3
+        else:
+            entries.append((status[0], fields[i + 1], fields[i + 1]))
+            i += 2
+    return entries
+
+# the object id of an empty tree, used as the parent of root commits
+EMPTY_TREE_SHA = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+
+def rev_list(repo_path: str, rev_range: str) -> List[Tuple[str, str]]:
+    """
+    (commit, first parent) for every commit of rev_range (e.g. "v1.0..main"), oldest first,
+    following first parents only. Root commits get EMPTY_TREE_SHA as their parent.
+    """
+    cmd = ["git", "-C", repo_path, "rev-list", "--reverse", "--first-parent", "--parents", rev_range]
+    result = run_git(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise ValueError(f"Invalid revision range {rev_range!r}: {result.stderr.strip()}")
+    pairs = []
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        pairs.append((parts[0], parts[1] if len(parts) > 1 else EMPTY_TREE_SHA))
+    return pairs
+
+def list_tree(repo_path: str, commit: str) -> Dict[str, str]:
+    """
+    {path: blob sha} of every file in commit.
+    """
+    cmd = ["git", "-C", repo_path, "ls-tree", "-r", "-z", commit]
+    result = run_git(cmd, capture_output=True)
+    files = {}
+    for entry in result.stdout.decode("utf-8", errors="replace").split("\0"):
+        if not entry:
+            continue
+        info, path = entry.split("\t", 1)
+        _, object_type, sha = info.split()
+        if object_type == "blob":
+            files[path] = sha
+    return files
+
+def split_diff(diff_text: str) -> Dict[str, str]:
+    """
+    Split the output of one `git diff` into {path: diff of that file}.
+    Deleted files are keyed by their old path, everything else by the new one.
+    """
+    diffs = {}
+    chunks = diff_text.split("\ndiff --git ")
+    for i, chunk in enumerate(chunks):
+        if not chunk.strip():
+            continue
+        chunk = chunk if i == 0 else "diff --git " + chunk
+        path = None
+        old_path = None
+        for line in chunk.split("\n"):
+            if line.startswith("+++ b/"):
+                path = line[6:]
+                break
+            if line.startswith("--- a/"):
+                old_path = line[6:]
+            elif line.startswith("rename to "):
+                path = line[10:]
+            elif line.startswith("@@"):
+                break
+        if path is None and old_path is None:
+            # mode-only or binary change: fall back to the "diff --git a/x b/y" header
+            header = chunk.split("\n", 1)[0]
+            path = header.rsplit(" b/", 1)[-1]
+        diffs[path or old_path] = chunk if chunk.endswith("\n") else chunk + "\n"
+    return diffs
+
+def get_all_diffs(repo_path: str, from_commit: str, to_commit: str) -> Dict[str, str]:
+    cmd = ["git", "-C", repo_path, "diff", "-M", from_commit, to_commit]
+    result = run_git(cmd, capture_output=True)
+    if result.returncode != 0:
+        raise ValueError(f"Cannot diff {from_commit!r}..{to_commit!r}: {result.stderr.decode('utf-8', errors='replace').strip()}")
+    return split_diff(result.stdout.decode("utf-8", errors="replace"))
+
+def changed_lines(diff_text: str) -> Tuple[List[int], List[int]]:
+    """
+    Line numbers touched by a unified diff: (removed lines of the old file, added lines of the new file).
+    Insertions also mark the old lines around the insertion point, and deletions the new
+    lines around theirs, so the enclosing function on the other side counts as touched.
+    """
+    old_lines, new_lines = set(), set()
+    old_no = new_no = 0
+    for line in diff_text.split("\n"):
+        if line.startswith("@@"):
+            ranges = line.split("@@")[1].split()
+            old_no = int(ranges[0][1:].split(",")[0])
+            new_no = int(ranges[1][1:].split(",")[0])
+        elif line.startswith("---") or line.startswith("+++") or not old_no and not new_no:
+            continue
+        elif line.startswith("-"):
+            old_lines.add(old_no)
+            new_lines.update((max(new_no - 1, 1), new_no))
+            old_no += 1
+        elif line.startswith("+"):
+            new_lines.add(new_no)
+            old_lines.update((max(old_no - 1, 1), old_no))
+            new_no += 1
+        elif line.startswith(" "):
+            old_no += 1
+            new_no += 1
+    return sorted(old_lines), sorted(new_lines)
+
+class GitObjectReader:
+    """
+    Reads blobs through one long-lived `git cat-file --batch` process instead of a `git show` per file.
+    """
+    def __init__(self, repo_path: str):
+        metrics.count("git_subprocesses")
+        self.process = subprocess.Popen(
+            ["git", "-C", repo_path, "cat-file", "--batch"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        )
+
+    def read(self, commit: str, file_path: str) -> Optional[bytes]:
+        return self.read_object(f"{commit}:{file_path}")
+
+    def read_object(self, object_name: str) -> Optional[bytes]:
+        """
+        Content of any object name git accepts, e.g. a blob sha or "<commit>:<path>".
+        """
+        self.process.stdin.write(f"{object_name}\n".encode("utf-8"))
+        self.process.stdin.flush()
+        header = self.process.stdout.readline()
+        parts = header.split()
+        if len(parts) != 3:
+            # "<object> missing" or "<object> ambiguous"
+            return None
+        data = self.process.stdout.read(int(parts[2]))
+        self.process.stdout.read(1)
+        return data
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.stdin.close()
+            self.process.wait()
+            self.process.stdout.close()
+
 class GitDiffParser:
     def __init__(self, from_commit="HEAD^", to_commit="HEAD", keep_repo=False):
         self.from_commit = from_commit
@@ -64,8 +228,10 @@ class GitDiffParser:
         # print(f"Cloning {repo_url} into {self.repo_path}")
         # self.run_command(f"git clone {repo_url}", cwd=temp_dir)
         print(f"Fetching diff: {from_commit} -> {to_commit}")
-        
-        
+        self._name_status = None
+        self._diffs = None
+        self._reader = None
+
     def run_command(self,cmd, cwd=None):
         result = subprocess.run(cmd, shell=True, text=True, capture_output=True, cwd=cwd)
         if result.returncode != 0:
@@ -74,17 +240,47 @@ class GitDiffParser:
             sys.exit(1)
         return result.stdout
     
+    def get_name_status(self):
+        if self._name_status is None:
+            self._name_status = get_name_status(self.repo_path, self.from_commit, self.to_commit)
+        return self._name_status
+
     def get_changed_files(self):
-        return get_changed_files(self.repo_path, self.from_commit, self.to_commit)
+        return [new_path for _, _, new_path in self.get_name_status()]
+
+    def get_renames(self) -> Dict[str, str]:
+        """
+        {new path: old path} for files renamed between the two commits.
+        """
+        return {new_path: old_path for status, old_path, new_path in self.get_name_status() if status == "R"}
 
     def load_file(self, file_path):
         return load_file(self.repo_path, file_path)
+
+    def load_file_at_commit(self, file_path, commit):
+        if self._reader is None:
+            self._reader = GitObjectReader(self.repo_path)
+        data = self._reader.read(commit, file_path)
+        if data is None:
+            print(f"Warning: Could not load {file_path} at {commit}")
+            return ""
+        return data.decode("utf-8", errors="replace")
     
     def load_file_from_previous_commit(self, file_path):
-        return load_file_from_previous_commit(self.repo_path, file_path, self.from_commit)
+        return self.load_file_at_commit(self.get_renames().get(file_path, file_path), self.from_commit)
+
+    def load_file_from_target_commit(self, file_path):
+        return self.load_file_at_commit(file_path, self.to_commit)
     
     def get_diff(self, file_path):
-        return get_diff(self.repo_path, file_path, self.from_commit, self.to_commit)
+        if self._diffs is None:
+            self._diffs = get_all_diffs(self.repo_path, self.from_commit, self.to_commit)
+        return self._diffs.get(file_path, "")
+
+    def close(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
 
   
 if __name__ == "__main__":
@@ -102,3 +298,4 @@ if __name__ == "__main__":
         print(f"Changed file: {file}")
         diff = git_parser.get_diff(file)
         print("get different: ",diff)
+    git_parser.close()
@@ -0,0 +1,120 @@
+import hashlib
+import os
+import sqlite3
+import time
+from array import array
+from typing import Dict, List, Optional
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".embedding_cache.sqlite")
+
+
+def embedding_cache_key(code: str, model: str) -> str:
+    """
+    Content address of a code block: sha256 over the embedding model name and the code.
+    """
+    digest = hashlib.sha256()
+    digest.update(model.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(code.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache keyed by embedding_cache_key().
+
+    Entries older than max_age_seconds are dropped, and once more than max_entries
+    are stored the least recently used ones are evicted.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = 100_000, max_age_seconds: Optional[float] = 30 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS embeddings_accessed_at ON embeddings(accessed_at)")
+        self.conn.commit()
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return self.max_age_seconds is not None and now - created_at > self.max_age_seconds
+
+    def get(self, code: str, model: str) -> Optional[List[float]]:
+        key = embedding_cache_key(code, model)
+        row = self.conn.execute("SELECT vector, created_at FROM embeddings WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        if row is None or self._is_expired(row[1], now):
+            self.misses += 1
+            return None
+        self.conn.execute("UPDATE embeddings SET accessed_at = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return array("f", row[0]).tolist()
+
+    def get_many(self, codes: List[str], model: str) -> Dict[str, List[float]]:
+        """
+        Look up several code blocks at once; returns {code: vector} for the hits only.
+        """
+        found = {}
+        for code in codes:
+            vector = self.get(code, model)
+            if vector is not None:
+                found[code] = vector
+        self.conn.commit()
+        return found
+
+    def put(self, code: str, model: str, vector: List[float]):
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO embeddings (key, model, vector, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (embedding_cache_key(code, model), model, array("f", vector).tobytes(), now, now),
+        )
+
+    def put_many(self, items: Dict[str, List[float]], model: str):
+        for code, vector in items.items():
+            self.put(code, model, vector)
+        self.conn.commit()
+        self.evict()
+
+    def evict(self):
+        """
+        Drop expired entries, then the least recently used ones above max_entries.
+        """
+        removed = 0
+        if self.max_age_seconds is not None:
+            cutoff = time.time() - self.max_age_seconds
+            removed += self.conn.execute("DELETE FROM embeddings WHERE created_at < ?", (cutoff,)).rowcount
+        count = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count > self.max_entries:
+            removed += self.conn.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY accessed_at ASC LIMIT ?)",
+                (count - self.max_entries,),
+            ).rowcount
+        self.conn.commit()
+        self.evictions += removed
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0],
+        }
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
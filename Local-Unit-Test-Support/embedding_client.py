@@ -0,0 +1,263 @@
+import argparse
+import hashlib
+import math
+import os
+import re
+import time
+from abc import ABC, abstractmethod
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import metrics
+from request_utils import call_with_retry, estimate_tokens, post_json
+
+EMBEDDING_MODEL = "text-embedding-004"
+# embed_content accepts at most 100 contents per request and 2048 tokens per content
+MAX_BATCH_SIZE = 100
+MAX_INPUT_TOKENS = 2048
+MAX_BATCH_TOKENS = 20_000
+
+
+class EmbeddingBackend(ABC):
+    """
+    Interface of every embedding backend: a model name (part of the embedding
+    cache key) and embed_batch(), called with at most one request's worth of texts.
+    """
+    model: str
+
+    @abstractmethod
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        ...
+
+
+class GeminiEmbeddingBackend(EmbeddingBackend):
+    """
+    Sends batches to google.genai embed_content through a single shared client.
+    """
+
+    def __init__(self, model: str = EMBEDDING_MODEL, task_type: str = "RETRIEVAL_QUERY"):
+        from dotenv import load_dotenv
+        from google import genai
+        from google.genai.types import EmbedContentConfig
+
+        load_dotenv()
+        self.model = model
+        self.client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+        self.config = EmbedContentConfig(task_type=task_type)
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        response = self.client.models.embed_content(model=self.model, contents=texts, config=self.config)
+        return [embedding.values for embedding in response.embeddings]
+
+
+class FakeEmbeddingBackend(EmbeddingBackend):
+    """
+    Deterministic offline embeddings derived from a hash of the text.
+    latency simulates the per-request round trip so throughput can be benchmarked.
+    """
+
+    def __init__(self, dim: int = 768, latency: float = 0.0, model: str = "fake-embedding"):
+        self.dim = dim
+        self.latency = latency
+        self.model = model
+
+    def embed_one(self, text: str) -> List[float]:
+        seed = hashlib.sha256(text.encode("utf-8")).digest()
+        stream = hashlib.shake_256(seed).digest(self.dim * 4)
+        values = array("I", stream)
+        return [v / 0xFFFFFFFF - 0.5 for v in values]
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [self.embed_one(text) for text in texts]
+
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|[^\sA-Za-z0-9_]")
+_SUBWORD = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """
+    Local CPU embeddings with the hashing trick: identifiers, their snake/camel-case
+    parts and adjacent token pairs are hashed into dim signed buckets, weighted by
+    log term frequency and L2-normalized. No model download, no network.
+    """
+
+    def __init__(self, dim: int = 768):
+        self.dim = dim
+        self.model = f"hashing-{dim}"
+
+    def features(self, text: str) -> List[str]:
+        tokens = _IDENTIFIER.findall(text)
+        features = list(tokens)
+        for token in tokens:
+            parts = [part.lower() for piece in token.split("_") for part in _SUBWORD.findall(piece)]
+            if len(parts) > 1:
+                features.extend(parts)
+        features.extend(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+        return features
+
+    def embed_one(self, text: str) -> List[float]:
+        counts = {}
+        for feature in self.features(text):
+            counts[feature] = counts.get(feature, 0) + 1
+        vector = [0.0] * self.dim
+        for feature, count in counts.items():
+            digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            sign = 1.0 if digest >> 63 else -1.0
+            vector[digest % self.dim] += sign * (1.0 + math.log(count))
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_one(text) for text in texts]
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """
+    Local embeddings from a sentence-transformers model (optional dependency).
+    """
+
+    def __init__(self, model: str = "all-MiniLM-L6-v2", device: str = "cpu"):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = f"sentence-transformers/{model}"
+        self.encoder = SentenceTransformer(model, device=device)
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return self.encoder.encode(texts, normalize_embeddings=True).tolist()
+
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    """
+    Any server implementing the OpenAI /embeddings endpoint (vLLM, llama.cpp, Ollama, ...).
+    """
+
+    def __init__(self, base_url: str = "http://localhost:8000/v1", model: str = "nomic-embed-text",
+                 api_key: Optional[str] = None, timeout: float = 120.0):
+        self.url = base_url.rstrip("/") + "/embeddings"
+        self.model = model
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.timeout = timeout
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        response = post_json(self.url, {"model": self.model, "input": texts}, self.api_key, self.timeout)
+        return [item["embedding"] for item in sorted(response["data"], key=lambda item: item["index"])]
+
+
+EMBEDDING_BACKENDS = {
+    "gemini": GeminiEmbeddingBackend,
+    "fake": FakeEmbeddingBackend,
+    "hashing": HashingEmbeddingBackend,
+    "sentence-transformers": SentenceTransformerBackend,
+    "openai": OpenAIEmbeddingBackend,
+}
+
+
+def make_embedding_backend(name: str, **options) -> EmbeddingBackend:
+    """
+    Build the backend registered under name, passing options (e.g. from a backend config file) to it.
+    """
+    if name not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend {name!r}, expected one of {sorted(EMBEDDING_BACKENDS)}")
+    return EMBEDDING_BACKENDS[name](**options)
+
+
+class EmbeddingClient:
+    """
+    Packs texts into batches bounded by count and estimated tokens and sends them
+    through a bounded thread pool, retrying failed requests with exponential backoff.
+    """
+
+    def __init__(self, backend, max_batch_size: int = MAX_BATCH_SIZE, max_batch_tokens: int = MAX_BATCH_TOKENS,
+                 max_input_tokens: int = MAX_INPUT_TOKENS, max_workers: int = 4, max_retries: int = 5,
+                 backoff_base: float = 1.0, backoff_max: float = 30.0):
+        self.backend = backend
+        self.model = backend.model
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_input_tokens = max_input_tokens
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.requests_sent = 0
+
+    def truncate(self, text: str) -> str:
+        max_chars = self.max_input_tokens * 4
+        return text if len(text) <= max_chars else text[:max_chars]
+
+    def make_batches(self, texts: List[str]) -> List[List[int]]:
+        """
+        Group text indices into batches that respect max_batch_size and max_batch_tokens.
+        """
+        batches = []
+        current, current_tokens = [], 0
+        for i, text in enumerate(texts):
+            tokens = min(estimate_tokens(text), self.max_input_tokens)
+            if current and (len(current) >= self.max_batch_size or current_tokens + tokens > self.max_batch_tokens):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        self.requests_sent += 1
+        return self.backend.embed_batch(texts)
+
+    def _embed_with_retry(self, texts: List[str]) -> List[List[float]]:
+        return call_with_retry(lambda: self._embed_batch(texts), self.max_retries, self.backoff_base, self.backoff_max,
+                               label="Embedding request")
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        texts = [self.truncate(text) for text in texts]
+        batches = self.make_batches(texts)
+        metrics.count("blocks_embedded", len(texts))
+        metrics.count("embedding_requests", len(batches))
+        results = [None] * len(texts)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [(batch, executor.submit(self._embed_with_retry, [texts[i] for i in batch])) for batch in batches]
+            for batch, future in futures:
+                for i, vector in zip(batch, future.result()):
+                    results[i] = vector
+        return results
+
+
+def benchmark(num_blocks: int, latency: float, max_workers: int, max_batch_size: int, backend_name: str = "fake"):
+    texts = [f"def func_{i}(x):\n    return x + {i}\n" * (1 + i % 10) for i in range(num_blocks)]
+    backend = FakeEmbeddingBackend(latency=latency) if backend_name == "fake" else make_embedding_backend(backend_name)
+
+    start = time.perf_counter()
+    for text in texts:
+        backend.embed_batch([text])
+    serial = time.perf_counter() - start
+
+    client = EmbeddingClient(backend, max_batch_size=max_batch_size, max_workers=max_workers)
+    start = time.perf_counter()
+    client.embed(texts)
+    batched = time.perf_counter() - start
+
+    simulated = f", simulated latency: {latency * 1000:.0f}ms/request" if backend_name == "fake" else ""
+    print(f"Backend: {backend.model}, blocks: {num_blocks}{simulated}")
+    print(f"Per-block requests: {num_blocks} requests, {serial:.2f}s ({num_blocks / serial:.0f} blocks/s)")
+    print(f"Batched + concurrent: {client.requests_sent} requests, {batched:.2f}s ({num_blocks / batched:.0f} blocks/s)")
+    print(f"Speedup: {serial / batched:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark embedding throughput (default: the offline fake backend)")
+    parser.add_argument("--blocks", type=int, default=2000, help="Number of synthetic code blocks")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per request")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent requests")
+    parser.add_argument("--batch-size", type=int, default=MAX_BATCH_SIZE, help="Texts per request")
+    parser.add_argument("--backend", choices=sorted(EMBEDDING_BACKENDS), default="fake", help="Backend to benchmark")
+    args = parser.parse_args()
+
+    benchmark(args.blocks, args.latency, args.workers, args.batch_size, args.backend)
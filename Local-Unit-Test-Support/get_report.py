@@ -1,164 +1,79 @@
-from pathlib import Path
-from diff_parser import GitDiffParser,load_file_from_previous_commit
 import argparse
-from typing import List
-import ast
-import faiss
-import numpy as np
 import json
-from dotenv import load_dotenv 
 import os
-from google import genai
-from google.genai.types import EmbedContentConfig
-from test_linker import extract_call_graph, expand_calls
-from ast_analyzer import analyze_ast_diff
-from llm_engine import GeminiSuggester
-from reporter import generate_suggestion_markdown
+from embedding_cache import DEFAULT_CACHE_PATH
+from symbol_db import DEFAULT_SYMBOL_DB_PATH
+from impact_graph import DEFAULT_GRAPH_PATH
+from request_planner import DEFAULT_CHUNK_TOKENS
+from response_cache import DEFAULT_RESPONSE_CACHE_PATH
+from vector_store import DEFAULT_INDEX_PATH, INDEX_TYPES
+from metadata_store import DEFAULT_META_PATH
+from coverage_index import DEFAULT_COVERAGE_INDEX_PATH
+from affected_runner import DEFAULT_TEST_HISTORY_PATH
+from embedding_client import EMBEDDING_BACKENDS
+from llm_engine import SUGGESTION_BACKENDS
 
-def get_code_files(repo_path: str, include_pattern="*.py", exclude_dirs=["venv", "__pycache__"]) -> List[str]:
-    repo = Path(repo_path).resolve()
-    code_files = []
-    for file in repo.rglob(include_pattern):
-        if not any(ex in file.parts for ex in exclude_dirs):
-            #relative_path = file.relative_to(repo).as_posix()
-            code_files.append(file)
-    return code_files
+def load_backend_config(path):
+    """
+    Read a JSON backend config such as
+    {"embedding": {"backend": "openai", "base_url": "http://localhost:8000/v1", "model": "nomic-embed-text"},
+     "suggestion": {"backend": "mock"}}
+    and split it into backend names and constructor options per kind.
+    """
+    with open(path) as f:
+        config = json.load(f)
+    names = {}
+    options = {}
+    for kind in ("embedding", "suggestion"):
+        section = dict(config.get(kind, {}))
+        names[kind] = section.pop("backend", None)
+        options[kind] = section
+    return names, options
 
-def extract_code_blocks(file_path: Path, repo_path: str):
-    repo_path = Path(repo_path)
-    code_blocks = {}
-    source = file_path.read_text(encoding="utf-8")
-    tree = ast.parse(source)
-    relative_path = file_path.relative_to(repo_path)
-    
-    for node in ast.walk(tree):
-        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
-            block_type = "function" if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) else "class"
-            name = node.name
-            start_line = node.lineno - 1
-            end_line = node.end_lineno
-            code_chunk = "\n".join(source.splitlines()[start_line:end_line])
-            key = (str(relative_path), name)
-            code_blocks[key] = {
-                "symbol_type": block_type,
-                "symbol_name": name,
-                "file_path": str(relative_path),
-                "code": code_chunk
-            }
-    return code_blocks
-
-def get_embedding(text: str):
-    load_dotenv()
-    api_key = os.getenv("GEMINI_API_KEY")
-    client = genai.Client(api_key=api_key)
-    response = client.models.embed_content(
-        model="text-embedding-004",
-        contents=[
-            text
-        ],
-        config=EmbedContentConfig(
-            task_type="RETRIEVAL_QUERY",
-        ),
-    )
-    return response.embeddings[0].values
-
-def save_to_faiss(embeddings, metadata, save_path="index.faiss", meta_path="metadata.json"):
-    dim = len(embeddings[0])
-    index = faiss.IndexFlatL2(dim)
-    index.add(np.array(embeddings).astype("float32"))
-    faiss.write_index(index, save_path)
+def main(from_commit, to_commit, keep_repo, output_filename, embedding_cache_path=DEFAULT_CACHE_PATH,
+         embedding_backend=None, embedding_workers=4, incremental=False,
+         index_path=DEFAULT_INDEX_PATH, meta_path=DEFAULT_META_PATH, index_type="flat", workers=None,
+         symbol_db_path=DEFAULT_SYMBOL_DB_PATH, use_impact_graph=False, graph_path=DEFAULT_GRAPH_PATH,
+         chunk_tokens=DEFAULT_CHUNK_TOKENS, llm_workers=4, use_response_cache=True,
+         response_cache_path=DEFAULT_RESPONSE_CACHE_PATH, stream=False, suggestion_backend=None,
+         backend_config=None, retrieve_k=0, profile_path=None, stacks_path=None, coverage_index_path=None,
+         run_tests=False, test_workers=None, test_history_path=DEFAULT_TEST_HISTORY_PATH):
+    """
+    Synchronous entry point; the work runs as the concurrent stages of pipeline.ReportPipeline.
+    Backends given as arguments win over backend_config; both default to gemini.
+    profile_path receives the run's metrics as JSON and stacks_path a sampled
+    profile of every thread in flamegraph's folded format.
+    run_tests also runs the affected tests and appends their results to the report.
+    """
+    # the pipeline and its asyncio machinery are only loaded once there is work to run
+    import asyncio
+    from metrics import StackSampler
+    from pipeline import ReportPipeline
 
-    json_metadata = [
-        {
-            "file_path": key[0],
-            "symbol_name": key[1],
-            **value
-        }
-        for key, value in metadata.items()
-    ]
-
-    with open("metadata.json", "w", encoding="utf-8") as f:
-        json.dump(json_metadata, f, ensure_ascii=False, indent=2)
-
-def main(from_commit, to_commit, keep_repo, output_filename):
     output_filename += ".md"
-    whole_git_diff = ""
-    whole_test_code = ""
-    affected_metadata_list = []
-    git_diff_message_list = []
     report_path = os.path.join(os.path.dirname(__file__), output_filename)
-    git_parser = GitDiffParser(from_commit, to_commit, keep_repo)
-    repo_path = git_parser.repo_path
-    code_metadata_path = os.path.join(repo_path, "Demo-Project")
-    # get all code files
-    code_files = get_code_files(code_metadata_path)
-    # divide into chunks
-    print("Prepare Code Chunk Metadata")
-    code_blocks = {}
-    for file in code_files:
-        code_block = extract_code_blocks(file, repo_path)
-        code_blocks.update(code_block)
-    # create embeddings
-    embeddings = [get_embedding(b["code"]) for b in code_blocks.values()]
-    print("Save embeddings into Vector Database")
-    # save to vector database
-    save_to_faiss(embeddings, code_blocks)
-    changed_files = git_parser.get_changed_files()
-    changed_functions = {}
-    print("Parse codebase with AST")
-    for file in changed_files:
-        filename = file.split('/')[-1]
-        if "test_" in filename or "_test" in filename or not filename.endswith(".py"):
-            continue
+    names, backend_options = load_backend_config(backend_config) if backend_config else ({}, None)
+    embedding_backend = embedding_backend or names.get("embedding") or "gemini"
+    suggestion_backend = suggestion_backend or names.get("suggestion") or "gemini"
+    pipeline = ReportPipeline(from_commit, to_commit, keep_repo, report_path, embedding_cache_path,
+                              embedding_backend, embedding_workers, incremental, index_path, meta_path,
+                              index_type, workers, symbol_db_path, use_impact_graph, graph_path,
+                              chunk_tokens, llm_workers, use_response_cache, response_cache_path, stream,
+                              suggestion_backend=suggestion_backend, backend_options=backend_options,
+                              retrieve_k=retrieve_k, coverage_index_path=coverage_index_path,
+                              run_tests=run_tests, test_workers=test_workers, test_history_path=test_history_path)
+    sampler = StackSampler().start() if stacks_path else None
+    try:
+        return asyncio.run(pipeline.run())
+    finally:
+        if sampler is not None:
+            sampler.stop()
+            sampler.save(stacks_path)
+            print(f"Stack samples written to {stacks_path}")
+        if profile_path:
+            pipeline.metrics.save(profile_path)
+            print(f"Metrics written to {profile_path}")
 
-        before_code = git_parser.load_file_from_previous_commit(file)
-        after_code = load_file_from_previous_commit(repo_path, file, to_commit)
-        changes = analyze_ast_diff(before_code, after_code)
-        changed_functions[file] = changes
-        git_diff_message = git_parser.get_diff(file)
-        git_diff_message_list.append(git_diff_message)
-    whole_git_diff = "\n".join(git_diff_message_list)
-    all_changed = []
-    for file, changes in changed_functions.items():
-        all_changed = (
-            changes.get("added", []) +
-            changes.get("removed", []) +
-            changes.get("modified", []) +
-            changes.get("indirect_dependents", [])
-        )
-    print("Find Affected Test functions")
-    for root, _, files in os.walk(repo_path):
-        for filename in files:
-            if ("test_" in filename or "_test" in filename) and filename.endswith(".py"):
-                test_path = os.path.join(root, filename)
-                relative_path = str(Path(test_path).relative_to(Path(repo_path)))
-                with open(test_path, "r") as tf:
-                    try:
-                        test_code = tf.read()
-                        call_map = extract_call_graph(test_code)
-                        test_func2call_func = expand_calls(call_map)
-                        filename_code = relative_path + "\n" + test_code
-                        affected_test_function = [k for k, v in test_func2call_func.items() if any(func in all_changed for func in v)]
-                        path_funcname_pair = [(relative_path, func_name) for func_name in affected_test_function]
-                        affected_metadata = [code_blocks[k] for k in path_funcname_pair if k in code_blocks]
-                        affected_metadata_list.extend(affected_metadata)
-                        whole_test_code += filename_code + "\n"
-                    except Exception as e:
-                        print(f"Error parsing {test_path}: {e}")
-                        continue
-    gemini_suggester = GeminiSuggester()
-    print("Generate LLM Suggestions")
-    suggestions = gemini_suggester.get_test_suggestions(affected_metadata_list, whole_test_code, whole_git_diff)
-    if suggestions:
-        print(f"Report Generated at {report_path}")
-        report = generate_suggestion_markdown(suggestions)
-        with open(report_path, "w") as f:
-            f.write("# Test Maintenance Report\n\n")
-            f.write("This report generates suggestions for updating your unit tests based on file changes. \n")
-            f.write(report)
-    else:
-        print("No suggestions--------------------------------")
-    
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Show git diff between two commits in a GitHub repo")
@@ -167,6 +82,36 @@ if __name__ == "__main__":
     parser.add_argument("--to", dest="to_commit", default="HEAD", help="Target commit (default: HEAD)")
     parser.add_argument("--keep",  action="store_true", help="Keep cloned repo after diff (default: delete)")
     parser.add_argument("--output", default="report")
+    parser.add_argument("--embedding-cache", default=DEFAULT_CACHE_PATH, help="Path of the on-disk embedding cache")
+    parser.add_argument("--embedding-backend", choices=sorted(EMBEDDING_BACKENDS), default=None, help="Embedding backend (default: gemini; hashing and fake run offline)")
+    parser.add_argument("--suggestion-backend", choices=sorted(SUGGESTION_BACKENDS), default=None, help="Suggestion backend (default: gemini; mock runs offline)")
+    parser.add_argument("--backend-config", default=None, help="JSON file choosing backends and their options; flags take precedence")
+    parser.add_argument("--embedding-workers", type=int, default=4, help="Concurrent embedding requests")
+    parser.add_argument("--incremental", action="store_true", help="Update the existing FAISS index with only the symbols touched by the diff")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat", help="FAISS index layout (default: exact flat)")
+    parser.add_argument("--workers", type=int, default=None, help="Processes used to parse source files (default: CPU count)")
+    parser.add_argument("--impact-graph", action="store_true", help="Select affected tests with the cross-module call graph instead of name matching")
+    parser.add_argument("--chunk-tokens", type=int, default=DEFAULT_CHUNK_TOKENS, help="Estimated token budget per suggestion request")
+    parser.add_argument("--llm-workers", type=int, default=4, help="Concurrent suggestion requests")
+    parser.add_argument("--no-cache", action="store_true", help="Always call the LLM instead of reusing cached responses")
+    parser.add_argument("--symbol-db", default=DEFAULT_SYMBOL_DB_PATH, help="Path of the parsed-symbol cache keyed by git blob sha")
+    parser.add_argument("--retrieve-k", type=int, default=0, help="Also send the k tests most similar to the changed symbols in the vector index (default: off)")
+    parser.add_argument("--stream", action="store_true", help="Stream suggestions and write each to the report as soon as it is ready")
+    parser.add_argument("--coverage-index", nargs="?", const=DEFAULT_COVERAGE_INDEX_PATH, default=None,
+                        help="Select tests by the per-test line coverage recorded with coverage_index.py (default path if no value)")
+    parser.add_argument("--run-tests", action="store_true", help="Run the affected tests in parallel, likely failures first, and add the results to the report")
+    parser.add_argument("--test-workers", type=int, default=None, help="Parallel pytest processes for --run-tests (default: CPU count)")
+    parser.add_argument("--test-history", default=DEFAULT_TEST_HISTORY_PATH, help="Path of the per-test duration and failure history")
+    parser.add_argument("--profile", default=None, help="Write per-stage timings, memory and counters to this JSON file")
+    parser.add_argument("--profile-stacks", default=None, help="Also sample every thread's stack into this folded-stack file (flamegraph.pl, speedscope)")
     args = parser.parse_args()
     
-    main(args.from_commit, args.to_commit, args.keep, args.output)
\ No newline at end of file
+    main(args.from_commit, args.to_commit, args.keep, args.output, args.embedding_cache,
+         args.embedding_backend, args.embedding_workers, args.incremental, index_type=args.index_type,
+         workers=args.workers, symbol_db_path=args.symbol_db,
+         use_impact_graph=args.impact_graph, chunk_tokens=args.chunk_tokens, llm_workers=args.llm_workers,
+         use_response_cache=not args.no_cache, stream=args.stream,
+         suggestion_backend=args.suggestion_backend, backend_config=args.backend_config,
+         retrieve_k=args.retrieve_k, profile_path=args.profile, stacks_path=args.profile_stacks,
+         coverage_index_path=args.coverage_index, run_tests=args.run_tests, test_workers=args.test_workers,
+         test_history_path=args.test_history)
\ No newline at end of file
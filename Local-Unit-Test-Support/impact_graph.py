@@ -0,0 +1,298 @@
+import os
+import pickle
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from ast_analyzer import MODULE_SCOPE
+from repo_scanner import is_test_file
+from symbol_db import FileSymbols, SymbolDB, git_blob_sha
+
+DEFAULT_GRAPH_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".impact_graph.pickle")
+
+
+def node_id(file_path: str, qualname: str) -> str:
+    return f"{file_path}::{qualname}"
+
+
+def split_node(node: str) -> Tuple[str, str]:
+    file_path, _, qualname = node.partition("::")
+    return file_path, qualname
+
+
+def module_names(file_path: str) -> List[str]:
+    """
+    Dotted names a file can be imported as, one per possible sys.path root:
+    "pkg/sub/mod.py" -> ["mod", "sub.mod", "pkg.sub.mod"].
+    """
+    parts = Path(file_path).with_suffix("").parts
+    if parts and parts[-1] == "__init__":
+        parts = parts[:-1]
+    return [".".join(parts[i:]) for i in range(len(parts) - 1, -1, -1)]
+
+
+def changed_nodes(file_path: str, changes: dict) -> Set[str]:
+    """
+    Graph nodes for one file's analyze_ast_diff result, including both sides of renames and moves.
+    """
+    names = changes.get("added", []) + changes.get("removed", []) + changes.get("modified", [])
+    for pair in changes.get("renamed", []) + changes.get("moved", []):
+        names += pair
+    return {name if "::" in name else node_id(file_path, name) for name in names}
+
+
+def is_test_node(node: str) -> bool:
+    file_path, qualname = split_node(node)
+    return is_test_file(os.path.basename(file_path)) and qualname.rsplit(".", 1)[-1].startswith("test")
+
+
+class ImpactGraph:
+    """
+    Cross-module call graph of a repository with a reverse-dependency index.
+
+    Nodes are "path::qualified.name". Calls are resolved through imports, module
+    aliases, self/cls methods and classes; calls on arbitrary objects fall back to
+    every method with that name. Files are added and updated individually, and only
+    the files whose resolution can change are re-resolved.
+    """
+
+    def __init__(self):
+        self.files: Dict[str, FileSymbols] = {}
+        self.defs: Dict[str, Dict[str, str]] = {}  # path -> {qualname: symbol_type}
+        self.modules: Dict[str, Set[str]] = defaultdict(set)  # dotted name -> paths
+        self.methods: Dict[str, Set[str]] = defaultdict(set)  # method name -> nodes
+        self.edges: Dict[str, Dict[str, Set[str]]] = {}  # path -> {caller: callees}
+        self.reverse: Dict[str, Set[str]] = defaultdict(set)  # callee -> callers
+        # who needs re-resolving when something changes
+        self.module_users: Dict[str, Set[str]] = defaultdict(set)  # dotted name -> importing paths
+        self.method_users: Dict[str, Set[str]] = defaultdict(set)  # method name -> paths with fuzzy calls
+        self.file_users: Dict[str, Set[str]] = defaultdict(set)  # path -> paths resolved against it
+
+    # -- maintenance -------------------------------------------------------
+
+    def _unregister(self, path: str):
+        for name in module_names(path):
+            self.modules[name].discard(path)
+        for qualname, kind in self.defs.pop(path, {}).items():
+            if kind == "function" and "." in qualname:
+                self.methods[qualname.rsplit(".", 1)[-1]].discard(node_id(path, qualname))
+        self.files.pop(path, None)
+
+    def _register(self, path: str, symbols: FileSymbols):
+        self.files[path] = symbols
+        defs = {name: kind for kind, name, *_ in symbols.symbols}
+        self.defs[path] = defs
+        for name in module_names(path):
+            self.modules[name].add(path)
+        for qualname, kind in defs.items():
+            parent = qualname.rpartition(".")[0]
+            if kind == "function" and parent and defs.get(parent) == "class":
+                self.methods[qualname.rsplit(".", 1)[-1]].add(node_id(path, qualname))
+
+    def _affected_by(self, path: str, symbols: Optional[FileSymbols]) -> Set[str]:
+        """
+        Files whose resolved edges may change when path gets `symbols` (None: deleted).
+        """
+        affected = {path} | self.file_users.get(path, set())
+        for name in module_names(path):
+            affected |= self.module_users.get(name, set())
+        old_methods = {q.rsplit(".", 1)[-1] for q, k in self.defs.get(path, {}).items() if k == "function" and "." in q}
+        new_methods = set()
+        if symbols is not None:
+            new_methods = {name.rsplit(".", 1)[-1] for kind, name, *_ in symbols.symbols if kind == "function" and "." in name}
+        for method in old_methods ^ new_methods:
+            affected |= self.method_users.get(method, set())
+        return affected
+
+    def update_files(self, changes: Dict[str, Optional[FileSymbols]]):
+        """
+        Apply {path: new symbols, or None if the file was deleted} and re-resolve
+        only the files that can be affected.
+        """
+        to_resolve = set()
+        for path, symbols in changes.items():
+            to_resolve |= self._affected_by(path, symbols)
+            self._unregister(path)
+            if symbols is not None:
+                self._register(path, symbols)
+        for path in to_resolve:
+            self._drop_edges(path)
+        for path in to_resolve:
+            if path in self.files:
+                self._resolve_file(path)
+
+    def _drop_edges(self, path: str):
+        for caller, callees in self.edges.pop(path, {}).items():
+            for callee in callees:
+                self.reverse[callee].discard(caller)
+
+    # -- resolution --------------------------------------------------------
+
+    def _resolve_module(self, module: str, level: int, importer: str) -> Optional[str]:
+        if level:
+            base = Path(importer).parent
+            for _ in range(level - 1):
+                base = base.parent
+            target = base.joinpath(*module.split(".")) if module else base
+            for candidate in (target.with_suffix(".py").as_posix(), (target / "__init__.py").as_posix()):
+                if candidate in self.files:
+                    return candidate
+            return None
+        self.module_users[module].add(importer)
+        candidates = self.modules.get(module)
+        if not candidates:
+            return None
+        # prefer the module closest to the importing file
+        importer_parts = Path(importer).parts
+        def shared_prefix(candidate):
+            count = 0
+            for a, b in zip(Path(candidate).parts, importer_parts):
+                if a != b:
+                    break
+                count += 1
+            return count
+        return max(sorted(candidates), key=shared_prefix)
+
+    def _resolve_import(self, path: str, local_name: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        (target file, attribute in that file) for a local name; attribute is None
+        when the name is a module.
+        """
+        module, attr, level = self.files[path].imports[local_name]
+        if attr is not None:
+            submodule = self._resolve_module(f"{module}.{attr}" if module else attr, level, path)
+            if submodule is not None:
+                return submodule, None
+        target = self._resolve_module(module, level, path)
+        return target, attr
+
+    def _targets(self, target_file: str, qualname: str) -> Set[str]:
+        kind = self.defs.get(target_file, {}).get(qualname)
+        targets = {node_id(target_file, qualname)}
+        if kind == "class":
+            targets.add(node_id(target_file, f"{qualname}.__init__"))
+        return targets
+
+    def _enclosing_class(self, path: str, caller: str) -> Optional[str]:
+        defs = self.defs[path]
+        parts = caller.split(".")
+        for i in range(len(parts) - 1, 0, -1):
+            prefix = ".".join(parts[:i])
+            if defs.get(prefix) == "class":
+                return prefix
+        return None
+
+    def _resolve_ref(self, path: str, caller: str, ref: tuple) -> Set[str]:
+        defs = self.defs[path]
+        imports = self.files[path].imports
+        kind = ref[0]
+        if kind == "name":
+            name = ref[1]
+            # nested function, then module-level definition, then import
+            if caller != MODULE_SCOPE and f"{caller}.{name}" in defs:
+                return self._targets(path, f"{caller}.{name}")
+            if name in defs:
+                return self._targets(path, name)
+            if name in imports:
+                target_file, attr = self._resolve_import(path, name)
+                if target_file is not None and attr is not None:
+                    self.file_users[target_file].add(path)
+                    return self._targets(target_file, attr)
+            return set()
+        if kind == "attr":
+            _, base, attr = ref
+            if base in imports:
+                target_file, imported = self._resolve_import(path, base)
+                if target_file is not None:
+                    self.file_users[target_file].add(path)
+                    return self._targets(target_file, attr if imported is None else f"{imported}.{attr}")
+                return set()
+            if defs.get(base) == "class":
+                return self._targets(path, f"{base}.{attr}")
+            return self._fuzzy_method(path, attr)
+        if kind == "self":
+            attr = ref[1]
+            cls = self._enclosing_class(path, caller)
+            if cls is not None and f"{cls}.{attr}" in defs:
+                return {node_id(path, f"{cls}.{attr}")}
+            return self._fuzzy_method(path, attr)
+        return self._fuzzy_method(path, ref[1])
+
+    def _fuzzy_method(self, path: str, name: str) -> Set[str]:
+        self.method_users[name].add(path)
+        return set(self.methods.get(name, ()))
+
+    def _resolve_file(self, path: str):
+        edges = {}
+        for caller, refs in self.files[path].calls.items():
+            caller_node = node_id(path, caller)
+            callees = set()
+            for ref in refs:
+                callees |= self._resolve_ref(path, caller, ref)
+            callees.discard(caller_node)
+            edges[caller_node] = callees
+            for callee in callees:
+                self.reverse[callee].add(caller_node)
+        self.edges[path] = edges
+
+    # -- queries -----------------------------------------------------------
+
+    def dependents(self, changed_nodes: Iterable[str]) -> Set[str]:
+        """
+        Every node that transitively calls one of changed_nodes (reverse BFS).
+        """
+        seen = set(changed_nodes)
+        queue = deque(seen)
+        while queue:
+            node = queue.popleft()
+            for caller in self.reverse.get(node, ()):
+                if caller not in seen:
+                    seen.add(caller)
+                    queue.append(caller)
+        return seen
+
+    def affected_tests(self, changed_nodes: Iterable[str]) -> Set[Tuple[str, str]]:
+        return {split_node(node) for node in self.dependents(changed_nodes) if is_test_node(node)}
+
+    # -- persistence -------------------------------------------------------
+
+    def sync(self, repo_path: str, files: Iterable[Path], symbol_db: SymbolDB) -> int:
+        """
+        Bring the graph in line with the files on disk; only blobs that changed since
+        the last sync are re-read from symbol_db and re-resolved. Returns that count.
+        """
+        changes = {}
+        seen = set()
+        for file_path in files:
+            path = Path(file_path).relative_to(repo_path).as_posix()
+            seen.add(path)
+            try:
+                source = Path(file_path).read_text(encoding="utf-8")
+            except (OSError, UnicodeDecodeError):
+                continue
+            known = self.files.get(path)
+            if known is not None and known.blob_sha == git_blob_sha(source.encode("utf-8")):
+                continue
+            try:
+                changes[path] = symbol_db.symbols_for_source(source)
+            except SyntaxError as e:
+                print(f"Error parsing {path}: {e}")
+        for path in set(self.files) - seen:
+            changes[path] = None
+        if changes:
+            self.update_files(changes)
+        return len(changes)
+
+    def save(self, path: str = DEFAULT_GRAPH_PATH):
+        with open(path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path: str = DEFAULT_GRAPH_PATH) -> "ImpactGraph":
+        if os.path.exists(path):
+            try:
+                with open(path, "rb") as f:
+                    return pickle.load(f)
+            except (OSError, pickle.UnpicklingError, AttributeError, EOFError) as e:
+                print(f"Could not load impact graph ({e}), rebuilding")
+        return ImpactGraph()
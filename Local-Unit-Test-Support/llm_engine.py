@@ -1,27 +1,49 @@
-from google import genai
 import os
 import argparse
-from dotenv import load_dotenv 
+from abc import ABC, abstractmethod
 import json
-from pydantic import BaseModel, ConfigDict
-from typing import Dict
+import re
+import time
+from functools import lru_cache
+from typing import Dict, List
 from typing import Literal
-class suggestion_schema(BaseModel) :
-    suggestion_type : Literal["add", "remove", "update"]
-    test_function_name : str
-    description : str
-    original_code : str
-    updated_code : str
-class SuggestionResponse(BaseModel):
-    suggestions: list[suggestion_schema]
+from typing import Iterator
+import metrics
+from request_utils import call_with_retry, estimate_tokens, post_json, post_json_events
+from response_cache import ResponseCache, prompt_fingerprint
+SUGGESTION_MODEL = 'gemini-2.5-flash-preview-04-17'
+@lru_cache(maxsize=None)
+def _response_models():
+    """
+    The pydantic response models, built on first use so importing this module does not load pydantic.
+    """
+    from pydantic import BaseModel
+
+    class suggestion_schema(BaseModel) :
+        suggestion_type : Literal["add", "remove", "update"]
+        test_function_name : str
+        description : str
+        original_code : str
+        updated_code : str
+    class SuggestionResponse(BaseModel):
+        suggestions: list[suggestion_schema]
+    return {"suggestion_schema": suggestion_schema, "SuggestionResponse": SuggestionResponse}
+def __getattr__(name):
+    # llm_engine.SuggestionResponse and llm_engine.suggestion_schema stay importable
+    if name in ("suggestion_schema", "SuggestionResponse"):
+        return _response_models()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 def suggest_test_changes(function_name: str, function_code: str) -> str:
+    from dotenv import load_dotenv
+    from google import genai
+
     load_dotenv()
     # Replace this with actual LLM call
     api_key = os.getenv("GEMINI_API_KEY")
     client = genai.Client(api_key=api_key)
 
     response = client.models.generate_content(
-        model='gemini-2.5-flash-preview-04-17',  
+        model=SUGGESTION_MODEL,  
         contents=f"""
         Given the following function name {function_name} and function code {function_code},
         please suggest 2-3 test cases that should be written or updated.
@@ -38,16 +60,53 @@ def suggest_test_changes(function_name: str, function_code: str) -> str:
     print(json.loads(response.text))
     return json.loads(response.text)
     return f"Suggested change for `{function_name}`: Add more edge case assertions."
-class GeminiSuggester():
+class SuggestionStreamParser:
+    """
+    Incremental parser for a streamed SuggestionResponse JSON document: feed() text
+    as it arrives and get back every element of "suggestions" that is now complete.
+    """
     def __init__(self):
-        load_dotenv()
-        api_key = os.getenv("GEMINI_API_KEY")
-        self.client = genai.Client(api_key=api_key)
-        
-    def get_coverage_suggestions(self, function_name: list, code: str, git_diff_message: str) -> dict:
-        response = self.client.models.generate_content(
-            model='gemini-2.5-flash-preview-04-17',  
-            contents=f"""
+        self.buffer = ""
+        self.position = 0
+        self.stack = []
+        self.in_string = False
+        self.escaped = False
+        self.element_start = None
+
+    def feed(self, text: str) -> List[dict]:
+        self.buffer += text
+        completed = []
+        for i in range(self.position, len(self.buffer)):
+            char = self.buffer[i]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in "{[":
+                # an object directly inside the root object's array is one suggestion
+                if char == "{" and self.stack == ["{", "["]:
+                    self.element_start = i
+                self.stack.append(char)
+            elif char in "}]":
+                self.stack.pop()
+                if char == "}" and self.stack == ["{", "["] and self.element_start is not None:
+                    completed.append(json.loads(self.buffer[self.element_start:i + 1]))
+                    self.element_start = None
+        self.position = len(self.buffer)
+        # drop text that can no longer be part of a pending suggestion
+        keep_from = self.element_start if self.element_start is not None else self.position
+        self.buffer = self.buffer[keep_from:]
+        if self.element_start is not None:
+            self.element_start = 0
+        self.position -= keep_from
+        return completed
+def _coverage_prompt(function_name: list, code: str, git_diff_message: str) -> str:
+    return f"""
             You are a helpful AI assistant tasked with analyzing changes in test code.
 
             Given:
@@ -66,18 +125,9 @@ class GeminiSuggester():
             - If a new function is added like `def test_new_case(): ...`, use `"suggestion_type": "add"`.
             - If a function is entirely deleted, use `"remove"`.
             - If an existing function’s body was edited (e.g., added asserts), use `"update"`.
-            """,
-            config={
-                "response_mime_type": "application/json", 
-                "response_schema": SuggestionResponse,    
-            }
-        )
-        return json.loads(response.text)
-    
-    def get_test_suggestions(self, affect_test_function_metadata: list, whole_test_code: str, git_diff_message: str) -> dict:
-        response = self.client.models.generate_content(
-            model='gemini-2.5-flash-preview-04-17',  
-            contents=f"""
+            """
+def _test_prompt(affect_test_function_metadata: list, whole_test_code: str, git_diff_message: str) -> str:
+    return f"""
             You are a software testing assistant.
 
             Given:
@@ -85,13 +135,227 @@ class GeminiSuggester():
             - Git diff message: {git_diff_message}
             - All test Code: {whole_test_code}
             Suggest if any test should be added, modified, or deleted.
-            """,
+            """
+class Suggester(ABC):
+    """
+    Common interface of the suggestion backends. Subclasses implement _generate()
+    (one SuggestionResponse dict per prompt) and may override _generate_stream()
+    to return the response text piece by piece; caching, streaming and per-chunk
+    retries are shared.
+    """
+    model = "unknown"
+
+    def __init__(self, cache: ResponseCache = None):
+        self.cache = cache
+
+    @abstractmethod
+    def _generate(self, request_kind: str, inputs: dict, prompt: str) -> dict:
+        ...
+
+    def _count_request(self, prompt: str):
+        metrics.count("llm_requests")
+        metrics.count("prompt_tokens", estimate_tokens(prompt))
+
+    def _request(self, request_kind: str, inputs: dict, prompt: str) -> dict:
+        self._count_request(prompt)
+        return self._generate(request_kind, inputs, prompt)
+
+    def _generate_stream(self, request_kind: str, inputs: dict, prompt: str) -> Iterator[str]:
+        yield json.dumps(self._generate(request_kind, inputs, prompt))
+
+    def _fingerprint(self, request_kind: str, inputs: dict) -> str:
+        return prompt_fingerprint(self.model, _response_models()["SuggestionResponse"].model_json_schema(), request_kind, inputs)
+
+    def _cached(self, request_kind: str, inputs: dict, generate) -> dict:
+        """
+        Return the cached response for these prompt inputs, or call generate() and cache its result.
+        """
+        if self.cache is None:
+            return generate()
+        key = self._fingerprint(request_kind, inputs)
+        response = self.cache.get(key)
+        if response is None:
+            response = generate()
+            self.cache.put(key, response)
+        return response
+
+    def get_coverage_suggestions(self, function_name: list, code: str, git_diff_message: str) -> dict:
+        inputs = {"function_name": function_name, "code": code, "git_diff_message": git_diff_message}
+        prompt = _coverage_prompt(function_name, code, git_diff_message)
+        return self._cached("coverage", inputs, lambda: self._request("coverage", inputs, prompt))
+
+    def get_test_suggestions(self, affect_test_function_metadata: list, whole_test_code: str, git_diff_message: str) -> dict:
+        inputs = {"metadata": affect_test_function_metadata, "test_code": whole_test_code, "git_diff_message": git_diff_message}
+        prompt = _test_prompt(affect_test_function_metadata, whole_test_code, git_diff_message)
+        return self._cached("test", inputs, lambda: self._request("test", inputs, prompt))
+
+    def stream_test_suggestions(self, affect_test_function_metadata: list, whole_test_code: str, git_diff_message: str) -> Iterator[dict]:
+        """
+        Like get_test_suggestions, but yields each suggestion as soon as the model has finished writing it.
+        """
+        inputs = {"metadata": affect_test_function_metadata, "test_code": whole_test_code, "git_diff_message": git_diff_message}
+        key = None
+        if self.cache is not None:
+            key = self._fingerprint("test", inputs)
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield from cached.get("suggestions", [])
+                return
+        prompt = _test_prompt(affect_test_function_metadata, whole_test_code, git_diff_message)
+        parser = SuggestionStreamParser()
+        suggestions = []
+        self._count_request(prompt)
+        for text in self._generate_stream("test", inputs, prompt):
+            for suggestion in parser.feed(text):
+                suggestions.append(suggestion)
+                yield suggestion
+        if key is not None:
+            self.cache.put(key, {"suggestions": suggestions})
+
+    def suggest_chunk(self, chunk, on_suggestion, stream: bool = False, max_retries: int = 3):
+        """
+        Request suggestions for one request_planner.RequestChunk, retrying failures,
+        and pass each suggestion to on_suggestion (as it arrives when streaming).
+        A retried chunk may repeat suggestions it already produced; a chunk that still
+        fails after its retries is skipped.
+        """
+        def request():
+            if stream:
+                results = self.stream_test_suggestions(chunk.tests, chunk.test_code(), chunk.git_diff())
+            else:
+                results = self.get_test_suggestions(chunk.tests, chunk.test_code(), chunk.git_diff())["suggestions"]
+            for suggestion in results:
+                on_suggestion(suggestion)
+
+        try:
+            call_with_retry(request, max_retries, label="Suggestion request")
+        except Exception as e:
+            print(f"Skipping {chunk}: {e}")
+class GeminiSuggester(Suggester):
+    def __init__(self, cache: ResponseCache = None, model: str = SUGGESTION_MODEL):
+        from dotenv import load_dotenv
+        from google import genai
+
+        super().__init__(cache)
+        load_dotenv()
+        api_key = os.getenv("GEMINI_API_KEY")
+        self.client = genai.Client(api_key=api_key)
+        self.model = model
+
+    def _generate(self, request_kind: str, inputs: dict, prompt: str) -> dict:
+        response = self.client.models.generate_content(
+            model=self.model,  
+            contents=prompt,
             config={
                 "response_mime_type": "application/json", 
-                "response_schema": SuggestionResponse,    
+                "response_schema": _response_models()["SuggestionResponse"],    
             }
         )
         return json.loads(response.text)
+
+    def _generate_stream(self, request_kind: str, inputs: dict, prompt: str) -> Iterator[str]:
+        stream = self.client.models.generate_content_stream(
+            model=self.model,
+            contents=prompt,
+            config={
+                "response_mime_type": "application/json",
+                "response_schema": _response_models()["SuggestionResponse"],
+            }
+        )
+        for chunk in stream:
+            yield chunk.text or ""
+class OpenAICompatibleSuggester(Suggester):
+    """
+    Any server implementing the OpenAI /chat/completions endpoint (vLLM, llama.cpp,
+    Ollama, ...). The schema is given in the system message and the reply validated against it.
+    """
+    def __init__(self, cache: ResponseCache = None, base_url: str = "http://localhost:8000/v1",
+                 model: str = "qwen2.5-coder", api_key: str = None, timeout: float = 300.0, temperature: float = 0.0):
+        super().__init__(cache)
+        self.url = base_url.rstrip("/") + "/chat/completions"
+        self.model = model
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.timeout = timeout
+        self.temperature = temperature
+
+    def _payload(self, prompt: str, stream: bool) -> dict:
+        schema = json.dumps(_response_models()["SuggestionResponse"].model_json_schema())
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": f"Reply only with a JSON object matching this JSON schema: {schema}"},
+                {"role": "user", "content": prompt},
+            ],
+            "response_format": {"type": "json_object"},
+            "temperature": self.temperature,
+            "stream": stream,
+        }
+
+    def _generate(self, request_kind: str, inputs: dict, prompt: str) -> dict:
+        response = post_json(self.url, self._payload(prompt, False), self.api_key, self.timeout)
+        content = response["choices"][0]["message"]["content"]
+        return _response_models()["SuggestionResponse"].model_validate_json(content).model_dump()
+
+    def _generate_stream(self, request_kind: str, inputs: dict, prompt: str) -> Iterator[str]:
+        for event in post_json_events(self.url, self._payload(prompt, True), self.api_key, self.timeout):
+            choices = event.get("choices") or [{}]
+            yield (choices[0].get("delta") or {}).get("content") or ""
+class MockSuggester(Suggester):
+    """
+    Deterministic offline suggester: an "update" for every affected test and an
+    "add" for every function the diff defines when no test is affected. latency
+    simulates the model round trip for benchmarks.
+    """
+    model = "mock-suggester"
+
+    def __init__(self, cache: ResponseCache = None, latency: float = 0.0):
+        super().__init__(cache)
+        self.latency = latency
+
+    def _generate(self, request_kind: str, inputs: dict, prompt: str) -> dict:
+        if self.latency:
+            time.sleep(self.latency)
+        diff = inputs["git_diff_message"]
+        changed_files = sorted(set(re.findall(r"^\+\+\+ b/(\S+)", diff, re.MULTILINE)))
+        if request_kind == "coverage":
+            names = inputs["function_name"]
+        else:
+            names = [test["symbol_name"] for test in inputs["metadata"]]
+        code_by_name = {test["symbol_name"]: test["code"] for test in inputs.get("metadata", [])}
+        suggestions = [{
+            "suggestion_type": "update",
+            "test_function_name": name,
+            "description": f"Review {name} against the changes in {', '.join(changed_files) or 'the diff'}.",
+            "original_code": code_by_name.get(name, ""),
+            "updated_code": code_by_name.get(name, ""),
+        } for name in names]
+        if not suggestions:
+            for name in dict.fromkeys(re.findall(r"^\+\s*def (\w+)", diff, re.MULTILINE)):
+                suggestions.append({
+                    "suggestion_type": "add",
+                    "test_function_name": f"test_{name}",
+                    "description": f"Add a test for {name}.",
+                    "original_code": "",
+                    "updated_code": f"def test_{name}():\n    ...",
+                })
+        return {"suggestions": suggestions}
+
+    def _generate_stream(self, request_kind: str, inputs: dict, prompt: str) -> Iterator[str]:
+        text = json.dumps(self._generate(request_kind, inputs, prompt))
+        for start in range(0, len(text), 64):
+            yield text[start:start + 64]
+SUGGESTION_BACKENDS = {
+    "gemini": GeminiSuggester,
+    "openai": OpenAICompatibleSuggester,
+    "mock": MockSuggester,
+}
+def make_suggester(name: str, cache: ResponseCache = None, **options) -> Suggester:
+    """
+    Build the suggester registered under name, passing options (e.g. from a backend config file) to it.
+    """
+    if name not in SUGGESTION_BACKENDS:
+        raise ValueError(f"Unknown suggestion backend {name!r}, expected one of {sorted(SUGGESTION_BACKENDS)}")
+    return SUGGESTION_BACKENDS[name](cache, **options)
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="get function code and function name")
     parser.add_argument("--function_name", help="Get Function Name")
@@ -0,0 +1,208 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from code_extractor import CodeBlock
+from symbol_db import git_blob_sha
+
+BlockKey = Tuple[str, str]
+
+DEFAULT_META_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "metadata.sqlite")
+# decompressed blobs kept in memory for repeated lookups into the same file
+BLOB_CACHE_SIZE = 64
+
+
+def symbol_id(file_path: str, symbol_name: str) -> int:
+    """
+    Stable 63-bit FAISS id for a symbol, so it survives index reloads and rebuilds.
+    """
+    digest = hashlib.sha1(f"{file_path}::{symbol_name}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") & 0x7FFFFFFFFFFFFFFF
+
+
+def code_hash(code: str) -> str:
+    return hashlib.sha1(code.encode("utf-8")).hexdigest()
+
+
+def _line_offsets(data: bytes) -> List[int]:
+    """
+    Byte offset of the start of every line of data (as str.splitlines() splits it), plus the end.
+    """
+    offsets = [0]
+    for line in data.decode("utf-8").splitlines(keepends=True):
+        offsets.append(offsets[-1] + len(line.encode("utf-8")))
+    return offsets
+
+
+class MetadataStore:
+    """
+    SQLite store of the vector index metadata, keyed by FAISS id (symbol_id).
+
+    A block is stored as a span (path, blob sha, byte offsets) into its file's
+    blob; each blob is kept once, zlib-compressed, however many blocks point
+    into it. Single blocks are looked up without loading the rest, and the store
+    also reads as a {(file_path, symbol_name): CodeBlock} mapping.
+    Safe to share between threads.
+    """
+
+    def __init__(self, path: str = DEFAULT_META_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(
+            "CREATE TABLE IF NOT EXISTS blocks ("
+            " id INTEGER PRIMARY KEY, file_path TEXT NOT NULL, symbol_name TEXT NOT NULL, symbol_type TEXT NOT NULL,"
+            " start_line INTEGER NOT NULL, end_line INTEGER NOT NULL, blob_sha TEXT NOT NULL,"
+            " start_byte INTEGER NOT NULL, end_byte INTEGER NOT NULL, code_hash TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS blocks_file_path ON blocks (file_path);"
+            "CREATE TABLE IF NOT EXISTS blobs (blob_sha TEXT PRIMARY KEY, data BLOB NOT NULL);"
+        )
+        self.conn.commit()
+        self.blob_cache: "OrderedDict[str, bytes]" = OrderedDict()
+
+    # -- writing -----------------------------------------------------------
+
+    def _spans(self, blocks: Iterable[CodeBlock], repo_path: str) -> Iterator[tuple]:
+        """
+        Block rows, storing every file that is read as one blob. A block whose code
+        no longer matches its file on disk gets a blob of its own.
+        """
+        files = {}
+        for block in blocks:
+            if block.file_path not in files:
+                try:
+                    with open(os.path.join(repo_path, block.file_path), "rb") as f:
+                        data = f.read()
+                    files[block.file_path] = (git_blob_sha(data), _line_offsets(data), data)
+                    self._put_blob(*files[block.file_path][::2])
+                except (OSError, UnicodeDecodeError):
+                    files[block.file_path] = None
+            code = block.code.encode("utf-8")
+            span = None
+            if files[block.file_path] is not None:
+                blob_sha, offsets, data = files[block.file_path]
+                if 0 < block.start_line <= block.end_line < len(offsets):
+                    start, end = offsets[block.start_line - 1], offsets[block.end_line]
+                    # the span ends before the last line's terminator
+                    end = start + len(data[start:end].decode("utf-8").rstrip("\r\n").encode("utf-8")) if start < end else end
+                    if data[start:end] == code:
+                        span = (blob_sha, start, end)
+            if span is None:
+                blob_sha = git_blob_sha(code)
+                self._put_blob(blob_sha, code)
+                span = (blob_sha, 0, len(code))
+            yield (symbol_id(*block.key), block.file_path, block.symbol_name, block.symbol_type,
+                   block.start_line, block.end_line, *span, code_hash(block.code))
+
+    def _put_blob(self, blob_sha: str, data: bytes):
+        self.conn.execute("INSERT OR IGNORE INTO blobs (blob_sha, data) VALUES (?, ?)", (blob_sha, zlib.compress(data)))
+
+    def _drop_unused_blobs(self):
+        self.conn.execute("DELETE FROM blobs WHERE blob_sha NOT IN (SELECT DISTINCT blob_sha FROM blocks)")
+
+    def replace_all(self, metadata: Dict[BlockKey, CodeBlock], repo_path: str = "."):
+        with self.lock:
+            self.conn.execute("DELETE FROM blocks")
+            self.conn.execute("DELETE FROM blobs")
+            self.blob_cache.clear()
+            self.conn.executemany("INSERT OR REPLACE INTO blocks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                  self._spans(metadata.values(), repo_path))
+            self.conn.commit()
+
+    def update(self, removed_ids: Iterable[int], added: Dict[BlockKey, CodeBlock], repo_path: str = "."):
+        with self.lock:
+            self.conn.executemany("DELETE FROM blocks WHERE id = ?", ((int(i),) for i in removed_ids))
+            self.conn.executemany("INSERT OR REPLACE INTO blocks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                  self._spans(added.values(), repo_path))
+            self._drop_unused_blobs()
+            self.blob_cache.clear()
+            self.conn.commit()
+
+    # -- reading -----------------------------------------------------------
+
+    def _blob(self, blob_sha: str) -> bytes:
+        data = self.blob_cache.get(blob_sha)
+        if data is None:
+            row = self.conn.execute("SELECT data FROM blobs WHERE blob_sha = ?", (blob_sha,)).fetchone()
+            data = zlib.decompress(row[0])
+            self.blob_cache[blob_sha] = data
+            if len(self.blob_cache) > BLOB_CACHE_SIZE:
+                self.blob_cache.popitem(last=False)
+        else:
+            self.blob_cache.move_to_end(blob_sha)
+        return data
+
+    def _block(self, row: tuple) -> CodeBlock:
+        _, file_path, symbol_name, symbol_type, start_line, end_line, blob_sha, start_byte, end_byte = row
+        code = self._blob(blob_sha)[start_byte:end_byte].decode("utf-8")
+        return CodeBlock(symbol_type, symbol_name, file_path, code, start_line, end_line)
+
+    _COLUMNS = "id, file_path, symbol_name, symbol_type, start_line, end_line, blob_sha, start_byte, end_byte"
+
+    def get(self, block_id: int) -> Optional[CodeBlock]:
+        with self.lock:
+            row = self.conn.execute(f"SELECT {self._COLUMNS} FROM blocks WHERE id = ?", (int(block_id),)).fetchone()
+            return None if row is None else self._block(row)
+
+    def get_many(self, block_ids: Iterable[int]) -> Dict[int, CodeBlock]:
+        block_ids = [int(i) for i in block_ids]
+        blocks = {}
+        with self.lock:
+            for start in range(0, len(block_ids), 500):
+                batch = block_ids[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT {self._COLUMNS} FROM blocks WHERE id IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                blocks.update((row[0], self._block(row)) for row in rows)
+        return blocks
+
+    def code_hashes(self, file_paths: Iterable[str]) -> Dict[BlockKey, str]:
+        """
+        {(file_path, symbol_name): code hash} of the stored blocks of these files, without reading any code.
+        """
+        hashes = {}
+        with self.lock:
+            for file_path in set(file_paths):
+                rows = self.conn.execute("SELECT symbol_name, code_hash FROM blocks WHERE file_path = ?", (file_path,))
+                hashes.update(((file_path, name), digest) for name, digest in rows)
+        return hashes
+
+    # -- mapping view ------------------------------------------------------
+
+    def __getitem__(self, key: BlockKey) -> CodeBlock:
+        block = self.get(symbol_id(*key))
+        if block is None:
+            raise KeyError(key)
+        return block
+
+    def __contains__(self, key) -> bool:
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM blocks WHERE id = ?", (symbol_id(*key),)).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM blocks").fetchone()[0]
+
+    def items(self) -> Iterator[Tuple[BlockKey, CodeBlock]]:
+        with self.lock:
+            rows = self.conn.execute(f"SELECT {self._COLUMNS} FROM blocks ORDER BY file_path, start_line").fetchall()
+        for row in rows:
+            with self.lock:
+                block = self._block(row)
+            yield block.key, block
+
+    def keys(self) -> List[BlockKey]:
+        with self.lock:
+            return self.conn.execute("SELECT file_path, symbol_name FROM blocks ORDER BY file_path, start_line").fetchall()
+
+    def values(self) -> Iterator[CodeBlock]:
+        return (block for _, block in self.items())
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
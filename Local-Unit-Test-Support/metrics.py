@@ -0,0 +1,244 @@
+import contextvars
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+# name of the stage the current asyncio task (or thread) is in, for CPU attribution
+_stage = contextvars.ContextVar("stage", default=None)
+
+
+# how often the current RSS is sampled while any stage runs
+RSS_SAMPLE_INTERVAL = 0.01
+_PAGE_MB = os.sysconf("SC_PAGE_SIZE") / (1024 * 1024) if hasattr(os, "sysconf") else 0.0
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _current_rss_mb() -> float:
+    """
+    Resident set size now. Without /proc (macOS), the process peak is the best available.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_MB
+    except (OSError, IndexError, ValueError):
+        return _peak_rss_mb()
+
+
+class StageStats:
+    """
+    Wall-clock span (relative to the run start), CPU seconds and memory of one stage:
+    the highest RSS sampled while it ran and how far that rose above the RSS at its start.
+    """
+    __slots__ = ("start", "end", "cpu", "start_rss_mb", "peak_rss_mb", "rss_growth_mb")
+
+    def __init__(self, start: float, rss_mb: float):
+        self.start = start
+        self.end = start
+        self.cpu = 0.0
+        self.start_rss_mb = rss_mb
+        self.peak_rss_mb = rss_mb
+        self.rss_growth_mb = 0.0
+
+    def sample(self, rss_mb: float):
+        if rss_mb > self.peak_rss_mb:
+            self.peak_rss_mb = rss_mb
+            self.rss_growth_mb = rss_mb - self.start_rss_mb
+
+    def to_dict(self) -> dict:
+        return {
+            "start_s": round(self.start, 4),
+            "end_s": round(self.end, 4),
+            "wall_s": round(self.end - self.start, 4),
+            "cpu_s": round(self.cpu, 4),
+            "peak_rss_mb": round(self.peak_rss_mb, 1),
+            "rss_growth_mb": round(self.rss_growth_mb, 1),
+        }
+
+
+class Metrics:
+    """
+    Per-run instrumentation: stage timings and memory, plus named counters that
+    any module can bump through the module-level count().
+
+    Stages overlap, so a stage's CPU time is not a slice of the process time:
+    it is the thread CPU time of the functions the stage wrapped with timed()
+    (for the pipeline, everything it sends to its executors). The process-wide
+    and child-process totals are reported separately. Likewise a stage's memory
+    is the process RSS sampled while it was active, so overlapping stages share
+    each other's allocations.
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.cpu_origin = time.process_time()
+        self.lock = threading.Lock()
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.stages: Dict[str, StageStats] = {}
+        self.active: Dict[str, StageStats] = {}
+        self.sampler: Optional[threading.Thread] = None
+
+    def count(self, name: str, n: int = 1):
+        with self.lock:
+            self.counters[name] += n
+
+    def add_counts(self, prefix: str, stats: dict):
+        """
+        Record the numeric fields of a cache's stats() as prefix_<field> counters.
+        """
+        with self.lock:
+            for key, value in stats.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    self.counters[f"{prefix}_{key}"] = value
+
+    def _sample_rss(self):
+        # runs while any stage is active; exits once none is, and stage() restarts it
+        while True:
+            rss = _current_rss_mb()
+            with self.lock:
+                if not self.active:
+                    self.sampler = None
+                    return
+                for stats in self.active.values():
+                    stats.sample(rss)
+            time.sleep(RSS_SAMPLE_INTERVAL)
+
+    @contextmanager
+    def stage(self, name: str):
+        stats = self.stages[name] = StageStats(time.perf_counter() - self.origin, _current_rss_mb())
+        with self.lock:
+            self.active[name] = stats
+            if self.sampler is None:
+                self.sampler = threading.Thread(target=self._sample_rss, name="rss-sampler", daemon=True)
+                self.sampler.start()
+        token = _stage.set(name)
+        try:
+            yield stats
+        finally:
+            _stage.reset(token)
+            stats.end = time.perf_counter() - self.origin
+            rss = _current_rss_mb()
+            with self.lock:
+                stats.sample(rss)
+                self.active.pop(name, None)
+
+    def timed(self, fn: Callable) -> Callable:
+        """
+        Wrap fn so its thread CPU time is charged to the stage active where timed()
+        is called; the wrapper can then run on any thread.
+        """
+        stage = _stage.get()
+
+        def call(*args):
+            start = time.thread_time()
+            try:
+                return fn(*args)
+            finally:
+                if stage in self.stages:
+                    with self.lock:
+                        self.stages[stage].cpu += time.thread_time() - start
+        return call
+
+    def to_dict(self) -> dict:
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return {
+            "wall_s": round(time.perf_counter() - self.origin, 4),
+            "cpu_s": round(time.process_time() - self.cpu_origin, 4),
+            "children_cpu_s": round(children.ru_utime + children.ru_stime, 4),
+            "peak_rss_mb": round(_peak_rss_mb(), 1),
+            "stages": {name: stats.to_dict() for name, stats in self.stages.items()},
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+    def report(self) -> str:
+        summary = self.to_dict()
+        lines = ["Stage timings:"]
+        for name, stats in self.stages.items():
+            lines.append(f"  {name:<8} {stats.start:7.2f}s -> {stats.end:7.2f}s  ({stats.end - stats.start:.2f}s wall, "
+                         f"{stats.cpu:.2f}s cpu, peak {stats.peak_rss_mb:.0f} MB, +{stats.rss_growth_mb:.0f} MB)")
+        lines.append(f"  {'total':<8} {summary['wall_s']:.2f}s wall, {summary['cpu_s']:.2f}s cpu "
+                     f"(+{summary['children_cpu_s']:.2f}s in subprocesses), peak {summary['peak_rss_mb']:.0f} MB")
+        if self.counters:
+            lines.append("Counters: " + ", ".join(f"{name}={value}" for name, value in sorted(self.counters.items())))
+        return "\n".join(lines)
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+_current = Metrics()
+
+
+def current() -> Metrics:
+    return _current
+
+
+def start() -> Metrics:
+    """
+    Begin a new run: later count() calls go to the returned Metrics.
+    """
+    global _current
+    _current = Metrics()
+    return _current
+
+
+def count(name: str, n: int = 1):
+    _current.count(name, n)
+
+
+class StackSampler:
+    """
+    Samples the Python stack of every thread at a fixed interval and writes them
+    in the folded format of flamegraph.pl, speedscope and inferno
+    ("thread;outer (file:line);inner (file:line) count" per line).
+    Unlike cProfile it sees the executor threads, where the pipeline does its work.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.stopped = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        me = threading.get_ident()
+        names = {}
+        while not self.stopped.wait(self.interval):
+            if len(names) != threading.active_count():
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self) -> "StackSampler":
+        self.thread = threading.Thread(target=self._sample, name="stack-sampler", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            for stack, samples in self.samples.most_common():
+                f.write(f"{stack} {samples}\n")
@@ -0,0 +1,537 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import metrics
+
+from ast_analyzer import diff_symbols, detect_cross_file_moves
+from code_extractor import CodeBlock
+from diff_parser import GitDiffParser, changed_lines
+from embedding_cache import EmbeddingCache, DEFAULT_CACHE_PATH
+from embedding_client import EmbeddingClient, make_embedding_backend, MAX_BATCH_SIZE
+from impact_graph import ImpactGraph, DEFAULT_GRAPH_PATH, changed_nodes, split_node
+from llm_engine import make_suggester
+from reporter import SuggestionMarkdownWriter, RunResultsMarkdownWriter, REPORT_HEADER
+from repo_scanner import scan_files, parse_files, is_test_file
+from request_planner import plan_requests, DEFAULT_CHUNK_TOKENS
+from response_cache import ResponseCache, DEFAULT_RESPONSE_CACHE_PATH
+from retriever import SemanticRetriever, changed_symbol_sources
+from coverage_index import CoverageIndex
+from symbol_db import SymbolDB, DEFAULT_SYMBOL_DB_PATH
+from affected_runner import RunHistory, DEFAULT_TEST_HISTORY_PATH, run_tests, summarize
+from test_linker import CallClosure, qualify_callers
+from metadata_store import DEFAULT_META_PATH
+from vector_store import DEFAULT_INDEX_PATH, save_to_faiss, update_faiss
+
+# items buffered between two stages before the producer waits
+DEFAULT_QUEUE_SIZE = 8
+
+
+def get_embeddings_cached(codes: List[str], cache: EmbeddingCache, client: EmbeddingClient) -> List[List[float]]:
+    """
+    Embed each code string, only sending blocks missing from the cache to the client.
+    """
+    cached = cache.get_many(list(set(codes)), client.model)
+    missing = [code for code in dict.fromkeys(codes) if code not in cached]
+    computed = dict(zip(missing, client.embed(missing)))
+    if computed:
+        cache.put_many(computed, client.model)
+    return [cached[code] if code in cached else computed[code] for code in codes]
+
+
+def changed_symbol_names(changes: dict) -> set:
+    """
+    Bare function names touched by one file's analyze_ast_diff result, as test code calls them.
+    """
+    names = changes.get("added", []) + changes.get("removed", []) + changes.get("modified", []) + changes.get("indirect_dependents", [])
+    for old_name, new_name in changes.get("renamed", []) + changes.get("moved", []):
+        names += [old_name, new_name]
+    return {name.split("::")[-1].rsplit(".", 1)[-1] for name in names}
+
+
+class ReportPipeline:
+    """
+    get_report as concurrent asyncio stages connected by bounded queues:
+
+        index -> embed                     (parse blocks, embed them, write the index)
+        diff  -> link -> suggest -> report (analyze the diff, find tests, ask the LLM)
+                  |                  ^
+                  +---> test --------+     (run the affected tests, with run_tests)
+
+    The diff side only waits for the parsed blocks, not for their embeddings, so
+    diff analysis, test linking and LLM calls overlap with embedding requests;
+    only semantic retrieval (retrieve_k > 0) waits for the written index.
+    The git reader and the symbol database live on one dedicated thread and the
+    embedding cache on another, since neither may be shared between threads.
+    """
+
+    def __init__(self, from_commit, to_commit, keep_repo, report_path, embedding_cache_path=DEFAULT_CACHE_PATH,
+                 embedding_backend="gemini", embedding_workers=4, incremental=False,
+                 index_path=DEFAULT_INDEX_PATH, meta_path=DEFAULT_META_PATH, index_type="flat", workers=None,
+                 symbol_db_path=DEFAULT_SYMBOL_DB_PATH, use_impact_graph=False, graph_path=DEFAULT_GRAPH_PATH,
+                 chunk_tokens=DEFAULT_CHUNK_TOKENS, llm_workers=4, use_response_cache=True,
+                 response_cache_path=DEFAULT_RESPONSE_CACHE_PATH, stream=False, queue_size=DEFAULT_QUEUE_SIZE,
+                 suggestion_backend="gemini", backend_options=None, retrieve_k=0, coverage_index_path=None,
+                 run_tests=False, test_workers=None, test_history_path=DEFAULT_TEST_HISTORY_PATH):
+        self.from_commit = from_commit
+        self.to_commit = to_commit
+        self.keep_repo = keep_repo
+        self.report_path = report_path
+        self.embedding_cache_path = embedding_cache_path
+        self.embedding_backend = embedding_backend
+        self.embedding_workers = embedding_workers
+        self.incremental = incremental
+        self.index_path = index_path
+        self.meta_path = meta_path
+        self.index_type = index_type
+        self.workers = workers
+        self.symbol_db_path = symbol_db_path
+        self.use_impact_graph = use_impact_graph
+        self.graph_path = graph_path
+        self.chunk_tokens = chunk_tokens
+        self.llm_workers = llm_workers
+        self.use_response_cache = use_response_cache
+        self.response_cache_path = response_cache_path
+        self.stream = stream
+        self.queue_size = queue_size
+        self.suggestion_backend = suggestion_backend
+        # constructor options per backend kind: {"embedding": {...}, "suggestion": {...}}
+        self.backend_options = backend_options or {}
+        # tests retrieved from the vector index per run on top of the call-graph matches (0: off)
+        self.retrieve_k = retrieve_k
+        # opt-in per-test line coverage index; tests of the files it measured are selected by changed lines
+        self.coverage_index_path = coverage_index_path
+        # run the affected tests next to the LLM requests and append their results to the report
+        self.run_tests = run_tests
+        self.test_workers = test_workers or os.cpu_count() or 1
+        self.test_history_path = test_history_path
+        self.metrics = metrics.start()
+        self.analysis_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analysis")
+        self.embedding_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
+        self.llm_threads = ThreadPoolExecutor(max_workers=llm_workers, thread_name_prefix="llm")
+        self.test_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="test")
+
+    async def _on(self, executor: ThreadPoolExecutor, fn, *args):
+        # the thread CPU time of fn is charged to the stage awaiting it
+        return await asyncio.get_running_loop().run_in_executor(executor, self.metrics.timed(fn), *args)
+
+    async def run(self) -> int:
+        """
+        Run every stage and return the number of suggestions written to the report.
+        """
+        try:
+            with self.metrics.stage("git"):
+                # a failing git diff (e.g. a bad revision) raises here, before the empty-diff check
+                await self._on(self.analysis_thread, self._open_repo)
+            if not self.analyzable_files():
+                # nothing for the diff side to analyze: skip embedding, indexing and the LLM entirely
+                print(f"No analyzable Python changes between {self.from_commit} and {self.to_commit}")
+                return 0
+            await self._on(self.embedding_thread, self._open_embedder)
+            self.response_cache = ResponseCache(self.response_cache_path) if self.use_response_cache else None
+            self.suggester = make_suggester(self.suggestion_backend, self.response_cache,
+                                            **self.backend_options.get("suggestion", {}))
+            blocks_ready = asyncio.get_running_loop().create_future()
+            index_ready = asyncio.get_running_loop().create_future()
+            selected_tests = asyncio.get_running_loop().create_future()
+            test_results = asyncio.get_running_loop().create_future()
+            block_batches = asyncio.Queue(self.queue_size)
+            file_changes = asyncio.Queue(self.queue_size)
+            chunks = asyncio.Queue(self.queue_size)
+            suggestions = asyncio.Queue(self.queue_size)
+            results = await asyncio.gather(
+                self.index_stage(block_batches, blocks_ready, index_ready),
+                self.embed_stage(block_batches, index_ready),
+                self.diff_stage(file_changes),
+                self.link_stage(file_changes, blocks_ready, index_ready, chunks, selected_tests),
+                self.suggest_stage(chunks, suggestions),
+                self.test_stage(selected_tests, test_results),
+                self.report_stage(suggestions, test_results),
+            )
+        finally:
+            await self._on(self.analysis_thread, self._close_repo)
+            await self._on(self.embedding_thread, self._close_embedder)
+            if getattr(self, "response_cache", None) is not None:
+                print(f"Response cache: {self.response_cache.stats()}")
+                self.metrics.add_counts("response_cache", self.response_cache.stats())
+                self.response_cache.close()
+            for executor in (self.analysis_thread, self.embedding_thread, self.llm_threads, self.test_thread):
+                executor.shutdown()
+        print(self.metrics.report())
+        return results[-1]
+
+    def analyzable_files(self) -> List[str]:
+        """
+        Changed non-test Python files, the ones diff_stage analyzes.
+        """
+        return [file for file in self.changed_files
+                if file.endswith(".py") and not is_test_file(file.split("/")[-1])]
+
+    # -- resources, each opened and closed on the thread that uses it ----------
+
+    def _open_repo(self):
+        self.git_parser = GitDiffParser(self.from_commit, self.to_commit, self.keep_repo)
+        self.repo_path = self.git_parser.repo_path
+        self.code_metadata_path = os.path.join(self.repo_path, "Demo-Project")
+        self.changed_files = self.git_parser.get_changed_files()
+        self.symbol_db = SymbolDB(self.symbol_db_path)
+
+    def _close_repo(self):
+        if getattr(self, "symbol_db", None) is not None:
+            print(f"Symbol index: {self.symbol_db.stats()}")
+            self.metrics.add_counts("symbol_db", self.symbol_db.stats())
+            self.symbol_db.close()
+            self.symbol_db = None
+        if getattr(self, "git_parser", None) is not None:
+            self.git_parser.close()
+            self.git_parser = None
+
+    def _open_embedder(self):
+        self.embedding_cache = EmbeddingCache(self.embedding_cache_path)
+        backend = make_embedding_backend(self.embedding_backend, **self.backend_options.get("embedding", {}))
+        self.embedding_client = EmbeddingClient(backend, max_workers=self.embedding_workers)
+
+    def _embed(self, codes: List[str]) -> List[List[float]]:
+        return get_embeddings_cached(codes, self.embedding_cache, self.embedding_client)
+
+    def _close_embedder(self):
+        if getattr(self, "metadata_store", None) is not None:
+            self.metadata_store.close()
+            self.metadata_store = None
+        if getattr(self, "embedding_cache", None) is not None:
+            print(f"Embedding cache: {self.embedding_cache.stats()}")
+            self.metrics.add_counts("embedding_cache", self.embedding_cache.stats())
+            self.embedding_cache.close()
+            self.embedding_cache = None
+
+    # -- index side --------------------------------------------------------
+
+    async def index_stage(self, block_batches: asyncio.Queue, blocks_ready: asyncio.Future, index_ready: asyncio.Future):
+        with self.metrics.stage("index"):
+            try:
+                if self.incremental and os.path.exists(self.index_path) and os.path.exists(self.meta_path):
+                    # only re-extract the files touched by the diff
+                    print("Update Code Chunk Metadata incrementally")
+                    code_changed_files, changed_blocks = await self._on(self.analysis_thread, self._changed_blocks)
+                    # a store-backed mapping: tests are looked up without loading every block
+                    self.metadata_store = code_blocks = await self._on(
+                        self.embedding_thread, update_faiss, code_changed_files, changed_blocks, self._embed,
+                        self.index_path, self.meta_path, self.index_type, self.repo_path)
+                    blocks_ready.set_result(code_blocks)
+                    index_ready.set_result(None)
+                    return
+                print("Prepare Code Chunk Metadata")
+                code_blocks = await self._on(self.analysis_thread, self._parse_all)
+                blocks_ready.set_result(code_blocks)
+                blocks = list(code_blocks.values())
+                batch_size = MAX_BATCH_SIZE * self.embedding_workers
+                for start in range(0, len(blocks), batch_size):
+                    await block_batches.put(blocks[start:start + batch_size])
+                await block_batches.put(code_blocks)
+            except BaseException as e:
+                for future in (blocks_ready, index_ready):
+                    if not future.done():
+                        future.set_exception(e)
+                raise
+            finally:
+                await block_batches.put(None)
+
+    def _changed_blocks(self) -> Tuple[List[str], Dict[tuple, CodeBlock]]:
+        code_prefix = Path(self.code_metadata_path).relative_to(self.repo_path).as_posix() + "/"
+        # a renamed file's blocks are stored under its old path, which changed_files lacks
+        touched = list(dict.fromkeys(self.changed_files + list(self.git_parser.get_renames().values())))
+        code_changed_files = [f for f in touched if f.endswith(".py") and f.startswith(code_prefix)]
+        changed_blocks = {}
+        for file in code_changed_files:
+            file_path = Path(self.repo_path) / file
+            if file_path.exists():
+                changed_blocks.update((block.key, block) for block in self.symbol_db.extract_code_blocks(file_path, self.repo_path))
+        return code_changed_files, changed_blocks
+
+    def _parse_all(self) -> Dict[tuple, CodeBlock]:
+        code_files = scan_files(self.code_metadata_path)
+        return {block.key: block for block in parse_files(code_files, self.repo_path, self.workers, self.symbol_db)}
+
+    async def embed_stage(self, block_batches: asyncio.Queue, index_ready: asyncio.Future):
+        """
+        Embed batches as they arrive; the dict that follows the last batch is the
+        full metadata, written to the index with the collected vectors.
+        """
+        embeddings = []
+        with self.metrics.stage("embed"):
+            try:
+                while True:
+                    item = await block_batches.get()
+                    if item is None:
+                        return
+                    if isinstance(item, dict):
+                        print("Save embeddings into Vector Database")
+                        await self._on(self.embedding_thread, save_to_faiss, embeddings, item,
+                                       self.index_path, self.meta_path, self.index_type, self.repo_path)
+                        index_ready.set_result(None)
+                        continue
+                    embeddings.extend(await self._on(self.embedding_thread, self._embed, [b.code for b in item]))
+            except BaseException as e:
+                if not index_ready.done():
+                    index_ready.set_exception(e)
+                raise
+
+    # -- diff side ---------------------------------------------------------
+
+    async def diff_stage(self, file_changes: asyncio.Queue):
+        print("Parse codebase with AST")
+        with self.metrics.stage("diff"):
+            try:
+                for file in self.analyzable_files():
+                    await file_changes.put(await self._on(self.analysis_thread, self._analyze_file, file))
+            finally:
+                await file_changes.put(None)
+
+    def _analyze_file(self, file: str):
+        before_code = self.git_parser.load_file_from_previous_commit(file)
+        after_code = self.git_parser.load_file_from_target_commit(file)
+        before_symbols = self.symbol_db.symbols_for_source(before_code)
+        after_symbols = self.symbol_db.symbols_for_source(after_code)
+        git_diff_message = self.git_parser.get_diff(file)
+        # only functions overlapping the diff hunks are compared
+        old_lines, new_lines = changed_lines(git_diff_message)
+        changes = diff_symbols(before_symbols.symbols, after_symbols.symbols, after_symbols.call_graph, old_lines, new_lines)
+        queries = changed_symbol_sources(changes, before_code, before_symbols.symbols, after_code, after_symbols.symbols) if self.retrieve_k else []
+        return file, changes, before_symbols.symbols, after_symbols.symbols, git_diff_message, queries
+
+    async def link_stage(self, file_changes: asyncio.Queue, blocks_ready: asyncio.Future, index_ready: asyncio.Future,
+                         chunks: asyncio.Queue, selected_tests: asyncio.Future):
+        changed_functions = {}
+        before_symbols_by_file = {}
+        after_symbols_by_file = {}
+        diffs_by_file = {}
+        queries_by_file = {}
+        try:
+            while True:
+                item = await file_changes.get()
+                if item is None:
+                    break
+                file, changes, before, after, git_diff_message, queries = item
+                changed_functions[file] = changes
+                before_symbols_by_file[file] = before
+                after_symbols_by_file[file] = after
+                diffs_by_file[file] = git_diff_message
+                queries_by_file[file] = queries
+            code_blocks = await blocks_ready
+            with self.metrics.stage("link"):
+                detect_cross_file_moves(changed_functions, before_symbols_by_file, after_symbols_by_file)
+                print("Find Affected Test functions")
+                # call-graph matching and semantic retrieval run side by side
+                (affected_metadata_list, test_dependencies), related_tests = await asyncio.gather(
+                    self._on(self.analysis_thread, self._find_affected_tests, changed_functions, code_blocks, diffs_by_file),
+                    self._retrieve_related(queries_by_file, changed_functions, index_ready),
+                )
+                matched = {(test["file_path"], test["symbol_name"]) for test in affected_metadata_list}
+                for match in related_tests:
+                    if match.block.key not in matched:
+                        # a retrieved test only depends on the files whose changes retrieved it
+                        affected_metadata_list.append(match.block.to_dict())
+                        test_dependencies[match.block.key] = match.files
+                if related_tests:
+                    print(f"Semantic retrieval: {len(related_tests)} related tests, "
+                          f"{sum(m.block.key not in matched for m in related_tests)} not found by call graph")
+                selected_tests.set_result([(test["file_path"], test["symbol_name"]) for test in affected_metadata_list])
+                planned = plan_requests(affected_metadata_list, diffs_by_file, test_dependencies, self.chunk_tokens)
+                print(f"Planned {len(planned)} suggestion requests: {planned}")
+            for chunk in planned:
+                await chunks.put(chunk)
+        except BaseException as e:
+            if not selected_tests.done():
+                selected_tests.set_exception(e)
+            raise
+        finally:
+            for _ in range(self.llm_workers):
+                await chunks.put(None)
+
+    async def _retrieve_related(self, queries_by_file: Dict[str, List[str]], changed_functions: Dict[str, dict],
+                                index_ready: asyncio.Future) -> list:
+        if not self.retrieve_k or not any(queries_by_file.values()):
+            return []
+        await index_ready
+        with self.metrics.stage("retrieve"):
+            return await self._on(self.embedding_thread, self._retrieve, queries_by_file, changed_functions)
+
+    def _retrieve(self, queries_by_file: Dict[str, List[str]], changed_functions: Dict[str, dict]) -> list:
+        query_files = [file for file, queries in queries_by_file.items() for _ in queries]
+        query_vectors = self._embed([query for queries in queries_by_file.values() for query in queries])
+        exclude = {split_node(node) for file, changes in changed_functions.items() for node in changed_nodes(file, changes)}
+        retriever = SemanticRetriever(self.index_path, self.meta_path)
+        tests, sources = retriever.related(query_vectors, query_files, self.retrieve_k, exclude)
+        retriever.close()
+        print(f"Related source blocks: {sources}")
+        return tests
+
+    def _coverage_affected(self, changed_functions: Dict[str, dict], diffs_by_file: Dict[str, str]):
+        """
+        (tests whose recorded coverage meets a changed line, with the changed files they cover;
+        changed files the coverage index never measured, left to static selection).
+        """
+        index = CoverageIndex(self.coverage_index_path)
+        try:
+            measured = {file for file in changed_functions if index.knows(file)}
+            affected = index.affected_tests({file: changed_lines(diffs_by_file.get(file, ""))[0] for file in measured})
+        finally:
+            index.close()
+        print(f"Coverage index: {len(affected)} affected tests, {len(changed_functions) - len(measured)} unmeasured files")
+        return affected, set(changed_functions) - measured
+
+    def _find_affected_tests(self, changed_functions: Dict[str, dict], code_blocks: Dict[tuple, CodeBlock],
+                             diffs_by_file: Dict[str, str]):
+        changed_names_by_file = {file: changed_symbol_names(changes) for file, changes in changed_functions.items()}
+        coverage_affected = None
+        static_files = set(changed_functions)
+        if self.coverage_index_path and os.path.exists(self.coverage_index_path):
+            coverage_affected, static_files = self._coverage_affected(changed_functions, diffs_by_file)
+        all_changed = set().union(*(changed_names_by_file[file] for file in static_files))
+        repo_files = scan_files(self.repo_path)
+        graph_affected = None
+        if self.use_impact_graph:
+            # cross-module reverse BFS from the changed symbols, kept up to date incrementally
+            impact_graph = ImpactGraph.load(self.graph_path)
+            updated = impact_graph.sync(self.repo_path, repo_files, self.symbol_db)
+            impact_graph.save(self.graph_path)
+            changed = set()
+            for file in static_files:
+                changed |= changed_nodes(file, changed_functions[file])
+            graph_affected = impact_graph.affected_tests(changed)
+            print(f"Impact graph: {updated} files updated, {len(graph_affected)} affected tests")
+        affected_metadata_list = []
+        test_dependencies = {}
+        for test_path in repo_files:
+            if not is_test_file(test_path.name):
+                continue
+            relative_path = str(test_path.relative_to(Path(self.repo_path)))
+            with open(test_path, "r") as tf:
+                try:
+                    test_code = tf.read()
+                    test_symbols = self.symbol_db.symbols_for_source(test_code)
+                    closure = CallClosure(test_symbols.call_graph)
+                    if graph_affected is not None:
+                        affected_test_function = [name for path, name in graph_affected if path == relative_path]
+                    else:
+                        # the call graph knows bare names; code_blocks are keyed by qualified ones
+                        affected_test_function = qualify_callers(closure.callers_of_any(all_changed), test_symbols.symbols)
+                    if coverage_affected is not None:
+                        affected_test_function = list(dict.fromkeys(
+                            affected_test_function + [name for path, name in coverage_affected if path == relative_path]))
+                    path_funcname_pair = [(relative_path, func_name) for func_name in affected_test_function]
+                    affected_metadata_list.extend(code_blocks[k].to_dict() for k in path_funcname_pair if k in code_blocks)
+                    # which changed files each affected test reaches, so its request only carries those diffs
+                    for key in path_funcname_pair:
+                        reached = closure.reachable(key[1].rsplit(".", 1)[-1])
+                        depends_on = {file for file in static_files if reached & changed_names_by_file[file]}
+                        if coverage_affected is not None:
+                            depends_on |= coverage_affected.get(key, set())
+                        if depends_on:
+                            test_dependencies[key] = depends_on
+                except Exception as e:
+                    print(f"Error parsing {test_path}: {e}")
+                    continue
+        return affected_metadata_list, test_dependencies
+
+    # -- LLM side ----------------------------------------------------------
+
+    async def suggest_stage(self, chunks: asyncio.Queue, suggestions: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        print("Generate LLM Suggestions")
+
+        async def worker():
+            while True:
+                chunk = await chunks.get()
+                if chunk is None:
+                    return
+                await self._on(self.llm_threads, self._suggest_chunk, chunk, loop, suggestions)
+
+        try:
+            with self.metrics.stage("suggest"):
+                await asyncio.gather(*(worker() for _ in range(self.llm_workers)))
+        finally:
+            await suggestions.put(None)
+
+    def _suggest_chunk(self, chunk, loop: asyncio.AbstractEventLoop, suggestions: asyncio.Queue):
+        self.suggester.suggest_chunk(
+            chunk, lambda suggestion: asyncio.run_coroutine_threadsafe(suggestions.put(suggestion), loop).result(),
+            self.stream)
+
+    # -- test side ---------------------------------------------------------
+
+    async def test_stage(self, selected_tests: asyncio.Future, test_results: asyncio.Future):
+        """
+        Run the tests link_stage selected while the LLM requests are in flight.
+        """
+        try:
+            if not self.run_tests:
+                test_results.set_result(None)
+                return
+            tests = await selected_tests
+            with self.metrics.stage("test"):
+                test_results.set_result(await self._on(self.test_thread, self._run_tests, tests))
+        except BaseException as e:
+            if not test_results.done():
+                test_results.set_exception(e)
+            raise
+
+    def _run_tests(self, tests: List[Tuple[str, str]]):
+        """
+        (results in completion order, wall seconds), or None without tests. Tests run
+        on the working tree from the code directory, likely failures first.
+        """
+        test_root = os.path.relpath(self.code_metadata_path, self.repo_path)
+        # pytest only runs from the code directory; selected helpers elsewhere are not its tests
+        tests = [test for test in tests if test[0].startswith(test_root + "/")]
+        if not tests:
+            return None
+        print(f"Run {len(tests)} affected tests on {self.test_workers} workers")
+        history = RunHistory(self.test_history_path)
+        start = time.perf_counter()
+        try:
+            results = run_tests(tests, self.repo_path, test_root, self.test_workers, history,
+                                on_result=lambda r: print(f"  {r.outcome.upper():<8} {r.test[0]}::{r.test[1]} ({r.duration:.2f}s)"))
+        finally:
+            history.close()
+        wall_time = time.perf_counter() - start
+        metrics.count("tests_run", len(results))
+        print(f"Tests: {summarize(results)} in {wall_time:.2f}s")
+        return results, wall_time
+
+    async def report_stage(self, suggestions: asyncio.Queue, test_results: asyncio.Future) -> int:
+        """
+        Write each suggestion to the report as it arrives, keeping the first per
+        (type, test function), then the test results, if
+        any. Returns how many suggestions were written.
+        """
+        seen = set()
+        with self.metrics.stage("report"):
+            with open(self.report_path, "w") as f:
+                writer = SuggestionMarkdownWriter(f, REPORT_HEADER)
+                while True:
+                    suggestion = await suggestions.get()
+                    if suggestion is None:
+                        break
+                    key = (suggestion["suggestion_type"], suggestion["test_function_name"])
+                    if key not in seen:
+                        seen.add(key)
+                        writer.write(suggestion)
+                tests_run = await test_results
+                if tests_run is not None:
+                    if not writer.count:
+                        f.write(REPORT_HEADER)
+                    results, wall_time = tests_run
+                    test_writer = RunResultsMarkdownWriter(f)
+                    for result in results:
+                        test_writer.write(result.to_dict())
+                    test_writer.finish(wall_time)
+            if writer.count or tests_run is not None:
+                print(f"Report Generated at {self.report_path}")
+            else:
+                os.remove(self.report_path)
+                print("No suggestions--------------------------------")
+        return writer.count
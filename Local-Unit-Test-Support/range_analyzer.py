@@ -0,0 +1,183 @@
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ast_analyzer import diff_symbols, detect_cross_file_moves
+from diff_parser import EMPTY_TREE_SHA, GitObjectReader, changed_lines, get_all_diffs, get_name_status, list_tree, rev_list
+from impact_graph import ImpactGraph, changed_nodes
+from symbol_db import FileSymbols, SymbolDB, DEFAULT_SYMBOL_DB_PATH
+
+DEFAULT_RANGE_OUTPUT = "range_report.jsonl"
+
+
+class RangeAnalyzer:
+    """
+    Walks the commits of a revision range in order, keeping one impact graph at
+    the state of the current commit. Each commit only re-reads the files it
+    touches; their symbols come from symbol_db by blob sha and, with an embed
+    function, only the changed blocks are embedded (cache misses only).
+    """
+
+    def __init__(self, repo_path: str, symbol_db: SymbolDB,
+                 embed: Optional[Callable[[List[str]], List[List[float]]]] = None):
+        self.repo_path = repo_path
+        self.symbol_db = symbol_db
+        self.embed = embed
+        self.reader = GitObjectReader(repo_path)
+        self.graph = ImpactGraph()
+        self.commit = None
+
+    def _symbols(self, object_name: str) -> Tuple[str, Optional[FileSymbols]]:
+        data = self.reader.read_object(object_name)
+        if data is None:
+            return "", None
+        source = data.decode("utf-8", errors="replace")
+        try:
+            return source, self.symbol_db.symbols_for_source(source)
+        except SyntaxError:
+            return source, None
+
+    def start(self, commit: str):
+        """
+        Build the graph for every Python file of commit; blobs already in symbol_db are not parsed again.
+        """
+        files = {}
+        if commit != EMPTY_TREE_SHA:
+            for path, blob_sha in list_tree(self.repo_path, commit).items():
+                if not path.endswith(".py"):
+                    continue
+                symbols = self.symbol_db.get(blob_sha)
+                if symbols is None:
+                    _, symbols = self._symbols(blob_sha)
+                if symbols is not None:
+                    files[path] = symbols
+        self.graph.update_files(files)
+        self.commit = commit
+
+    def analyze(self, parent: str, commit: str) -> dict:
+        """
+        Impact of one commit, then advance the graph to it.
+        """
+        if self.commit != parent:
+            self.start(parent)
+        started = time.perf_counter()
+        name_status = get_name_status(self.repo_path, parent, commit)
+        diffs = get_all_diffs(self.repo_path, parent, commit)
+        changes_by_file = {}
+        before_by_file = {}
+        after_by_file = {}
+        graph_changes: Dict[str, Optional[FileSymbols]] = {}
+        changed_blocks = []
+        for status, old_path, new_path in name_status:
+            if not new_path.endswith(".py") and not old_path.endswith(".py"):
+                continue
+            before = after = None
+            if status != "A" and old_path.endswith(".py"):
+                _, before = self._symbols(f"{parent}:{old_path}")
+                graph_changes[old_path] = None
+            if status != "D" and new_path.endswith(".py"):
+                after_source, after = self._symbols(f"{commit}:{new_path}")
+                graph_changes[new_path] = after
+            if before is None and after is None:
+                continue
+            before_symbols = before.symbols if before is not None else []
+            after_symbols = after.symbols if after is not None else []
+            old_lines, new_lines = changed_lines(diffs.get(new_path if status != "D" else old_path, ""))
+            changes = diff_symbols(before_symbols, after_symbols, after.call_graph if after is not None else {},
+                                   old_lines, new_lines)
+            changes_by_file[new_path] = changes
+            before_by_file[new_path] = before_symbols
+            after_by_file[new_path] = after_symbols
+            if self.embed is not None and after is not None:
+                touched = set(changes["added"] + changes["modified"]) | {new for _, new in changes["renamed"]}
+                changed_blocks += [block.code for block in after.code_blocks(after_source, new_path)
+                                   if block.symbol_name in touched]
+        detect_cross_file_moves(changes_by_file, before_by_file, after_by_file)
+
+        nodes = set()
+        for file, changes in changes_by_file.items():
+            nodes |= changed_nodes(file, changes)
+        # callers of removed code are found in the old graph, callers of new code in the new one
+        affected = self.graph.affected_tests(nodes)
+        self.graph.update_files(graph_changes)
+        affected |= self.graph.affected_tests(nodes)
+        self.commit = commit
+        if changed_blocks:
+            self.embed(changed_blocks)
+
+        return {
+            "commit": commit,
+            "parent": parent,
+            "files": sorted(changes_by_file),
+            "changes": {file: changes for file, changes in changes_by_file.items() if any(changes.values())},
+            "affected_tests": sorted(list(test) for test in affected),
+            "embedded_blocks": len(changed_blocks),
+            "seconds": round(time.perf_counter() - started, 4),
+        }
+
+    def close(self):
+        self.reader.close()
+
+
+def analyze_range(repo_path: str, rev_range: str, output_path: str = DEFAULT_RANGE_OUTPUT,
+                  symbol_db_path: str = DEFAULT_SYMBOL_DB_PATH,
+                  embed: Optional[Callable[[List[str]], List[List[float]]]] = None) -> int:
+    """
+    Write one JSON line of impact results per commit of rev_range to output_path
+    ("-" for stdout, statistics then go to stderr) and report the throughput.
+    Returns the number of commits.
+    """
+    log = sys.stderr if output_path == "-" else sys.stdout
+    commits = rev_list(repo_path, rev_range)
+    symbol_db = SymbolDB(symbol_db_path)
+    analyzer = RangeAnalyzer(repo_path, symbol_db, embed)
+    output = open(output_path, "w") if output_path != "-" else None
+    try:
+        started = time.perf_counter()
+        if commits:
+            analyzer.start(commits[0][1])
+        setup = time.perf_counter() - started
+        for commit, parent in commits:
+            line = json.dumps(analyzer.analyze(parent, commit))
+            if output is not None:
+                output.write(line + "\n")
+                output.flush()
+            else:
+                print(line, flush=True)
+        elapsed = time.perf_counter() - started
+    finally:
+        analyzer.close()
+        if output is not None:
+            output.close()
+        print(f"Symbol index: {symbol_db.stats()}", file=log)
+        symbol_db.close()
+    walk = elapsed - setup
+    rate = len(commits) / walk if walk > 0 else float("inf")
+    print(f"Analyzed {len(commits)} commits in {elapsed:.2f}s (graph setup {setup:.2f}s, {rate:.1f} commits/s)", file=log)
+    return len(commits)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Impact analysis of every commit in a revision range, as JSONL")
+    parser.add_argument("range", help="Revision range, e.g. v1.0..main")
+    parser.add_argument("--repo", default="..", help="Repository to walk (default: parent directory)")
+    parser.add_argument("--output", default=DEFAULT_RANGE_OUTPUT, help="JSONL output path, - for stdout")
+    parser.add_argument("--symbol-db", default=DEFAULT_SYMBOL_DB_PATH, help="Path of the parsed-symbol cache keyed by git blob sha")
+    parser.add_argument("--embedding-backend", default=None, help="Also embed each commit's changed blocks into the embedding cache")
+    args = parser.parse_args()
+
+    embed = None
+    if args.embedding_backend:
+        from embedding_cache import EmbeddingCache
+        from embedding_client import EmbeddingClient, make_embedding_backend
+        from pipeline import get_embeddings_cached
+        cache = EmbeddingCache()
+        client = EmbeddingClient(make_embedding_backend(args.embedding_backend))
+        embed = lambda codes: get_embeddings_cached(codes, cache, client)
+    analyze_range(os.path.abspath(args.repo), args.range, args.output, args.symbol_db, embed)
+    if embed is not None:
+        print(f"Embedding cache: {cache.stats()}")
+        cache.close()
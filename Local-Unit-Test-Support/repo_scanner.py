@@ -0,0 +1,152 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import metrics
+from code_extractor import CodeBlock
+from symbol_db import FileSymbols, SymbolDB, analyze_source, git_blob_sha
+
+DEFAULT_EXCLUDE_DIRS = {
+    ".git", ".hg", ".svn", "venv", ".venv", "env", "__pycache__", "node_modules", "site-packages",
+    ".tox", ".nox", ".mypy_cache", ".pytest_cache", ".ruff_cache", "build", "dist", ".eggs",
+}
+
+
+def is_test_file(filename: str) -> bool:
+    return ("test_" in filename or "_test" in filename) and filename.endswith(".py")
+
+
+class GitIgnore:
+    """
+    Matcher for the common subset of .gitignore syntax: globs, "!" negation,
+    trailing "/" for directories and patterns anchored by a leading or inner "/".
+    Rules from nested .gitignore files only apply below their own directory.
+    """
+
+    def __init__(self):
+        # (base directory relative to the scan root, pattern, negate, dir_only, anchored)
+        self.rules = []
+
+    def add_file(self, gitignore_path: str, base: str = ""):
+        try:
+            with open(gitignore_path, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            anchored = "/" in line
+            line = line.lstrip("/")
+            if line:
+                self.rules.append((base, line, negate, dir_only, anchored))
+
+    def is_ignored(self, rel_path: str, is_dir: bool) -> bool:
+        ignored = False
+        name = rel_path.rsplit("/", 1)[-1]
+        for base, pattern, negate, dir_only, anchored in self.rules:
+            if base:
+                if not rel_path.startswith(base + "/"):
+                    continue
+                sub_path = rel_path[len(base) + 1:]
+            else:
+                sub_path = rel_path
+            if dir_only and not is_dir:
+                continue
+            if fnmatch(sub_path if anchored else name, pattern):
+                ignored = not negate
+        return ignored
+
+
+def scan_files(root: str, include_pattern: str = "*.py", exclude_dirs: Iterable[str] = DEFAULT_EXCLUDE_DIRS,
+               respect_gitignore: bool = True) -> List[Path]:
+    """
+    Walk root and return files matching include_pattern. Excluded and git-ignored
+    directories are pruned during the walk, so their contents are never listed.
+    """
+    root = os.path.abspath(root)
+    exclude_dirs = set(exclude_dirs)
+    gitignore = GitIgnore()
+    matched = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel_dir = os.path.relpath(dirpath, root).replace(os.sep, "/")
+        rel_dir = "" if rel_dir == "." else rel_dir
+        if respect_gitignore and ".gitignore" in filenames:
+            gitignore.add_file(os.path.join(dirpath, ".gitignore"), rel_dir)
+
+        def rel(name):
+            return f"{rel_dir}/{name}" if rel_dir else name
+
+        dirnames[:] = sorted(
+            d for d in dirnames
+            if d not in exclude_dirs and not (respect_gitignore and gitignore.is_ignored(rel(d), True))
+        )
+        for filename in sorted(filenames):
+            if fnmatch(filename, include_pattern) and not (respect_gitignore and gitignore.is_ignored(rel(filename), False)):
+                matched.append(Path(dirpath) / filename)
+    return matched
+
+
+def _analyze_source(args) -> Optional[FileSymbols]:
+    source, blob_sha, file_path = args
+    try:
+        return analyze_source(source, blob_sha)
+    except (SyntaxError, ValueError) as e:
+        print(f"Error parsing {file_path}: {e}")
+        return None
+
+
+def parse_files(files: List[Path], repo_path: str, workers: Optional[int] = None,
+                symbol_db: Optional[SymbolDB] = None) -> List[CodeBlock]:
+    """
+    Extract the code blocks of every file. Files whose blob is already in symbol_db
+    are not parsed again; the rest are parsed on a process pool of `workers`
+    processes (default: one per CPU). workers=1 parses in the current process.
+    """
+    workers = workers or os.cpu_count() or 1
+    sources = []
+    for file_path in files:
+        try:
+            source = Path(file_path).read_text(encoding="utf-8")
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"Error reading {file_path}: {e}")
+            continue
+        sources.append((file_path, source, git_blob_sha(source.encode("utf-8"))))
+
+    symbols_by_sha = {}
+    if symbol_db is not None:
+        for _, _, blob_sha in sources:
+            if blob_sha not in symbols_by_sha:
+                symbols = symbol_db.get(blob_sha)
+                if symbols is not None:
+                    symbols_by_sha[blob_sha] = symbols
+    tasks = {blob_sha: (source, blob_sha, file_path) for file_path, source, blob_sha in sources if blob_sha not in symbols_by_sha}
+    tasks = list(tasks.values())
+    metrics.count("files_parsed", len(tasks))
+
+    if workers == 1 or len(tasks) < 2:
+        results = map(_analyze_source, tasks)
+    else:
+        chunksize = max(1, len(tasks) // (workers * 8))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_analyze_source, tasks, chunksize=chunksize))
+    for symbols in results:
+        if symbols is not None:
+            symbols_by_sha[symbols.blob_sha] = symbols
+            if symbol_db is not None:
+                symbol_db.put(symbols)
+
+    blocks = []
+    for file_path, source, blob_sha in sources:
+        if blob_sha in symbols_by_sha:
+            relative_path = str(Path(file_path).relative_to(Path(repo_path)))
+            blocks.extend(symbols_by_sha[blob_sha].code_blocks(source, relative_path))
+    return blocks
@@ -1,4 +1,5 @@
-from typing import Dict, Any
+import io
+from typing import Dict, Any, List, TextIO
 def generate_markdown_report(file_name:str,changes: dict, related_tests: list, suggestions: dict) -> str:
     report = f"# Regression Test Maintenance Report For {file_name}\n\n"
     
@@ -21,20 +22,77 @@ def generate_markdown_report(file_name:str,changes: dict, related_tests: list, s
     
     return report
 
+REPORT_HEADER = "# Test Maintenance Report\n\nThis report generates suggestions for updating your unit tests based on file changes. \n"
+
+class SuggestionMarkdownWriter:
+    """
+    Write suggestions to a markdown stream one at a time, numbering them as they
+    arrive. The header is only written with the first suggestion.
+    """
+    def __init__(self, stream: TextIO, header: str = ""):
+        self.stream = stream
+        self.header = header
+        self.count = 0
+
+    def write(self, suggestion: Dict[str, Any]):
+        if self.count == 0 and self.header:
+            self.stream.write(self.header)
+        self.count += 1
+        self.stream.write(f'## Suggestion {self.count}\n')
+        self.stream.write(f"#### Suggestion type: {suggestion['suggestion_type']}\n")
+        self.stream.write(f"#### Test function name: {suggestion['test_function_name']}\n")
+        self.stream.write("### Description\n")
+        self.stream.write(f"{suggestion['description']}\n")
+        self.stream.write("### Original Code\n")
+        self.stream.write(f"```python\n{suggestion['original_code']}\n```\n")
+        self.stream.write("### Updated Code\n")
+        self.stream.write(f"```python\n {suggestion['updated_code']}\n```\n")
+        self.stream.flush()
+
 def generate_suggestion_markdown(suggestions: Dict[str, Any]) -> str:
     """Generate markdown content for suggestions"""
-    all_suggestions = suggestions["suggestions"]
-    report = ""
-    id = 1
-    for suggestion in all_suggestions:
-        report += f'## Suggestion {id}\n'
-        report += f"#### Suggestion type: {suggestion['suggestion_type']}\n"
-        report += f"#### Test function name: {suggestion['test_function_name']}\n"
-        report += "### Description\n"
-        report += f"{suggestion['description']}\n"
-        report += "### Original Code\n"
-        report += f"```python\n{suggestion['original_code']}\n```\n"
-        report += "### Updated Code\n"
-        report += f"```python\n {suggestion['updated_code']}\n```\n"
-        id += 1
-    return report
\ No newline at end of file
+    report = io.StringIO()
+    writer = SuggestionMarkdownWriter(report)
+    for suggestion in suggestions["suggestions"]:
+        writer.write(suggestion)
+    return report.getvalue()
+
+class RunResultsMarkdownWriter:
+    """
+    Write test results to a markdown stream as a table, one row per result as it
+    arrives; finish() adds the summary and the output of every failed test.
+    """
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+        self.counts: Dict[str, int] = {}
+        self.failures: List[Dict[str, Any]] = []
+
+    def write(self, result: Dict[str, Any]):
+        if not self.counts:
+            self.stream.write("## Test Results\n")
+            self.stream.write("| Test | Outcome | Duration |\n|---|---|---|\n")
+        self.counts[result["outcome"]] = self.counts.get(result["outcome"], 0) + 1
+        self.stream.write(f"| `{result['file_path']}::{result['symbol_name']}` | {result['outcome']} | {result['duration']:.2f}s |\n")
+        if result["message"]:
+            self.failures.append(result)
+        self.stream.flush()
+
+    def finish(self, wall_time: float = None):
+        summary = ", ".join(f"{count} {outcome}" for outcome, count in sorted(self.counts.items()))
+        self.stream.write(f"\n{sum(self.counts.values())} affected tests run: {summary}")
+        self.stream.write(f" in {wall_time:.2f}s\n" if wall_time is not None else "\n")
+        if self.failures:
+            self.stream.write("### Failures\n")
+            for result in self.failures:
+                self.stream.write(f"#### {result['file_path']}::{result['symbol_name']}\n")
+                self.stream.write(f"```\n{result['message']}\n```\n")
+        self.stream.flush()
+
+def generate_test_results_markdown(results: List[Dict[str, Any]], wall_time: float = None) -> str:
+    """Generate the markdown section for test runs, as returned by affected_runner.RunResult.to_dict()"""
+    report = io.StringIO()
+    writer = RunResultsMarkdownWriter(report)
+    for result in results:
+        writer.write(result)
+    writer.finish(wall_time)
+    return report.getvalue()
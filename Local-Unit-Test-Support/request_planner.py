@@ -0,0 +1,128 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from request_utils import estimate_tokens
+
+DEFAULT_CHUNK_TOKENS = 30_000
+# room left in every chunk for the prompt template and the response schema
+PROMPT_OVERHEAD_TOKENS = 500
+
+
+class RequestChunk:
+    """
+    One suggestion request: a group of affected tests plus only the diff pieces they depend on.
+    """
+    __slots__ = ("tests", "diffs", "tokens")
+
+    def __init__(self):
+        self.tests: List[dict] = []
+        self.diffs: Dict[str, str] = {}
+        self.tokens = PROMPT_OVERHEAD_TOKENS
+
+    def test_code(self) -> str:
+        return "\n".join(f"{test['file_path']}\n{test['code']}\n" for test in self.tests)
+
+    def git_diff(self) -> str:
+        return "\n".join(self.diffs.values())
+
+    def __repr__(self):
+        return f"RequestChunk({len(self.tests)} tests, {len(self.diffs)} diff pieces, ~{self.tokens} tokens)"
+
+
+def split_diff_pieces(file_path: str, diff: str, max_tokens: int) -> Dict[str, str]:
+    """
+    Split one file's diff into pieces of at most max_tokens, cutting between hunks
+    and repeating the file header in each piece. Small diffs stay a single piece.
+    """
+    if estimate_tokens(diff) <= max_tokens:
+        return {file_path: diff}
+    header, _, body = diff.partition("\n@@")
+    hunks = ["@@" + hunk for hunk in body.split("\n@@")] if body else []
+    pieces = {}
+    current = []
+    for hunk in hunks:
+        if current and estimate_tokens(header + "\n" + "\n".join(current + [hunk])) > max_tokens:
+            pieces[f"{file_path}#{len(pieces)}"] = header + "\n" + "\n".join(current)
+            current = []
+        current.append(hunk)
+    if current or not pieces:
+        pieces[f"{file_path}#{len(pieces)}"] = header + "\n" + "\n".join(current)
+    return pieces
+
+
+def plan_requests(affected_tests: List[dict], diffs_by_file: Dict[str, str],
+                  test_dependencies: Dict[Tuple[str, str], Set[str]],
+                  max_tokens: int = DEFAULT_CHUNK_TOKENS) -> List[RequestChunk]:
+    """
+    Pack affected tests into chunks of at most max_tokens (estimated).
+
+    test_dependencies maps (test file, test name) to the changed files the test
+    reaches; tests without an entry depend on every diff. Tests sharing
+    dependencies are packed together so their diffs are sent once. Diff pieces
+    no test depends on still go out in their own chunks, so untested changes
+    can get "add" suggestions.
+    """
+    piece_budget = max(1, (max_tokens - PROMPT_OVERHEAD_TOKENS) // 2)
+    pieces_by_file = {file: split_diff_pieces(file, diff, piece_budget) for file, diff in diffs_by_file.items()}
+    piece_tokens = {name: estimate_tokens(piece) for pieces in pieces_by_file.values() for name, piece in pieces.items()}
+    all_pieces = {name: piece for pieces in pieces_by_file.values() for name, piece in pieces.items()}
+
+    def pieces_for(test: dict) -> List[str]:
+        files = test_dependencies.get((test["file_path"], test["symbol_name"]))
+        files = diffs_by_file.keys() if files is None else files
+        return sorted(name for file in files for name in pieces_by_file.get(file, {}))
+
+    chunks: List[RequestChunk] = []
+    current: Optional[RequestChunk] = None
+    covered = set()
+    for test in sorted(affected_tests, key=lambda t: (pieces_for(t), t["file_path"], t["symbol_name"])):
+        test_tokens = estimate_tokens(test["code"])
+        needed = pieces_for(test)
+        covered.update(needed)
+        cost = test_tokens + sum(piece_tokens[p] for p in needed if current is None or p not in current.diffs)
+        if current is not None and current.tokens + cost > max_tokens:
+            current = None
+        if current is None:
+            current = RequestChunk()
+            chunks.append(current)
+            cost = test_tokens + sum(piece_tokens[p] for p in needed)
+        if current.tokens + cost <= max_tokens or not needed:
+            current.tests.append(test)
+            _add_pieces(current, needed, all_pieces, piece_tokens)
+            current.tokens += test_tokens
+            continue
+        # the test's diffs do not fit one request: repeat the test with each group of pieces
+        for group in _group_pieces(needed, piece_tokens, max_tokens - PROMPT_OVERHEAD_TOKENS - test_tokens):
+            if current.tests or current.diffs:
+                current = RequestChunk()
+                chunks.append(current)
+            current.tests.append(test)
+            current.tokens += test_tokens
+            _add_pieces(current, group, all_pieces, piece_tokens)
+        current = None
+
+    leftover = [name for name in all_pieces if name not in covered]
+    for group in _group_pieces(leftover, piece_tokens, max_tokens - PROMPT_OVERHEAD_TOKENS):
+        chunk = RequestChunk()
+        _add_pieces(chunk, group, all_pieces, piece_tokens)
+        chunks.append(chunk)
+    return chunks
+
+
+def _add_pieces(chunk: RequestChunk, names: Iterable[str], all_pieces: Dict[str, str], piece_tokens: Dict[str, int]):
+    for name in names:
+        if name not in chunk.diffs:
+            chunk.diffs[name] = all_pieces[name]
+            chunk.tokens += piece_tokens[name]
+
+
+def _group_pieces(names: List[str], piece_tokens: Dict[str, int], budget: int) -> List[List[str]]:
+    groups, current, used = [], [], 0
+    for name in names:
+        if current and used + piece_tokens[name] > budget:
+            groups.append(current)
+            current, used = [], 0
+        current.append(name)
+        used += piece_tokens[name]
+    if current:
+        groups.append(current)
+    return groups
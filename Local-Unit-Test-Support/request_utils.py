@@ -0,0 +1,86 @@
+import http.client
+import json
+import random
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import Callable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count (~4 characters per token), good enough for request packing.
+    """
+    return len(text) // 4 + 1
+
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Whether a request error is worth retrying: connection failures, timeouts, rate
+    limits (429) and server errors (5xx). Other HTTP errors (auth, bad request) and
+    programming errors are not.
+    """
+    # urllib's HTTPError and the google.genai API errors carry the status as .code,
+    # openai-style clients as .status_code
+    status = getattr(error, "code", None)
+    if not isinstance(status, int):
+        status = getattr(error, "status_code", None)
+    if isinstance(status, int) and not isinstance(status, bool):
+        return status == 429 or status >= 500
+    if isinstance(error, (ConnectionError, TimeoutError, urllib.error.URLError, http.client.HTTPException)):
+        return True
+    # httpx, which google.genai uses, is only checked once something imported it
+    httpx = sys.modules.get("httpx")
+    return httpx is not None and isinstance(error, httpx.TransportError)
+
+
+def call_with_retry(fn: Callable[[], T], max_retries: int = 5, backoff_base: float = 1.0, backoff_max: float = 30.0,
+                    label: str = "Request") -> T:
+    """
+    Call fn, retrying transient failures (see is_transient) with jittered exponential
+    backoff; re-raises other errors at once and transient ones after max_retries retries.
+    """
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            attempt += 1
+            if attempt > max_retries or not is_transient(e):
+                raise
+            delay = min(backoff_max, backoff_base * 2 ** (attempt - 1)) * (0.5 + random.random() / 2)
+            print(f"{label} failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def _json_request(url: str, payload: dict, api_key: Optional[str]) -> urllib.request.Request:
+    headers = {"Content-Type": "application/json"}
+    if api_key:
+        headers["Authorization"] = f"Bearer {api_key}"
+    return urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"), headers=headers, method="POST")
+
+
+def post_json(url: str, payload: dict, api_key: Optional[str] = None, timeout: float = 120.0) -> dict:
+    """
+    POST payload as JSON and return the decoded JSON response (urllib errors propagate).
+    """
+    with urllib.request.urlopen(_json_request(url, payload, api_key), timeout=timeout) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+
+def post_json_events(url: str, payload: dict, api_key: Optional[str] = None, timeout: float = 120.0) -> Iterator[dict]:
+    """
+    POST payload as JSON and yield each "data:" event of a server-sent event stream, decoded.
+    """
+    with urllib.request.urlopen(_json_request(url, payload, api_key), timeout=timeout) as response:
+        for line in response:
+            line = line.decode("utf-8").strip()
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                return
+            yield json.loads(data)
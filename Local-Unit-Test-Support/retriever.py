@@ -0,0 +1,104 @@
+import os
+from typing import Dict, Iterable, List, Set, Tuple
+
+from code_extractor import CodeBlock
+from repo_scanner import is_test_file
+from metadata_store import MetadataStore
+from vector_store import load_index, set_search_params
+
+BlockKey = Tuple[str, str]
+
+DEFAULT_TOP_K = 10
+# tests and source share one index, so each query fetches more neighbours than it keeps
+OVERSAMPLE = 4
+
+
+def is_test_block(block: CodeBlock) -> bool:
+    """
+    A test function, or a Test* class or anything inside one, in a test file.
+    """
+    if not is_test_file(os.path.basename(block.file_path)):
+        return False
+    parts = block.symbol_name.split(".")
+    return parts[-1].startswith("test") or any(part.startswith("Test") for part in parts)
+
+
+def changed_symbol_sources(changes: dict, before_source: str, before_symbols: list,
+                           after_source: str, after_symbols: list) -> List[str]:
+    """
+    Source of every symbol one file's diff_symbols result added, modified, renamed
+    or moved (new version), or removed (old version); these are the retrieval queries.
+    """
+    new_names = set(changes.get("added", []) + changes.get("modified", []))
+    for _, new_name in changes.get("renamed", []) + changes.get("moved", []):
+        if "::" not in new_name:
+            new_names.add(new_name)
+    old_names = set(changes.get("removed", []))
+
+    def sources(source, symbols, names):
+        lines = source.splitlines()
+        return ["\n".join(lines[start - 1:end]) for _, name, start, end, *_ in symbols if name in names]
+
+    return sources(after_source, after_symbols, new_names) + sources(before_source, before_symbols, old_names)
+
+
+class Match:
+    """
+    One retrieved block: its best (smallest) distance to any query and the changed files whose symbols retrieved it.
+    """
+    __slots__ = ("block", "distance", "files")
+
+    def __init__(self, block: CodeBlock, distance: float):
+        self.block = block
+        self.distance = distance
+        self.files: Set[str] = set()
+
+    def __repr__(self):
+        return f"Match({self.block.file_path}::{self.block.symbol_name}, {self.distance:.3f})"
+
+
+class SemanticRetriever:
+    """
+    Top-k related tests and source blocks for a set of changed symbols, searched
+    in the FAISS index written by save_to_faiss / update_faiss (memory-mapped).
+    Only the blocks of the returned neighbours are read from the metadata store.
+    """
+
+    def __init__(self, index_path: str, meta_path: str, mmap: bool = True):
+        self.index = load_index(index_path, mmap)
+        set_search_params(self.index)
+        self.store = MetadataStore(meta_path)
+
+    def related(self, query_vectors: List[List[float]], query_files: List[str], k: int = DEFAULT_TOP_K,
+                exclude: Iterable[BlockKey] = ()) -> Tuple[List[Match], List[Match]]:
+        """
+        (tests, source blocks), each the k closest to any query, nearest first.
+        query_files[i] is the changed file query i came from; blocks in exclude
+        (typically the changed symbols themselves) are never returned.
+        """
+        import numpy as np
+
+        if not query_vectors or self.index.ntotal == 0:
+            return [], []
+        exclude = set(exclude)
+        distances, ids = self.index.search(np.asarray(query_vectors, dtype="float32"),
+                                           min(k * OVERSAMPLE, self.index.ntotal))
+        blocks = self.store.get_many({int(block_id) for block_id in ids.ravel() if block_id >= 0})
+        matches: Dict[BlockKey, Match] = {}
+        for file, row_distances, row_ids in zip(query_files, distances, ids):
+            for distance, block_id in zip(row_distances, row_ids):
+                block = blocks.get(int(block_id))
+                if block is None or block.key in exclude:
+                    continue
+                match = matches.get(block.key)
+                if match is None:
+                    match = matches[block.key] = Match(block, float(distance))
+                match.distance = min(match.distance, float(distance))
+                match.files.add(file)
+        ranked = sorted(matches.values(), key=lambda m: (m.distance, m.block.key))
+        tests = [m for m in ranked if is_test_block(m.block)][:k]
+        sources = [m for m in ranked if not is_test_block(m.block)][:k]
+        return tests, sources
+
+    def close(self):
+        self.store.close()
@@ -0,0 +1,119 @@
+import ast
+import hashlib
+import os
+import pickle
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+import metrics
+from ast_analyzer import Symbol, build_call_graph, extract_references, extract_symbols
+from code_extractor import CodeBlock
+
+DEFAULT_SYMBOL_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".symbol_db.sqlite")
+# bump when FileSymbols changes shape so stale pickles are ignored
+SCHEMA_VERSION = 3
+
+
+def git_blob_sha(data: bytes) -> str:
+    """
+    The object id git assigns to a blob with this content (same as `git hash-object`).
+    """
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+class FileSymbols:
+    """
+    Everything the analysis needs from one file version, keyed by its git blob sha.
+
+    symbols: (symbol_type, qualified name, start line, end line, normalized body hash)
+    call_graph: {function name: names it calls}
+    imports, calls: import table and raw call sites, see ast_analyzer.extract_references
+    """
+    __slots__ = ("blob_sha", "symbols", "call_graph", "imports", "calls")
+
+    def __init__(self, blob_sha: str, symbols: List[Symbol], call_graph: Dict[str, Set[str]],
+                 imports: Dict[str, tuple], calls: Dict[str, Set[tuple]]):
+        self.blob_sha = blob_sha
+        self.symbols = symbols
+        self.call_graph = call_graph
+        self.imports = imports
+        self.calls = calls
+
+    def __getstate__(self):
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __setstate__(self, state):
+        for slot, value in zip(self.__slots__, state):
+            setattr(self, slot, value)
+
+    def code_blocks(self, source: str, relative_path: str) -> List[CodeBlock]:
+        lines = source.splitlines()
+        return [
+            CodeBlock(block_type, name, relative_path, "\n".join(lines[start - 1:end]), start, end)
+            for block_type, name, start, end, _ in self.symbols
+        ]
+
+
+def analyze_source(source: str, blob_sha: Optional[str] = None) -> FileSymbols:
+    """
+    Parse source once and collect its symbols, spans, body hashes and call edges.
+    """
+    tree = ast.parse(source)
+    imports, calls = extract_references(tree)
+    return FileSymbols(blob_sha or git_blob_sha(source.encode("utf-8")), extract_symbols(tree), build_call_graph(tree),
+                       imports, calls)
+
+
+class SymbolDB:
+    """
+    SQLite store of FileSymbols by git blob sha. A blob is parsed at most once,
+    no matter how many runs, commits or paths it appears in.
+    """
+
+    def __init__(self, path: str = DEFAULT_SYMBOL_DB_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path)
+        self.table = f"file_symbols_v{SCHEMA_VERSION}"
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} (blob_sha TEXT PRIMARY KEY, data BLOB NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    def get(self, blob_sha: str) -> Optional[FileSymbols]:
+        row = self.conn.execute(f"SELECT data FROM {self.table} WHERE blob_sha = ?", (blob_sha,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pickle.loads(row[0])
+
+    def put(self, symbols: FileSymbols):
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO {self.table} (blob_sha, data, accessed_at) VALUES (?, ?, ?)",
+            (symbols.blob_sha, pickle.dumps(symbols, protocol=pickle.HIGHEST_PROTOCOL), time.time()),
+        )
+
+    def symbols_for_source(self, source: str) -> FileSymbols:
+        blob_sha = git_blob_sha(source.encode("utf-8"))
+        symbols = self.get(blob_sha)
+        if symbols is None:
+            symbols = analyze_source(source, blob_sha)
+            metrics.count("files_parsed")
+            self.put(symbols)
+        return symbols
+
+    def extract_code_blocks(self, file_path: Path, repo_path: str) -> List[CodeBlock]:
+        source = Path(file_path).read_text(encoding="utf-8")
+        relative_path = str(Path(file_path).relative_to(Path(repo_path)))
+        return self.symbols_for_source(source).code_blocks(source, relative_path)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
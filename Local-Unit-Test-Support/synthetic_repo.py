@@ -0,0 +1,149 @@
+import argparse
+import os
+import random
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# the pipeline reads the code under <repo>/Demo-Project and runs from <repo>/<tool dir>
+CODE_DIR = "Demo-Project"
+TOOL_DIR = "tool"
+
+_GIT_ENV = {"GIT_AUTHOR_NAME": "bench", "GIT_AUTHOR_EMAIL": "bench@example.com",
+            "GIT_COMMITTER_NAME": "bench", "GIT_COMMITTER_EMAIL": "bench@example.com"}
+
+
+class SyntheticRepo:
+    """
+    Generates a git repository of `modules` modules with `functions` functions and
+    one class each, calling functions of their own and of earlier modules, plus
+    `tests` test functions per module. Every later commit edits the bodies of a
+    `churn` fraction of all functions and appends a new function to some modules.
+    The same seed always produces the same history.
+    """
+
+    def __init__(self, root: str, modules: int = 50, functions: int = 20, tests: int = 5,
+                 churn: float = 0.02, seed: int = 0):
+        self.root = os.path.abspath(root)
+        self.modules = modules
+        self.tests = tests
+        self.churn = churn
+        self.rng = random.Random(seed)
+        # per module: [(version, calls)] for each function
+        self.functions: List[List[Tuple[int, List[Tuple[int, int]]]]] = []
+        for m in range(modules):
+            self.functions.append([(0, self._pick_calls(m, j)) for j in range(functions)])
+
+    def _pick_calls(self, module: int, index: int) -> List[Tuple[int, int]]:
+        # only earlier functions and earlier modules, so imports never cycle
+        calls = []
+        if index > 0:
+            calls.append((module, self.rng.randrange(index)))
+        if module > 0 and self.rng.random() < 0.5:
+            other = self.rng.randrange(module)
+            calls.append((other, self.rng.randrange(len(self.functions[other]))))
+        return calls
+
+    def _module_source(self, m: int) -> str:
+        imports = sorted({(o, p) for _, calls in self.functions[m] for o, p in calls if o != m})
+        lines = [f"from pkg.module_{o} import func_{o}_{p}" for o, p in imports]
+        lines.append("")
+        for j, (version, calls) in enumerate(self.functions[m]):
+            lines.append("")
+            lines.append(f"def func_{m}_{j}(x):")
+            lines.append(f"    total = x * {version + 1} + {j}")
+            for o, p in calls:
+                lines.append(f"    total += func_{o}_{p}(x - 1) if x > 0 else 0")
+            lines.append("    return total")
+            lines.append("")
+        lines.append("")
+        lines.append(f"class Model{m}:")
+        for k in range(min(3, len(self.functions[m]))):
+            lines.append(f"    def method_{k}(self, x):")
+            lines.append(f"        return func_{m}_{k}(x)")
+            lines.append("")
+        return "\n".join(lines)
+
+    def _test_source(self, m: int) -> str:
+        count = len(self.functions[m])
+        targets = [(t, self.rng.randrange(count)) for t in range(self.tests)]
+        lines = [f"from pkg.module_{m} import Model{m}, " + ", ".join(sorted({f"func_{m}_{j}" for _, j in targets}))]
+        for t, j in targets:
+            lines.append("")
+            lines.append("")
+            lines.append(f"def test_func_{m}_{t}():")
+            lines.append(f"    assert func_{m}_{j}(2) == func_{m}_{j}(2)")
+        lines.append("")
+        lines.append("")
+        lines.append(f"def test_model_{m}():")
+        lines.append(f"    assert Model{m}().method_0(1) is not None")
+        lines.append("")
+        return "\n".join(lines)
+
+    def _write(self, relative: str, source: str):
+        path = Path(self.root, CODE_DIR, relative)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(source, encoding="utf-8")
+
+    def _git(self, *args):
+        subprocess.run(["git", "-C", self.root, *args], check=True, capture_output=True,
+                       env={**os.environ, **_GIT_ENV})
+
+    def _commit(self, message: str):
+        self._git("add", "-A")
+        self._git("commit", "-q", "-m", message)
+
+    def create(self, commits: int = 10) -> str:
+        """
+        Write the initial tree, commit it, then add `commits` churn commits. Returns the repo path.
+        """
+        os.makedirs(os.path.join(self.root, TOOL_DIR), exist_ok=True)
+        self._git("init", "-q")
+        self._write("pkg/__init__.py", "")
+        self._write("tests/__init__.py", "")
+        for m in range(self.modules):
+            self._write(f"pkg/module_{m}.py", self._module_source(m))
+            self._write(f"tests/test_module_{m}.py", self._test_source(m))
+        self._commit("initial")
+        for c in range(commits):
+            self._commit(self._churn(c))
+        return self.root
+
+    def _churn(self, commit: int) -> str:
+        total = sum(len(functions) for functions in self.functions)
+        edits = max(1, int(total * self.churn))
+        touched = set()
+        for _ in range(edits):
+            m = self.rng.randrange(self.modules)
+            j = self.rng.randrange(len(self.functions[m]))
+            version, calls = self.functions[m][j]
+            self.functions[m][j] = (version + 1, calls)
+            touched.add(m)
+        for m in self.rng.sample(range(self.modules), max(1, edits // 10)):
+            self.functions[m].append((0, self._pick_calls(m, len(self.functions[m]))))
+            touched.add(m)
+        for m in sorted(touched):
+            self._write(f"pkg/module_{m}.py", self._module_source(m))
+        return f"churn {commit}: {edits} edits in {len(touched)} modules"
+
+    def stats(self) -> Dict[str, int]:
+        return {"modules": self.modules, "functions": sum(len(f) for f in self.functions),
+                "tests": self.modules * (self.tests + 1)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic git repository for benchmarks")
+    parser.add_argument("path", help="Directory to create the repository in (must not exist)")
+    parser.add_argument("--modules", type=int, default=50, help="Number of source modules")
+    parser.add_argument("--functions", type=int, default=20, help="Functions per module")
+    parser.add_argument("--tests", type=int, default=5, help="Test functions per module")
+    parser.add_argument("--commits", type=int, default=10, help="Churn commits after the initial one")
+    parser.add_argument("--churn", type=float, default=0.02, help="Fraction of all functions edited per commit")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    if os.path.exists(args.path):
+        parser.error(f"{args.path} already exists")
+    repo = SyntheticRepo(args.path, args.modules, args.functions, args.tests, args.churn, args.seed)
+    repo.create(args.commits)
+    print(f"Created {repo.root}: {repo.stats()}, {args.commits + 1} commits")
@@ -56,12 +56,122 @@ def extract_call_graph(code: str) -> dict[str, set[str]]:
     collector.visit(tree)
     return collector.calls
 
+def strongly_connected_components(graph: dict[int, list[int]], num_nodes: int) -> list[list[int]]:
+    """
+    Iterative Tarjan over nodes 0..num_nodes-1. Components come out in reverse
+    topological order: every component appears after all components it can reach.
+    """
+    index = [0] * num_nodes
+    lowlink = [0] * num_nodes
+    visited = [False] * num_nodes
+    on_stack = [False] * num_nodes
+    stack, components = [], []
+    counter = 1
+    for root in range(num_nodes):
+        if visited[root]:
+            continue
+        work = [(root, iter(graph.get(root, ())))]
+        visited[root] = True
+        index[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if not visited[child]:
+                    visited[child] = True
+                    index[child] = lowlink[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    on_stack[child] = True
+                    work.append((child, iter(graph.get(child, ()))))
+                    break
+                if on_stack[child]:
+                    lowlink[node] = min(lowlink[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+    return components
+
+class CallClosure:
+    """
+    Transitive closure of a call map, computed once per strongly connected component.
+    Every name gets an integer id and reachable sets are stored as int bitsets.
+    """
+    def __init__(self, call_map: dict[str, set[str]]):
+        self.names = list(dict.fromkeys([*call_map, *(callee for callees in call_map.values() for callee in callees)]))
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        graph = {self.ids[func]: [self.ids[callee] for callee in callees] for func, callees in call_map.items()}
+
+        component_of = [0] * len(self.names)
+        component_reach = []
+        for c, members in enumerate(strongly_connected_components(graph, len(self.names))):
+            for member in members:
+                component_of[member] = c
+            reach = 0
+            cyclic = len(members) > 1
+            for member in members:
+                for callee in graph.get(member, ()):
+                    callee_component = component_of[callee]
+                    if callee_component == c:
+                        cyclic = True
+                    else:
+                        # successors were finished earlier (reverse topological order)
+                        reach |= component_reach[callee_component] | (1 << callee)
+            if cyclic:
+                for member in members:
+                    reach |= 1 << member
+            component_reach.append(reach)
+        self.reach = {func: component_reach[component_of[self.ids[func]]] for func in call_map}
+
+    def mask(self, names) -> int:
+        bits = 0
+        for name in names:
+            if name in self.ids:
+                bits |= 1 << self.ids[name]
+        return bits
+
+    def reachable(self, func: str) -> set[str]:
+        bits = self.reach.get(func, 0)
+        result = set()
+        while bits:
+            low = bits & -bits
+            result.add(self.names[low.bit_length() - 1])
+            bits ^= low
+        return result
+
+    def callers_of_any(self, names) -> list[str]:
+        """
+        Functions of the call map that transitively call any of names.
+        """
+        target = self.mask(names)
+        return [func for func, reach in self.reach.items() if reach & target]
+
+def qualify_callers(callers, symbols) -> list[str]:
+    """
+    Map the bare function names of a call graph back to the qualified names of the
+    functions they stand for, e.g. test_add -> TestMath.test_add for a method.
+    symbols are ast_analyzer symbols (type, qualified name, ...); a name defined
+    in several places maps to all of them.
+    """
+    qualified = defaultdict(list)
+    for kind, name, *_ in symbols:
+        if kind == "function":
+            qualified[name.rsplit(".", 1)[-1]].append(name)
+    return list(dict.fromkeys(name for caller in callers for name in qualified.get(caller, [caller])))
+
 def expand_calls(call_map: dict[str, set[str]]) -> dict[str, set[str]]:
-    def dfs(func, visited):
-        for callee in call_map.get(func, []):
-            if callee not in visited:
-                visited.add(callee)
-                dfs(callee, visited)
-        return visited
-
-    return {func: dfs(func, set()) for func in call_map}
\ No newline at end of file
+    closure = CallClosure(call_map)
+    return {func: closure.reachable(func) for func in call_map}
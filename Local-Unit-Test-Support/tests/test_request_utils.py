@@ -0,0 +1,45 @@
+import urllib.error
+
+import pytest
+
+import request_utils
+from request_utils import call_with_retry, is_transient
+
+
+def _http_error(code: int) -> urllib.error.HTTPError:
+    return urllib.error.HTTPError("https://example.com", code, "error", {}, None)
+
+
+@pytest.mark.parametrize("error", [ConnectionResetError(), TimeoutError(), urllib.error.URLError("no route"),
+                                   _http_error(429), _http_error(503)])
+def test_transient_errors(error):
+    assert is_transient(error)
+
+
+@pytest.mark.parametrize("error", [_http_error(400), _http_error(401), TypeError("bug"), ValueError("bad")])
+def test_permanent_errors(error):
+    assert not is_transient(error)
+
+
+def test_call_with_retry_only_retries_transient_errors(monkeypatch):
+    monkeypatch.setattr(request_utils.time, "sleep", lambda seconds: None)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ConnectionResetError()
+        return "ok"
+
+    assert call_with_retry(flaky, max_retries=5) == "ok"
+    assert len(calls) == 3
+
+    calls.clear()
+
+    def unauthorized():
+        calls.append(1)
+        raise _http_error(401)
+
+    with pytest.raises(urllib.error.HTTPError):
+        call_with_retry(unauthorized, max_retries=5)
+    assert len(calls) == 1
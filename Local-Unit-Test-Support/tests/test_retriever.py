@@ -0,0 +1,19 @@
+from code_extractor import CodeBlock
+from retriever import is_test_block
+
+
+def _block(symbol_type: str, name: str, path: str = "Demo-Project/tests/test_math_utils.py") -> CodeBlock:
+    return CodeBlock(symbol_type, name, path, "", 1, 2)
+
+
+def test_test_classes_and_their_members_are_test_code():
+    assert is_test_block(_block("class", "TestMath"))
+    assert is_test_block(_block("function", "TestMath.test_add_method"))
+    assert is_test_block(_block("function", "TestMath.setup_method"))
+    assert is_test_block(_block("function", "test_add"))
+
+
+def test_helpers_and_source_blocks_are_not_test_code():
+    assert not is_test_block(_block("function", "make_numbers"))
+    assert not is_test_block(_block("class", "Calculator", "Demo-Project/math_utils.py"))
+    assert not is_test_block(_block("function", "TestMath.test_add", "Demo-Project/math_utils.py"))
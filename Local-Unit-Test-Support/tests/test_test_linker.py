@@ -0,0 +1,29 @@
+from symbol_db import analyze_source
+from test_linker import CallClosure, qualify_callers
+
+TEST_SOURCE = '''
+from math_utils import add
+
+
+def test_add():
+    assert add(1, 2) == 3
+
+
+class TestMath:
+    def test_add_method(self):
+        assert add(2, 2) == 4
+
+    def test_other(self):
+        assert True
+'''
+
+
+def test_qualify_callers_finds_test_methods():
+    symbols = analyze_source(TEST_SOURCE)
+    callers = CallClosure(symbols.call_graph).callers_of_any({"add"})
+    assert sorted(qualify_callers(callers, symbols.symbols)) == ["TestMath.test_add_method", "test_add"]
+
+
+def test_qualify_callers_keeps_every_definition_of_a_name():
+    symbols = [("function", "TestA.test_x", 1, 2, ""), ("function", "TestB.test_x", 3, 4, ""), ("class", "TestA", 1, 2, "")]
+    assert qualify_callers(["test_x", "helper"], symbols) == ["TestA.test_x", "TestB.test_x", "helper"]
@@ -0,0 +1,165 @@
+import math
+import os
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Tuple
+
+from code_extractor import CodeBlock
+from metadata_store import DEFAULT_META_PATH, MetadataStore, code_hash, symbol_id
+
+# faiss and numpy are imported where they are used, so importing this module
+# (e.g. for INDEX_TYPES in a CLI's --help) stays cheap
+if TYPE_CHECKING:
+    import numpy as np
+
+BlockKey = Tuple[str, str]
+
+# next to the module like metadata.sqlite, so the two stay paired whatever the working directory
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "index.faiss")
+INDEX_TYPES = ["flat", "ivf", "hnsw", "ivfpq"]
+# IVF/PQ need enough points per centroid to train; smaller sets fall back to flat
+MIN_TRAIN_POINTS_PER_LIST = 39
+
+
+def _to_matrix(embeddings) -> "np.ndarray":
+    import numpy as np
+    return np.asarray(embeddings, dtype="float32")
+
+
+def index_factory_string(index_type: str, dim: int, num_vectors: int, nlist: int = None, pq_m: int = None,
+                         hnsw_m: int = 32) -> str:
+    """
+    FAISS factory string for index_type, with nlist/PQ sizes derived from the data if not given.
+    All variants accept add_with_ids so vectors keep their symbol_id().
+    """
+    if nlist is None:
+        nlist = max(1, min(4 * int(math.sqrt(num_vectors)), num_vectors // MIN_TRAIN_POINTS_PER_LIST))
+    if index_type in ("ivf", "ivfpq") and num_vectors < MIN_TRAIN_POINTS_PER_LIST * nlist:
+        print(f"Only {num_vectors} vectors, not enough to train {index_type}; using flat index")
+        index_type = "flat"
+    if index_type == "flat":
+        return "IDMap,Flat"
+    if index_type == "ivf":
+        return f"IVF{nlist},Flat"
+    if index_type == "hnsw":
+        return f"IDMap,HNSW{hnsw_m}"
+    if index_type == "ivfpq":
+        if pq_m is None:
+            pq_m = next(m for m in (64, 48, 32, 16, 8, 4, 2, 1) if dim % m == 0 and m <= dim)
+        return f"IVF{nlist},PQ{pq_m}"
+    raise ValueError(f"Unknown index type: {index_type} (expected one of {INDEX_TYPES})")
+
+
+def build_index(vectors: "np.ndarray", ids: "np.ndarray", index_type: str = "flat", train_sample: int = 100_000,
+                **factory_kwargs):
+    """
+    Create, train (on a random sample of at most train_sample vectors) and fill an index.
+    """
+    import faiss
+    import numpy as np
+
+    factory = index_factory_string(index_type, vectors.shape[1], len(vectors), **factory_kwargs)
+    index = faiss.index_factory(vectors.shape[1], factory)
+    if not index.is_trained:
+        sample = vectors
+        if len(vectors) > train_sample:
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(len(vectors), train_sample, replace=False)]
+        index.train(sample)
+    index.add_with_ids(vectors, ids)
+    return index
+
+
+def supports_remove(index) -> bool:
+    import faiss
+    # HNSW graphs cannot drop vectors, even behind an IDMap
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    return not isinstance(inner, faiss.IndexHNSW)
+
+
+def set_search_params(index, nprobe: int = 16, ef_search: int = 64):
+    import faiss
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efSearch = ef_search
+
+
+def load_index(save_path: str = DEFAULT_INDEX_PATH, mmap: bool = True):
+    """
+    Read an index for querying. With mmap the file is mapped instead of copied
+    into memory, so only the pages a search touches are read from disk.
+    """
+    import faiss
+    if mmap:
+        try:
+            return faiss.read_index(save_path, faiss.IO_FLAG_MMAP)
+        except RuntimeError:
+            pass
+    return faiss.read_index(save_path)
+
+
+def save_to_faiss(embeddings, metadata: Dict[BlockKey, CodeBlock], save_path=DEFAULT_INDEX_PATH, meta_path=DEFAULT_META_PATH,
+                  index_type="flat", repo_path="."):
+    """
+    Build a fresh index over every block. Vectors are stored under symbol_id() so
+    later runs can update them in place with update_faiss(). Block file paths are
+    relative to repo_path, where the metadata store reads the files it points into.
+    """
+    import faiss
+    import numpy as np
+
+    ids = np.array([symbol_id(*key) for key in metadata], dtype="int64")
+    index = build_index(_to_matrix(embeddings), ids, index_type)
+    faiss.write_index(index, save_path)
+    store = MetadataStore(meta_path)
+    store.replace_all(metadata, repo_path)
+    store.close()
+
+
+def update_faiss(changed_files: Iterable[str], changed_blocks: Dict[BlockKey, CodeBlock],
+                 embed: Callable[[List[str]], List[List[float]]],
+                 save_path=DEFAULT_INDEX_PATH, meta_path=DEFAULT_META_PATH, index_type="flat", repo_path=".") -> MetadataStore:
+    """
+    Apply a diff to an existing index instead of rebuilding it.
+
+    changed_files are the files touched by the diff and changed_blocks the blocks
+    currently extracted from them. Symbols of those files that disappeared or whose
+    code changed are removed; new and edited ones are embedded and added. Blocks in
+    untouched files are neither re-embedded nor re-written in the index or the store.
+    Indexes that cannot remove vectors (HNSW) are rebuilt as index_type instead,
+    which only re-embeds cache misses.
+    Returns the open metadata store, a mapping over the full, updated metadata;
+    the caller closes it.
+    """
+    import faiss
+    import numpy as np
+
+    index = faiss.read_index(save_path)
+    store = MetadataStore(meta_path)
+    stored = store.code_hashes(changed_files)
+    new_hashes = {key: code_hash(block.code) for key, block in changed_blocks.items()}
+    stale = [key for key, digest in stored.items() if new_hashes.get(key) != digest]
+    to_add = {key: block for key, block in changed_blocks.items() if stored.get(key) != new_hashes[key]}
+    stale_ids = [symbol_id(*key) for key in stale]
+
+    if stale_ids and not supports_remove(index):
+        stale = set(stale)
+        metadata = {key: block for key, block in store.items() if key not in stale}
+        metadata.update(to_add)
+        store.close()
+        print(f"Index does not support removal, rebuilding {len(metadata)} vectors")
+        save_to_faiss(embed([block.code for block in metadata.values()]), metadata, save_path, meta_path, index_type,
+                      repo_path)
+        return MetadataStore(meta_path)
+    if stale_ids:
+        index.remove_ids(np.array(stale_ids, dtype="int64"))
+    if to_add:
+        vectors = embed([block.code for block in to_add.values()])
+        ids = np.array([symbol_id(*key) for key in to_add], dtype="int64")
+        index.add_with_ids(_to_matrix(vectors), ids)
+
+    print(f"Incremental index update: {len(stale_ids)} removed, {len(to_add)} added, {index.ntotal} total")
+    faiss.write_index(index, save_path)
+    store.update(stale_ids, to_add, repo_path)
+    return store